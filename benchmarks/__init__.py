@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the hot paths, asv style: bench_*.py modules hold classes with time_* methods, run them with run.py
+"""
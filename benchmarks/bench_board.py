@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Board benchmarks: placing moves, checking for a winner and evaluating positions
+"""
+
+import random
+
+from fiveinarow.game_board import Board
+from fiveinarow.evaluator import Evaluator
+
+
+def random_moves(shape, count, seed=0):
+    """
+    :param shape: board size value-pair
+    :param count: number of moves
+    :param seed: random seed, the same moves for the same arguments
+    :return: list of distinct positions
+    """
+
+    cells = [(x, y) for x in range(shape[0]) for y in range(shape[1])]
+    return random.Random(seed).sample(cells, min(count, len(cells)))
+
+
+class BoardPlace:
+    params = ([(15, 15), (30, 30), (50, 50)], [5, 6], [Board.NUMPY, Board.BITBOARD])
+    param_names = ['shape', 'num_to_win', 'storage']
+
+    def setup(self, shape, num_to_win, storage):
+        self.board = Board(shape, num_to_win, storage=storage)
+        self.moves = random_moves(shape, 60)
+
+    def time_place_and_check(self, shape, num_to_win, storage):
+        """
+        A game of 60 moves, the board is checked after every move like in the game loop.
+        """
+
+        board = self.board
+        for i, pos in enumerate(self.moves):
+            board.place(pos, i % 2)
+            board.check_board()
+        board.clear()
+
+    def time_place_undo(self, shape, num_to_win, storage):
+        """
+        Place and undo, the inner loop of the engine's search.
+        """
+
+        board = self.board
+        for i, pos in enumerate(self.moves):
+            board.place(pos, i % 2)
+        for _ in self.moves:
+            board.undo()
+
+
+class BoardCheck:
+    params = ([(15, 15), (50, 50)], [5], [Board.NUMPY, Board.BITBOARD])
+    param_names = ['shape', 'num_to_win', 'storage']
+
+    def setup(self, shape, num_to_win, storage):
+        self.board = Board(shape, num_to_win, storage=storage)
+        for i, pos in enumerate(random_moves(shape, shape[0] * shape[1] // 4)):
+            self.board.place(pos, i % 2)
+
+    def time_check_board(self, shape, num_to_win, storage):
+        self.board.check_board()
+
+    def time_to_array(self, shape, num_to_win, storage):
+        self.board.to_array()
+
+
+class Evaluation:
+    params = ([(15, 15), (50, 50)], [5, 7])
+    param_names = ['shape', 'num_to_win']
+
+    def setup(self, shape, num_to_win):
+        self.board = Board(shape, num_to_win, storage=Board.BITBOARD)
+        self.moves = random_moves(shape, 60)
+        for i, pos in enumerate(self.moves[:40]):
+            self.board.place(pos, i % 2)
+        self.evaluator = Evaluator(self.board)
+
+    def teardown(self, shape, num_to_win):
+        self.evaluator.detach()
+
+    def time_place_undo_evaluate(self, shape, num_to_win):
+        """
+        Incremental window updates of the engine's search: place, evaluate, undo.
+        """
+
+        board = self.board
+        for pos in self.moves[40:]:
+            board.place(pos, 0)
+            self.evaluator.evaluate(1, 0)
+            board.undo()
+
+    def time_full_evaluation(self, shape, num_to_win):
+        Evaluator(self.board).detach()
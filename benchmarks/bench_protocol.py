@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Protocol benchmarks: encrypted message round trips and the RSA key exchange over a loopback ZeroMQ pair
+"""
+
+import socket
+
+import rsa
+
+from fiveinarow.communicator import Communicator
+from fiveinarow.game_board import Player
+from fiveinarow import ciphers
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def connect(suites=None, key_pool=None, rsa_key_bits=1024):
+    """
+    :return: (server, client) Communicators connected over TCP loopback, not encrypted yet
+    """
+
+    port = free_port()
+    server = Communicator(Communicator.SERVER)
+    server.init_connection(port=port, rsa_key_bits=rsa_key_bits, key_pool=key_pool, suites=suites)
+    client = Communicator(Communicator.CLIENT)
+    client.init_connection(port=port, hostname='127.0.0.1', suites=suites)
+
+    return server, client
+
+
+def key_exchange(server, client):
+    """
+    The steps of Communicator.init_encryption of both sides, interleaved in one thread.
+    """
+
+    server.encrypted_send(server.encomm.server_key_offer(), 'pubkey')
+    offer, _ = client.encrypted_recv(timeout=5)
+    client.encrypted_send(client.encomm.client_gen_symmetric_key(offer), 'encrypted_symm_key')
+    client.encomm.client_init_encryption()
+    encrypted_key, _ = server.encrypted_recv(timeout=5)
+    server.encomm.server_init_encryption(encrypted_key)
+
+
+def close(*comms):
+    for comm in comms:
+        comm.encomm.llcomm.socket.close(linger=0)
+
+
+class FixedKeyPool:
+    """
+    Hands out the same pre-generated key-pair every time, so the key exchange is timed without key generation.
+    """
+
+    def __init__(self, bits):
+        self.keys = rsa.newkeys(bits)
+
+    def get(self):
+        return self.keys
+
+
+class Roundtrip:
+    params = ([ciphers.FERNET, ciphers.CHACHA20_POLY1305], ['move', 'my_player', 'server_config'])
+    param_names = ['suite', 'header']
+
+    MESSAGES = {'move': (7, 8), 'my_player': Player("player", id=0, turn=True),
+                'server_config': {'numgridx': 15, 'numgridy': 15, 'n_to_win': 5}}
+
+    def setup(self, suite, header):
+        self.server, self.client = connect(suites=[suite])
+        key_exchange(self.server, self.client)
+        self.data = self.MESSAGES[header]
+
+    def teardown(self, suite, header):
+        close(self.server, self.client)
+
+    def time_send_recv(self, suite, header):
+        self.client.encrypted_send(self.data, header)
+        self.server.encrypted_recv(timeout=1)
+
+
+class Handshake:
+    params = ([1024, 2048],)
+    param_names = ['rsa_key_bits']
+
+    def setup(self, rsa_key_bits):
+        self.server, self.client = connect(key_pool=FixedKeyPool(rsa_key_bits), rsa_key_bits=rsa_key_bits)
+
+    def teardown(self, rsa_key_bits):
+        close(self.server, self.client)
+
+    def time_key_exchange(self, rsa_key_bits):
+        """
+        RSA encryption of the symmetric key and its decryption, the keys come from a pool.
+        """
+
+        key_exchange(self.server, self.client)
+        self.server.encomm.reset_encryption()
+        self.client.encomm.reset_encryption()
+
+
+class KeyGeneration:
+    params = ([1024],)
+    param_names = ['rsa_key_bits']
+    repeat = 3
+
+    def time_rsa_newkeys(self, rsa_key_bits):
+        """
+        The part of the handshake a server without key pool pays for.
+        """
+
+        rsa.newkeys(rsa_key_bits)
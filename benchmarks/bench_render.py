@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rendering benchmarks of the grid on a dummy SDL video driver
+"""
+
+import os
+
+from benchmarks.bench_board import random_moves
+
+
+class GridDraw:
+    params = ([(15, 15), (50, 50)],)
+    param_names = ['shape']
+
+    def setup(self, shape):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import pygame
+        from fiveinarow.pg_grid import Grid
+
+        pygame.display.init()
+        self.screen = pygame.display.set_mode((640, 640))
+        conf = {'numgridx': shape[0], 'numgridy': shape[1], 'n_to_win': 5, 'gridcolor': (42, 42, 42),
+                'bold_grid': False, 'player_colors': [(255, 0, 0), (0, 0, 0)], 'bgcolor': (211, 211, 211)}
+        self.grid = Grid(self.screen, pygame.time.Clock(), conf)
+        self.moves = random_moves(shape, 60)
+
+    def teardown(self, shape):
+        import pygame
+
+        pygame.display.quit()
+
+    def time_draw_grid(self, shape):
+        self.grid.draw_grid()
+
+    def time_render(self, shape):
+        """
+        Full redraw: background with the lines, then every stone.
+        """
+
+        self.grid.render()
+
+    def time_draw_board_game(self, shape):
+        """
+        A game of 60 moves drawn incrementally, one draw_board per move like in the game loop.
+        """
+
+        board = self.grid.board
+        for i, pos in enumerate(self.moves):
+            board.place(pos, i % 2)
+            self.grid.draw_board()
+        board.clear()
+        self.grid.draw_board()
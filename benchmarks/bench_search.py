@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""
+Engine benchmarks: fixed depth searches of a 15x15 midgame position, sequential and on worker processes
+"""
+
+from fiveinarow.game_board import Board
+from fiveinarow.engine import Engine
+from fiveinarow.parallel_engine import ParallelEngine
+
+
+MIDGAME = [(7, 7), (8, 8), (8, 6), (6, 8), (7, 8), (7, 9), (7, 6), (9, 7), (7, 5), (7, 4), (10, 6), (9, 6), (5, 11),
+           (9, 5), (9, 4), (8, 5), (10, 7), (9, 11), (8, 10), (6, 3)]
+
+
+def midgame_board():
+    board = Board((15, 15), 5)
+    for i, pos in enumerate(MIDGAME):
+        board.place(pos, i % 2)
+    return board
+
+
+class Search:
+    params = ([0, 1, 2, 4, 8], [4])
+    param_names = ['workers', 'depth']  # 0 workers: the sequential Engine
+    repeat = 3
+
+    def setup(self, workers, depth):
+        self.board = midgame_board()
+        if workers == 0:
+            self.engine = Engine(time_budget_ms=None, max_depth=depth)
+        else:
+            self.engine = ParallelEngine(workers=workers, time_budget_ms=None, max_depth=depth)
+            self.engine.best_move(self.board, 0)  # starts the worker processes
+
+    def teardown(self, workers, depth):
+        if workers > 0:
+            self.engine.close()
+
+    def time_best_move(self, workers, depth):
+        if workers == 0:  # every search starts with an empty table, the workers clear theirs for each search
+            self.engine.tt.clear()
+        self.engine.best_move(self.board, 0)
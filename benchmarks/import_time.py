@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Startup cost of the entry points: import time of the modules they load, measured with python -X importtime
+
+    python benchmarks/import_time.py [--repeat 5] [module ...]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module loaded by each entry point, and the module a tool needing only the board imports
+ENTRY_POINTS = {'board': 'fiveinarow.game_board',
+                'server.py --headless': 'fiveinarow.game_session',
+                'server.py, client.py': 'fiveinarow.fiveinarow',
+                'match_server.py': 'fiveinarow.match_server',
+                'selfplay.py': 'fiveinarow.tournament'}
+
+HEAVY_PACKAGES = ['numpy', 'pygame', 'zmq', 'rsa', 'cryptography']
+
+
+def import_times(module):
+    """
+    Imports the module in a new interpreter.
+    :param module: module name
+    :return: dict of the module's cumulative import time and the heavy packages' own import times, microseconds
+    """
+
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name == module:
+            times[module] = int(cumulative)
+        elif name.split('.')[0] in HEAVY_PACKAGES:
+            package = name.split('.')[0]
+            times[package] = times.get(package, 0) + int(own)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the import time of the entry points' modules.")
+    parser.add_argument('--repeat', type=int, default=5, help="interpreter starts per module, the median is shown")
+    parser.add_argument('modules', nargs='*', help="modules to measure (default: the entry points' modules)")
+    args = parser.parse_args()
+
+    entries = [(module, module) for module in args.modules] if args.modules else ENTRY_POINTS.items()
+
+    print("{:<24}{:<28}{:>10}  {}".format('entry point', 'module', 'ms', 'heavy dependencies loaded (ms)'))
+    for entry, module in entries:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        total = statistics.median(run.get(module, 0) for run in runs) / 1000
+        heavy = ', '.join("{} {:.0f}".format(package, statistics.median(run.get(package, 0) for run in runs) / 1000)
+                          for package in HEAVY_PACKAGES if package in runs[0])
+        print("{:<24}{:<28}{:>10.1f}  {}".format(entry, module, total, heavy or '-'))
+
+
+if __name__ == '__main__':
+    main()
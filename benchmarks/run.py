@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runs the benchmark suite and stores the results as JSON, compares two result files
+
+    python benchmarks/run.py [--filter board] [--output results.json]
+    python benchmarks/run.py --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Benchmarks are asv style: every bench_*.py module of this directory holds classes with time_* methods.
+A class may set params (list of value lists, every combination is run) and param_names, and have
+setup and teardown methods getting the same parameters. Each method is called in a loop long enough
+to time it reliably, the loop is repeated and the median and minimum seconds per call are stored.
+"""
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import timeit
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def discover():
+    """
+    :return: list of (name, class, method name, params tuple) of every benchmark, name is
+        'module.Class.method(param, ...)'
+    """
+
+    benchmarks = []
+    for file_name in sorted(os.listdir(os.path.dirname(os.path.abspath(__file__)))):
+        if not (file_name.startswith('bench_') and file_name.endswith('.py')):
+            continue
+        module = importlib.import_module('benchmarks.' + file_name[:-3])
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            combinations = list(itertools.product(*getattr(cls, 'params', ()))) or [()]
+            for method in sorted(name for name in dir(cls) if name.startswith('time_')):
+                for params in combinations:
+                    name = "{}.{}.{}({})".format(file_name[:-3], class_name, method, ', '.join(map(str, params)))
+                    benchmarks.append((name, cls, method, params))
+
+    return benchmarks
+
+
+def run_benchmark(cls, method, params, repeat=5, min_time=0.2):
+    """
+    :param cls: benchmark class
+    :param method: name of the time_ method
+    :param params: parameters of setup, teardown and the method
+    :param repeat: number of timed loops, a class may lower it with a repeat attribute
+    :param min_time: seconds a timed loop runs at least
+    :return: dict of seconds per call (median, min), calls per loop (number) and repeat
+    """
+
+    benchmark = cls()
+    if hasattr(benchmark, 'setup'):
+        benchmark.setup(*params)
+    try:
+        function = getattr(benchmark, method)
+        timer = timeit.Timer(lambda: function(*params))
+        number = 1
+        while timer.timeit(number) < min_time and number < 10 ** 7:
+            number *= 10 if number < 10 ** 6 else 2
+        repeat = min(repeat, getattr(cls, 'repeat', repeat))
+        times = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    finally:
+        if hasattr(benchmark, 'teardown'):
+            benchmark.teardown(*params)
+
+    return {'median': statistics.median(times), 'min': min(times), 'number': number, 'repeat': repeat}
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, universal_newlines=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pattern=None, repeat=5, min_time=0.2):
+    """
+    :param pattern: regular expression, only the benchmarks with a matching name are run
+    :param repeat: timed loops per benchmark
+    :param min_time: seconds per timed loop
+    :return: results dict, see the module docstring
+    """
+
+    results = dict()
+    for name, cls, method, params in discover():
+        if pattern is not None and re.search(pattern, name) is None:
+            continue
+        results[name] = run_benchmark(cls, method, params, repeat=repeat, min_time=min_time)
+        print("{:<80}{:>12.3f} us".format(name, results[name]['median'] * 1e6), flush=True)
+
+    return {'commit': commit(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'machine': platform.machine(), 'platform': platform.platform(),
+            'results': results}
+
+
+def compare(old, new, threshold=1.1):
+    """
+    Prints the ratio of the new and old median of every benchmark found in both.
+    :param old: results dict
+    :param new: results dict
+    :param threshold: ratios above it are regressions, below its reciprocal improvements
+    :return: number of regressions
+    """
+
+    regressions = 0
+    print("{:<80}{:>12}{:>12}{:>8}".format("benchmark", "old us", "new us", "ratio"))
+    for name in sorted(set(old['results']) & set(new['results'])):
+        old_time, new_time = old['results'][name]['median'], new['results'][name]['median']
+        ratio = new_time / old_time
+        mark = ''
+        if ratio > threshold:
+            mark = '  slower'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            mark = '  faster'
+        print("{:<80}{:>12.3f}{:>12.3f}{:>8.2f}{}".format(name, old_time * 1e6, new_time * 1e6, ratio, mark))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmarks, or compares two result files.")
+    parser.add_argument('--filter', default=None, help="regular expression of the benchmark names to run")
+    parser.add_argument('--repeat', type=int, default=5, help="timed loops per benchmark")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per timed loop")
+    parser.add_argument('--output', default=None, help="JSON result file (default: results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files")
+    parser.add_argument('--threshold', type=float, default=1.1, help="slowdown ratio counted as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            regressions = compare(json.load(old_file), json.load(new_file), threshold=args.threshold)
+        sys.exit(1 if regressions > 0 else 0)
+
+    results = run(args.filter, repeat=args.repeat, min_time=args.min_time)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "{}.json".format((results['commit'] or 'results')[:10]))
+    with open(output, 'w') as result_file:
+        json.dump(results, result_file, indent=4, sort_keys=True)
+    print("results written to {}".format(output))
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, ROOT)
+    main()
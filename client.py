@@ -6,9 +6,11 @@ Five in a row game client
 """
 
 import logging
+from fiveinarow import setup_logging
 from fiveinarow.fiveinarow import FiveInaRow
 from fiveinarow.communicator import TimeoutException
 
+setup_logging()
 
 
 logging.info("Starting server instance")
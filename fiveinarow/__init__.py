@@ -3,8 +3,20 @@
 
 """
 Five in a row module init
+
+Importing the package is cheap, the modules load their heavy dependencies (pygame, zmq, crypto, numpy) when used.
 """
 
 import logging
 
-logging.basicConfig(format='%(levelname)s: %(module)s::%(funcName)s: %(message)s', level=logging.DEBUG)
+LOG_FORMAT = '%(levelname)s: %(module)s::%(funcName)s: %(message)s'
+
+
+def setup_logging(level=logging.DEBUG):
+    """
+    Configures the root logger, called by the entry scripts; importing the package leaves logging alone.
+    :param level: logging level
+    :return: None
+    """
+
+    logging.basicConfig(format=LOG_FORMAT, level=level)
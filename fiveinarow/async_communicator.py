@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+asyncio variants of the communicator layers, built on zmq.asyncio
+"""
+
+import asyncio
+import logging
+import time
+import zmq
+import zmq.asyncio
+
+from fiveinarow.ll_communictor import LLComm
+from fiveinarow.encrypted_communicator import EncryptedComm
+from fiveinarow.communicator import Communicator
+
+
+class AsyncLLComm(LLComm):
+    def _new_context(self):
+        """
+        All asyncio sockets of the process share one context and its IO thread.
+        :return: zmq.asyncio.Context
+        """
+
+        return zmq.asyncio.Context.instance()
+
+    async def send(self, data, timeout=None):
+        """
+        Sends data.
+        :param data: bytes
+        :param timeout: has no effect
+        :return: None
+        """
+
+        await self.socket.send(data)
+
+    async def recv(self, timeout=0.0):
+        """
+        Receives data without blocking the event loop, the time spent waiting is stored in last_wait.
+        :param timeout: seconds, 0 for nonblocking, None for no timeout
+        :return: data, None if nothing arrived within timeout
+        """
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        data = None
+        try:
+            if timeout == 0.0:
+                data = self.socket.recv(flags=zmq.NOBLOCK).result()
+            else:
+                data = await asyncio.wait_for(self.socket.recv(), timeout)
+        except (zmq.Again, asyncio.TimeoutError):
+            if timeout != 0.0:
+                logging.error("communication timed out")
+        self.last_wait = loop.time() - start
+
+        return data
+
+
+class AsyncEncryptedComm(EncryptedComm):
+    llcomm_class = AsyncLLComm
+
+    async def send(self, data, timeout=None, plaintext=False):
+        """
+        Encrypts and sends data through the asyncio low level communicator.
+        :param data: data to send
+        :param timeout: has no effect
+        :param plaintext: send without encryption, for the messages of the handshakes
+        :return: None
+        """
+
+        if plaintext:
+            self.last_wire_size, self.last_crypto_time = len(data), 0.0
+        else:
+            data = self._encrypt(data)
+        await self.llcomm.send(data, timeout=timeout)
+
+    async def recv(self, timeout):
+        """
+        If receives data within the specified timeout tries to decrypt and return it.
+        :param timeout: seconds, 0 for nonblocking, None for no timeout
+        :return: received data, None on timeout or if the message was rejected
+        """
+
+        encrypted_data = await self.llcomm.recv(timeout=timeout)
+        if encrypted_data is None:
+            self.last_rejected = None
+            return None
+        return self._decrypt(encrypted_data)
+
+
+class AsyncCommunicator(Communicator):
+    encomm_class = AsyncEncryptedComm
+
+    async def init_encryption(self, timeout=15):
+        """
+        Runs the RSA key exchange, the key generation runs in an executor thread to keep the event loop responsive.
+        :param timeout: seconds to wait for each message of the partner
+        :return: bool, True if the symmetric encryption is set up
+        """
+
+        if self.mode == self.SERVER:
+            return await self.__init_server_encryption(timeout)
+        elif self.mode == self.CLIENT:
+            return await self.__init_client_encryption(timeout)
+
+    async def __init_server_encryption(self, timeout):
+        loop = asyncio.get_running_loop()
+        key_offer = await loop.run_in_executor(None, self.encomm.server_key_offer)
+        await self.encrypted_send(data=key_offer, header='pubkey')
+
+        encrypted_key = await self.wait_for_header('encrypted_symm_key', timeout=timeout)
+        if encrypted_key is None:
+            return False
+
+        self.encomm.server_init_encryption(encrypted_key)
+
+        return True
+
+    async def __init_client_encryption(self, timeout):
+        partner_pubkey = await self.wait_for_header('pubkey', timeout=timeout)
+        if partner_pubkey is None:
+            return False
+
+        encrypted_key = self.encomm.client_gen_symmetric_key(partner_pubkey)
+        await self.encrypted_send(encrypted_key, header='encrypted_symm_key')
+
+        self.encomm.client_init_encryption()
+
+        return True
+
+    async def wait_for_header(self, header, max_dropped_messages=200, timeout=15):
+        """
+        Receives messages until one with the given header arrives, the others are dropped.
+        :param header: header to wait for
+        :param max_dropped_messages: number of other messages dropped before giving up
+        :param timeout: seconds to wait for each message, None for no timeout
+        :return: data of the message, None on timeout or if too many messages were dropped
+        """
+
+        assert(header is not None)
+        assert(max_dropped_messages > 0)
+
+        for _ in range(max_dropped_messages):
+            recv_data, recv_header = await self.encrypted_recv(timeout=timeout)
+            if recv_header == header:
+                return recv_data
+            if recv_header is None:
+                return None
+
+        return None
+
+    async def encrypted_send(self, data, header=None):
+        """
+        Packs header and data to DataPacket, serialises and sends it.
+        :param data: data to send
+        :param header: optional header for data
+        :return: None
+        """
+
+        data_packet = self.DataPacket(data=data, header=header)
+        start = time.perf_counter()
+        serialized = self._serialize_object(data_packet)
+        serialize_time = time.perf_counter() - start
+
+        logging.debug("sending {}: {}".format(header, data))
+        await self.encomm.send(serialized, plaintext=header in self.PLAINTEXT_HEADERS)
+        self._record_sent(header, len(serialized), serialize_time)
+
+    async def encrypted_recv(self, timeout=None):
+        """
+        Receives data, (None, None) will be returned if nothing were received because of timeout.
+        :param timeout: seconds, 0 for nonblocking, None for no timeout
+        :return: (data, header)
+        """
+
+        return self._unpack_received(await self.encomm.recv(timeout=timeout))
+
+    async def dispatch(self, handlers, default=None):
+        """
+        Receives messages until cancelled and passes each one's data to the handler of its header.
+        Handlers may be plain functions or coroutine functions, a handler returning False stops the dispatch.
+        :param handlers: dict, header -> handler(data)
+        :param default: handler(data, header) for headers without a handler, unhandled messages are dropped if None
+        :return: None
+        """
+
+        while True:
+            data, header = await self.encrypted_recv(timeout=None)
+            if header is None:  # malformed message, already logged
+                continue
+
+            handler = handlers.get(header)
+            if handler is not None:
+                result = handler(data)
+            elif default is not None:
+                result = default(data, header)
+            else:
+                logging.debug("no handler for header {}, dropped".format(header))
+                continue
+
+            if asyncio.iscoroutine(result):
+                result = await result
+            if result is False:
+                return
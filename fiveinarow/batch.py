@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized win checker over stacks of boards
+"""
+
+import numpy as np
+
+from fiveinarow.game_board import Board
+
+
+def stack_boards(boards):
+    """
+    Stacks the int8 views of boards of the same size.
+    :param boards: iterable of Board objects
+    :return: (N, W, H) numpy.int8 array, Board.EMPTY for free cells
+    """
+
+    return np.stack([board.to_array() for board in boards])
+
+
+def shift_mask(mask, direction, distance):
+    """
+    Moves the cells of a stack of boolean boards against a direction, so that a cell holds the value that is
+    distance steps away from it in the direction. Cells moved in from outside the board are False.
+    :param mask: (N, W, H) bool array
+    :param direction: direction tuple from Board.DIRECTIONS
+    :param distance: number of steps
+    :return: (N, W, H) bool array
+    """
+
+    _, width, height = mask.shape
+    dx, dy = direction[0] * distance, direction[1] * distance
+
+    shifted = np.zeros_like(mask)
+    if abs(dx) >= width or abs(dy) >= height:
+        return shifted
+
+    src_x = slice(max(dx, 0), width + min(dx, 0))
+    dst_x = slice(max(-dx, 0), width + min(-dx, 0))
+    src_y = slice(max(dy, 0), height + min(dy, 0))
+    dst_y = slice(max(-dy, 0), height + min(-dy, 0))
+    shifted[:, dst_x, dst_y] = mask[:, src_x, src_y]
+
+    return shifted
+
+
+def line_starts(mask, direction, num_to_win):
+    """
+    Finds the cells where num_to_win marked cells in a row start in the given direction.
+    This is a length num_to_win box filter on boolean boards, evaluated with log2(num_to_win) shifted ANDs:
+    runs of length L are combined into runs of length 2L, the remainder is covered with one overlapping AND.
+    :param mask: (N, W, H) bool array of one player's stones
+    :param direction: direction tuple from Board.DIRECTIONS
+    :param num_to_win: line length
+    :return: (N, W, H) bool array, True at the first cell of every line
+    """
+
+    run = mask
+    length = 1
+    while length * 2 <= num_to_win:
+        run = run & shift_mask(run, direction, length)
+        length *= 2
+    if length < num_to_win:
+        run = run & shift_mask(run, direction, num_to_win - length)
+
+    return run
+
+
+def check_boards(positions, num_to_win, player_ids=(0, 1), chunk_size=4096):
+    """
+    Checks a stack of positions for winners, like Board.check_board does for a single board.
+    If more players have a line on the same board, the one first in player_ids is reported.
+    :param positions: (N, W, H) int8 array, Board.EMPTY for free cells, player id otherwise
+    :param num_to_win: number of stones in a row to win, decreased to the board size like in Board
+    :param player_ids: player ids to check, in order of precedence
+    :param chunk_size: number of boards processed at once, bounds the size of temporary arrays
+    :return: (winner, direction, cell) arrays: winner (N,) int8 with Board.EMPTY where nobody won, direction (N, 2)
+        int8 from Board.DIRECTIONS and cell (N, 2) int16 with the first cell of the winning line, both -1 if no winner
+    """
+
+    positions = np.asarray(positions)
+    if positions.ndim != 3:
+        raise ValueError("positions must be an (N, W, H) array")
+
+    num_boards, width, height = positions.shape
+    num_to_win = min(num_to_win, max(width, height))
+
+    winner = np.full(num_boards, Board.EMPTY, dtype=np.int8)
+    direction = np.full((num_boards, 2), -1, dtype=np.int8)
+    cell = np.full((num_boards, 2), -1, dtype=np.int16)
+
+    for start in range(0, num_boards, chunk_size):
+        chunk = positions[start:start + chunk_size]
+        chunk_winner = winner[start:start + chunk_size]
+        for player_id in player_ids:
+            mask = chunk == player_id
+            for d in Board.DIRECTIONS:
+                starts = line_starts(mask, d, num_to_win).reshape(len(chunk), -1)
+                found = starts.any(axis=1) & (chunk_winner == Board.EMPTY)
+                if not found.any():
+                    continue
+
+                rows = np.nonzero(found)[0]
+                first = starts[rows].argmax(axis=1)
+                chunk_winner[rows] = player_id
+                direction[start + rows] = d
+                cell[start + rows, 0] = first // height
+                cell[start + rows, 1] = first % height
+
+    return winner, direction, cell
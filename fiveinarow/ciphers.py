@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Symmetric ciphers of the encrypted communicator, negotiated during the RSA key exchange
+
+Every suite uses the same key format, a urlsafe base64 encoded 32 byte key like Fernet keys,
+so session tickets and resumed key derivation work the same way for each of them.
+"""
+
+import base64
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+
+FERNET = 1
+CHACHA20_POLY1305 = 2
+
+NAMES = {'fernet': FERNET, 'chacha20-poly1305': CHACHA20_POLY1305}
+SUITES = [CHACHA20_POLY1305, FERNET]  # supported suites, preferred first
+
+
+class InvalidMessage(Exception):
+    pass
+
+
+def generate_key():
+    return Fernet.generate_key()
+
+
+class FernetCipher:
+    def __init__(self, key, mode):
+        self.fernet = Fernet(key)
+
+    def encrypt(self, data):
+        return self.fernet.encrypt(data)
+
+    def decrypt(self, data):
+        try:
+            return self.fernet.decrypt(data)
+        except (InvalidToken, TypeError):
+            raise InvalidMessage
+
+
+class ChaCha20Poly1305Cipher:
+    PREFIX_SIZE = 8
+    COUNTER = struct.Struct('>I')
+    NONCE_SIZE = PREFIX_SIZE + COUNTER.size
+
+    def __init__(self, key, mode):
+        """
+        ChaCha20-Poly1305 with raw binary framing: 12 byte nonce, ciphertext, 16 byte tag.
+        The nonce is a random prefix drawn by every cipher for its sending direction and a message counter, so a nonce
+        is not used twice with a key even if the key is used again, e.g. by a replayed key exchange.
+        The receiver keeps to the prefix of the first message it accepted, and rejects messages that are not newer
+        than the last accepted one as replays.
+        :param key: urlsafe base64 encoded 32 byte key
+        :param mode: SERVER or CLIENT mode of the own side, the random prefixes tell the directions apart
+        """
+
+        self.aead = ChaCha20Poly1305(base64.urlsafe_b64decode(key))
+        self.send_prefix = os.urandom(self.PREFIX_SIZE)
+        self.recv_prefix = None  # prefix of the partner's messages, set by the first one accepted
+        self.send_counter = 0
+        self.recv_counter = -1
+
+    def encrypt(self, data):
+        if self.send_counter > 0xffffffff:
+            raise OverflowError("message counter exhausted, a new key exchange is needed")
+        nonce = self.send_prefix + self.COUNTER.pack(self.send_counter)
+        self.send_counter += 1
+        return nonce + self.aead.encrypt(nonce, data, None)
+
+    def decrypt(self, data):
+        if len(data) < self.NONCE_SIZE + 16:
+            raise InvalidMessage
+        nonce = data[:self.NONCE_SIZE]
+        prefix = nonce[:self.PREFIX_SIZE]
+        if prefix == self.send_prefix or self.recv_prefix not in [None, prefix]:
+            raise InvalidMessage
+        (number,) = self.COUNTER.unpack(nonce[self.PREFIX_SIZE:])
+        if number <= self.recv_counter:
+            raise InvalidMessage
+        try:
+            secret = self.aead.decrypt(nonce, data[self.NONCE_SIZE:], None)
+        except InvalidTag:
+            raise InvalidMessage
+        self.recv_prefix, self.recv_counter = prefix, number
+
+        return secret
+
+
+CIPHERS = {FERNET: FernetCipher, CHACHA20_POLY1305: ChaCha20Poly1305Cipher}
+
+
+def make_cipher(suite, key, mode):
+    """
+    :param suite: cipher suite id
+    :param key: symmetric key
+    :param mode: SERVER or CLIENT mode of the own side
+    :return: cipher with encrypt and decrypt methods, decrypt raises InvalidMessage
+    """
+
+    return CIPHERS[suite](key, mode)
+
+
+def choose_suite(offered, supported):
+    """
+    :param offered: suites offered by the server, empty for servers without negotiation
+    :param supported: own suites, preferred first
+    :return: first own suite the server offers, FERNET if there is no common one
+    """
+
+    return next((suite for suite in supported if suite in offered), FERNET)
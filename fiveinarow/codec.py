@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+Versioned binary wire format of the communicator's messages
+
+Every message starts with a 3 byte prefix: codec version, message type and flags.
+If the TIMESTAMP flag is set, the sender's wall clock time (double, seconds since the epoch) follows.
+Both partners have to enable timestamps, decoders before it do not skip the field.
+The fields of the message type follow, packed little endian:
+    hello, hello_answer, encrypted_symm_key: raw bytes
+    pubkey:             RSA modulus and exponent, both as length-prefixed big endian integers,
+                        then the offered cipher suite ids (uint8 each, rest of the message)
+    server_config:      numgridx, numgridy (uint16), n_to_win (uint8),
+                        if the HAS_PLAYER flag is set: player id (uint8), first move (bool)
+    get_player:         nothing
+    my_player:          id (int8), turn (bool), points (uint32), name (utf-8, rest of the message)
+    move:               x, y (uint16)
+    partner_request:    request (uint8)
+    echo_*:             header suffix (length-prefixed utf-8), raw bytes
+    session_ticket:     raw bytes
+    resume:             ticket (length-prefixed), client random (rest of the message)
+    resume_ok:          numgridx, numgridy (uint16), n_to_win (uint8), resumed player's id, player id on move (int8,
+                        -1 if none), game is on (bool), points of player 0 and 1 (uint32),
+                        then x, y (uint16) and player id (uint8) of every move
+    resume_failed:      nothing
+Decoding only builds ints, bytes, strings, tuples, dicts, rsa.PublicKey and Player objects.
+"""
+
+import struct
+import rsa
+
+from fiveinarow.game_board import Player
+
+
+VERSION = 1
+
+PREFIX = struct.Struct('<BBB')
+LENGTH = struct.Struct('<H')
+MOVE = struct.Struct('<HH')
+SERVER_CONFIG = struct.Struct('<HHB')
+ASSIGNED_PLAYER = struct.Struct('<B?')
+PLAYER = struct.Struct('<b?I')
+REQUEST = struct.Struct('<B')
+GAME_STATE = struct.Struct('<HHBbb?II')
+STATE_MOVE = struct.Struct('<HHB')
+SENT_TIME = struct.Struct('<d')
+
+HELLO = 1
+HELLO_ANSWER = 2
+PUBKEY = 3
+ENCRYPTED_SYMM_KEY = 4
+SERVER_CONFIG_TYPE = 5
+GET_PLAYER = 6
+MY_PLAYER = 7
+MOVE_TYPE = 8
+PARTNER_REQUEST = 9
+ECHO = 10
+SESSION_TICKET = 11
+RESUME = 12
+RESUME_OK = 13
+RESUME_FAILED = 14
+RESUME_ACCEPT = 15
+
+HEADERS = {'hello': HELLO, 'hello_answer': HELLO_ANSWER, 'pubkey': PUBKEY, 'encrypted_symm_key': ENCRYPTED_SYMM_KEY,
+           'server_config': SERVER_CONFIG_TYPE, 'get_player': GET_PLAYER, 'my_player': MY_PLAYER, 'move': MOVE_TYPE,
+           'partner_request': PARTNER_REQUEST, 'session_ticket': SESSION_TICKET, 'resume': RESUME,
+           'resume_ok': RESUME_OK, 'resume_failed': RESUME_FAILED, 'resume_accept': RESUME_ACCEPT}
+TYPES = {message_type: header for header, message_type in HEADERS.items()}
+
+REQUESTS = ['next_player', 'new_game', 'start_game']
+
+HAS_PLAYER = 0x01  # server_config carries the player id and first move assigned by a match server
+TIMESTAMP = 0x80  # any message type, the send time follows the prefix
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _pack_bytes(data):
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_bytes(payload, offset):
+    """
+    :return: (bytes, offset after them)
+    """
+
+    (length,) = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    if offset + length > len(payload):
+        raise CodecError("truncated field")
+    return bytes(payload[offset:offset + length]), offset + length
+
+
+def _pack_int(value):
+    return _pack_bytes(value.to_bytes((value.bit_length() + 7) // 8 or 1, 'big'))
+
+
+def _unpack_int(payload, offset):
+    data, offset = _unpack_bytes(payload, offset)
+    return int.from_bytes(data, 'big'), offset
+
+
+def encode(data, header, timestamp=None):
+    """
+    Packs a message to its binary representation.
+    :param data: data of the message, its type depends on the header
+    :param header: message header
+    :param timestamp: send time to embed, time.time(), none if None
+    :return: bytes
+    """
+
+    flags = 0
+    if header in HEADERS:
+        message_type = HEADERS[header]
+    elif header is not None and header[:5] == 'echo_':
+        message_type = ECHO
+    else:
+        raise CodecError("no wire format for header {}".format(header))
+
+    if message_type in [HELLO, HELLO_ANSWER, ENCRYPTED_SYMM_KEY, SESSION_TICKET, RESUME_ACCEPT]:
+        body = bytes(data)
+    elif message_type in [GET_PLAYER, RESUME_FAILED]:
+        body = b''
+    elif message_type == RESUME:
+        body = _pack_bytes(bytes(data[0])) + bytes(data[1])
+    elif message_type == RESUME_OK:
+        on_move = -1 if data['on_move'] is None else data['on_move']
+        body = GAME_STATE.pack(data['numgridx'], data['numgridy'], data['n_to_win'], data['player_id'], on_move,
+                               data['game_is_on'], *data['points'])
+        body += b''.join(STATE_MOVE.pack(pos[0], pos[1], player_id) for pos, player_id in data['moves'])
+    elif message_type == PUBKEY:
+        pubkey, suites = data
+        body = _pack_int(pubkey.n) + _pack_int(pubkey.e) + bytes(suites)
+    elif message_type == SERVER_CONFIG_TYPE:
+        body = SERVER_CONFIG.pack(data['numgridx'], data['numgridy'], data['n_to_win'])
+        if 'player_id' in data:
+            flags |= HAS_PLAYER
+            body += ASSIGNED_PLAYER.pack(data['player_id'], data['first_move'])
+    elif message_type == MY_PLAYER:
+        body = PLAYER.pack(data.id, data.turn, data.points) + data.name.encode('utf-8')
+    elif message_type == MOVE_TYPE:
+        body = MOVE.pack(*data)
+    elif message_type == PARTNER_REQUEST:
+        if data not in REQUESTS:
+            raise CodecError("unknown partner request {}".format(data))
+        body = REQUEST.pack(REQUESTS.index(data))
+    else:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        body = _pack_bytes(header[5:].encode('utf-8')) + bytes(data)
+
+    if timestamp is not None:
+        return PREFIX.pack(VERSION, message_type, flags | TIMESTAMP) + SENT_TIME.pack(timestamp) + body
+    return PREFIX.pack(VERSION, message_type, flags) + body
+
+
+def decode(payload):
+    """
+    Unpacks a message packed by encode.
+    :param payload: bytes
+    :return: (data, header)
+    """
+
+    try:
+        version, message_type, flags = PREFIX.unpack_from(payload)
+        if version != VERSION:
+            raise CodecError("unsupported codec version {}".format(version))
+
+        offset = PREFIX.size + (SENT_TIME.size if flags & TIMESTAMP else 0)
+        body = payload[offset:]
+        if message_type in [HELLO, HELLO_ANSWER, ENCRYPTED_SYMM_KEY, SESSION_TICKET, RESUME_ACCEPT]:
+            data = bytes(body)
+        elif message_type in [GET_PLAYER, RESUME_FAILED]:
+            data = None
+        elif message_type == RESUME:
+            ticket, offset = _unpack_bytes(payload, offset)
+            data = (ticket, bytes(payload[offset:]))
+        elif message_type == RESUME_OK:
+            fields = GAME_STATE.unpack_from(payload, offset)
+            offset += GAME_STATE.size
+            if (len(payload) - offset) % STATE_MOVE.size != 0:
+                raise CodecError("truncated game state")
+            data = dict(zip(['numgridx', 'numgridy', 'n_to_win', 'player_id', 'on_move', 'game_is_on'], fields))
+            data['on_move'] = None if data['on_move'] < 0 else data['on_move']
+            data['points'] = fields[-2:]
+            data['moves'] = [((x, y), move_player) for x, y, move_player in STATE_MOVE.iter_unpack(payload[offset:])]
+        elif message_type == PUBKEY:
+            n, offset = _unpack_int(payload, offset)
+            e, offset = _unpack_int(payload, offset)
+            data = (rsa.PublicKey(n, e), list(payload[offset:]))
+        elif message_type == SERVER_CONFIG_TYPE:
+            numgridx, numgridy, n_to_win = SERVER_CONFIG.unpack_from(payload, offset)
+            data = {'numgridx': numgridx, 'numgridy': numgridy, 'n_to_win': n_to_win}
+            if flags & HAS_PLAYER:
+                data['player_id'], data['first_move'] = ASSIGNED_PLAYER.unpack_from(payload, offset + SERVER_CONFIG.size)
+        elif message_type == MY_PLAYER:
+            player_id, turn, points = PLAYER.unpack_from(payload, offset)
+            data = Player(bytes(payload[offset + PLAYER.size:]).decode('utf-8'), id=player_id, turn=turn)
+            data.points = points
+        elif message_type == MOVE_TYPE:
+            data = MOVE.unpack_from(payload, offset)
+        elif message_type == PARTNER_REQUEST:
+            data = REQUESTS[REQUEST.unpack_from(payload, offset)[0]]
+        elif message_type == ECHO:
+            suffix, offset = _unpack_bytes(payload, offset)
+            return bytes(payload[offset:]), 'echo_' + suffix.decode('utf-8')
+        else:
+            raise CodecError("unknown message type {}".format(message_type))
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise CodecError("malformed message: {}".format(e))
+
+    return data, TYPES[message_type]
+
+
+def timestamp(payload):
+    """
+    :param payload: bytes packed by encode
+    :return: send time embedded in the message, None if it has none
+    """
+
+    try:
+        _, _, flags = PREFIX.unpack_from(payload)
+        if not flags & TIMESTAMP:
+            return None
+        return SENT_TIME.unpack_from(payload, PREFIX.size)[0]
+    except struct.error:
+        return None
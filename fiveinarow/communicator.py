@@ -6,10 +6,10 @@ ZeroMQ based one-to-one communicator class with RSA key exchange and symmetric e
 
 import zmq
 import time
-from cryptography.fernet import Fernet, InvalidToken
 import rsa
 import pickle
 import random
+import os
 
 import logging
 
@@ -17,6 +17,9 @@ import ipaddress
 import socket
 
 from fiveinarow.encrypted_communicator import EncryptedComm
+from fiveinarow import codec
+from fiveinarow.metrics import METRICS, BYTES_BUCKETS
+from fiveinarow.session_ticket import CLIENT_RANDOM_SIZE, SERVER_RANDOM_SIZE
 
 
 def validate_hostname(hostname):
@@ -52,6 +55,13 @@ class Communicator():
     SERVER = 'ser'
     CLIENT = 'cli'
 
+    encomm_class = EncryptedComm  # encrypted communicator implementation
+
+    # messages of the key exchange and the session resumption, they are always sent unencrypted and are the only
+    # ones accepted without authentication once a cipher is set
+    PLAINTEXT_HEADERS = ['hello', 'hello_answer', 'pubkey', 'encrypted_symm_key', 'resume', 'resume_accept',
+                         'resume_failed']
+
     class DataPacket:
         class DPTypeError(TypeError):
             pass
@@ -87,12 +97,23 @@ class Communicator():
             """
             return "({}, {})".format(self.data, self.header)
 
-    def __init__(self, mode):
+    def __init__(self, mode, legacy_pickle=False, timestamps=False):
+        """
+        :param mode: CLIENT or SERVER mode
+        :param legacy_pickle: pickle the DataPackets instead of the binary codec, both partners have to use the same
+        :param timestamps: embed the send time in the messages for the latency metric, both partners have to use
+            the same, latencies between hosts are only as good as their clock synchronisation
+        """
+
         if mode in [self.SERVER, self.CLIENT]:
             self.mode = mode
         else:
             raise ValueError
 
+        self.legacy_pickle = legacy_pickle
+        self.timestamps = timestamps and not legacy_pickle
+        self.session = None  # (ticket, session key) of the last ticket received, client mode
+
         self.port = None
         self.hostname = None
         self.rsa_key_bits = None
@@ -100,12 +121,17 @@ class Communicator():
 
         self.encomm = None
 
-    def init_connection(self, port, hostname=None, rsa_key_bits=None):
+    def init_connection(self, port, hostname=None, rsa_key_bits=None, socket_type=zmq.PAIR, llcomm=None, key_pool=None,
+                        suites=None):
         """
         Initialises encrypted communicator
         :param port: TCP/IP port for communication
         :param hostname: hostname or IP address, to that the client connects (ignored in server mode)
         :param rsa_key_bits: RSA key size for asymmetric key-pair generator (ignored in client mode)
+        :param socket_type: ZeroMQ socket type, DEALER to connect to a match server
+        :param llcomm: low level communicator to use instead of opening a socket
+        :param key_pool: KeyPool of pre-generated RSA key-pairs (ignored in client mode)
+        :param suites: cipher suite ids to offer (server) or accept (client), preferred first, all supported if None
         :return: None
         """
         self.port = port
@@ -120,7 +146,8 @@ class Communicator():
             else:
                 self.hostname = hostname
 
-        self.encomm = EncryptedComm(self.mode, ip_addr=self.hostname, port=self.port, rsa_key_bits=self.rsa_key_bits)
+        self.encomm = self.encomm_class(self.mode, ip_addr=self.hostname, port=self.port, rsa_key_bits=self.rsa_key_bits,
+                                        socket_type=socket_type, llcomm=llcomm, key_pool=key_pool, suites=suites)
         #self.__init_encryption()
 
     def init_encryption(self):
@@ -147,8 +174,8 @@ class Communicator():
 
     def __init_server_encryption(self):
 
-        pubkey = self.encomm.server_gen_rsa()
-        self.encrypted_send(data=pubkey, header='pubkey')
+        key_offer = self.encomm.server_key_offer()
+        self.encrypted_send(data=key_offer, header='pubkey')
 
         encrypted_key = self.__wait_for_header('encrypted_symm_key')
         if encrypted_key is None:
@@ -173,6 +200,84 @@ class Communicator():
         return True
 
 
+    def send_ticket(self, issuer, session_id):
+        """
+        Server mode, sends a ticket of the current encrypted session to the client.
+        :param issuer: TicketIssuer
+        :param session_id: id of the session, returned by accept_resume when the ticket is used
+        :return: None
+        """
+
+        self.encrypted_send(issuer.issue(session_id, self.encomm.session_key()), header='session_ticket')
+
+    def store_ticket(self, ticket):
+        """
+        Client mode, keeps a received ticket together with the key it belongs to.
+        :param ticket: data of a 'session_ticket' message
+        :return: None
+        """
+
+        self.session = (ticket, self.encomm.session_key())
+
+    def resume(self, session, timeout=5):
+        """
+        Client mode, resumes an encrypted session in one round trip instead of the RSA key exchange.
+        It has to be the first message of a new communicator: 'resume' is sent unencrypted, the server answers with
+        the unencrypted 'resume_accept' holding its random bytes for the resumed key, then 'resume_ok' is accepted
+        only if it is encrypted with that key. The server may answer with the unencrypted 'resume_failed' instead.
+        After 'resume_failed' the cipher is dropped and the server offers a new key, init_encryption follows.
+        :param session: (ticket, session key), the session attribute of the communicator of the previous connection
+        :param timeout: seconds to wait for the answer
+        :return: game state sent by the server (see codec), None if the server did not accept the ticket
+        :raise TimeoutException: if no answer arrived
+        """
+
+        if self.encomm.symmetric_cipher is not None:
+            raise ValueError("sessions are resumed on a new communicator")
+
+        ticket, session_key = session
+        client_random = os.urandom(CLIENT_RANDOM_SIZE)
+        self.encrypted_send((ticket, client_random), header='resume')
+
+        recv_data, recv_header = None, None
+        deadline = time.time() + timeout
+        while recv_header not in ['resume_ok', 'resume_failed'] and time.time() < deadline:
+            recv_data, recv_header = self.encrypted_recv(timeout=max(deadline - time.time(), 0))
+            if recv_header == 'resume_accept' and self.encomm.symmetric_cipher is None:
+                self.encomm.resume_encryption(session_key, client_random, recv_data)
+
+        if recv_header != 'resume_ok':
+            self.encomm.reset_encryption()
+            if recv_header is None:
+                raise TimeoutException
+            return None
+
+        return recv_data
+
+    def accept_resume(self, issuer, data):
+        """
+        Server mode, answers a 'resume' message. If the ticket is valid and was not used before, 'resume_accept' is sent
+        with fresh random bytes and the cipher of the resumed session is set up, the caller has to send 'resume_ok'
+        with the game state. Otherwise 'resume_failed' is sent unencrypted and the current cipher is kept,
+        the caller may offer a new key exchange to the client.
+        :param issuer: TicketIssuer the ticket was issued by
+        :param data: data of the 'resume' message
+        :return: session id of the ticket, None if it is not valid
+        """
+
+        ticket, client_random = data
+        opened = issuer.open(ticket)
+        if opened is None:
+            self.encrypted_send(None, header='resume_failed')
+            return None
+
+        session_id, session_key = opened
+        server_random = os.urandom(SERVER_RANDOM_SIZE)
+        self.encrypted_send(server_random, header='resume_accept')
+        self.encomm.resume_encryption(session_key, client_random, server_random)
+
+        return session_id
+
     """
     def check_echo(self):
         send_data = ''.join(chr(random.randint(0,255)) for _ in range(128))
@@ -216,17 +321,20 @@ class Communicator():
 
     def encrypted_send(self, data, header=None):
         """
-        Packs header and data to DataPacket, serialises it with pickle and sends
+        Packs header and data to DataPacket, serialises it and sends
         :param data: data to send
         :param header: optional header for data
         :return: None
         """
 
         data_packet = self.DataPacket(data=data, header=header)
-        pickled_data_packet = self.__serialize_object(data_packet)
+        start = time.perf_counter()
+        pickled_data_packet = self._serialize_object(data_packet)
+        serialize_time = time.perf_counter() - start
 
         logging.debug("sending {}: {}".format(header, data))
-        self.encomm.send(pickled_data_packet)
+        self.encomm.send(pickled_data_packet, plaintext=header in self.PLAINTEXT_HEADERS)
+        self._record_sent(header, len(pickled_data_packet), serialize_time)
 
     def encrypted_recv(self, timeout=None):
         """
@@ -235,28 +343,117 @@ class Communicator():
         :return: (data, header)
         """
 
-        recv_data = self.encomm.recv(timeout=timeout)
-        if recv_data is None:
-            return None, None
+        return self._unpack_received(self.encomm.recv(timeout=timeout))
+
+    def _unpack_received(self, recv_data):
+        """
+        Deserialises a message returned by the encrypted communicator. A message the cipher rejected is accepted
+        only if it is one of the PLAINTEXT_HEADERS, it is never unpickled.
+        :param recv_data: decrypted message, None if nothing arrived or the message was rejected
+        :return: (data, header), (None, None) if there is no message to process
+        """
 
-        packed_data = self.__reconstruct_object(recv_data)
+        authenticated = recv_data is not None
+        if not authenticated:
+            recv_data, self.encomm.last_rejected = self.encomm.last_rejected, None
+            if recv_data is None:
+                return None, None
+            if self.legacy_pickle:
+                METRICS.inc('fiveinarow_unauthenticated_messages_total')
+                return None, None
+
+        start = time.perf_counter()
+        try:
+            packed_data = self._reconstruct_object(recv_data)
+        except codec.CodecError as e:
+            logging.error("dropped malformed message: {}".format(e))
+            METRICS.inc('fiveinarow_malformed_messages_total')
+            return None, None
+        if not authenticated and packed_data.header not in self.PLAINTEXT_HEADERS:
+            logging.warning("dropped unauthenticated {} message".format(packed_data.header))
+            METRICS.inc('fiveinarow_unauthenticated_messages_total')
+            return None, None
+        self._record_received(packed_data.header, recv_data, time.perf_counter() - start)
         logging.debug("recieved {}: {}".format(packed_data.header, packed_data.data))
         return packed_data.data, packed_data.header
 
-    def __serialize_object(self, obj: DataPacket) -> bytes:
+    @staticmethod
+    def _header_label(header):
+        """
+        :return: metric label of a header, echo headers share one
+        """
+
+        if header is None:
+            return 'none'
+        return 'echo' if header[:5] == 'echo_' else header
+
+    def _record_sent(self, header, size, serialize_time):
+        """
+        Updates the metrics of a sent message, the encryption's figures are taken from the encrypted communicator.
+        :param header: message header
+        :param size: bytes of the serialised message
+        :param serialize_time: seconds the serialisation took
+        :return: None
+        """
+
+        if not METRICS.enabled:
+            return
+
+        header = self._header_label(header)
+        METRICS.inc('fiveinarow_messages_total', direction='sent', header=header)
+        METRICS.observe('fiveinarow_message_bytes', size, BYTES_BUCKETS, direction='sent', header=header,
+                        stage='plain')
+        METRICS.observe('fiveinarow_message_bytes', self.encomm.last_wire_size, BYTES_BUCKETS, direction='sent',
+                        header=header, stage='wire')
+        METRICS.observe('fiveinarow_serialize_seconds', serialize_time, header=header)
+        METRICS.observe('fiveinarow_encrypt_seconds', self.encomm.last_crypto_time, header=header)
+
+    def _record_received(self, header, payload, deserialize_time):
+        """
+        Updates the metrics of a received message, with its latency if the sender embedded a timestamp.
+        :param header: message header
+        :param payload: decrypted message
+        :param deserialize_time: seconds the deserialisation took
+        :return: None
+        """
+
+        if not METRICS.enabled:
+            return
+
+        header = self._header_label(header)
+        METRICS.inc('fiveinarow_messages_total', direction='received', header=header)
+        METRICS.observe('fiveinarow_message_bytes', len(payload), BYTES_BUCKETS, direction='received',
+                        header=header, stage='plain')
+        METRICS.observe('fiveinarow_message_bytes', self.encomm.last_wire_size, BYTES_BUCKETS,
+                        direction='received', header=header, stage='wire')
+        METRICS.observe('fiveinarow_decrypt_seconds', self.encomm.last_crypto_time, header=header)
+        METRICS.observe('fiveinarow_deserialize_seconds', deserialize_time, header=header)
+        METRICS.observe('fiveinarow_recv_wait_seconds', self.encomm.llcomm.last_wait, header=header)
+
+        if not self.legacy_pickle:
+            sent = codec.timestamp(payload)
+            if sent is not None:
+                METRICS.observe('fiveinarow_latency_seconds', max(time.time() - sent, 0.0), header=header)
+
+    def _serialize_object(self, obj: DataPacket) -> bytes:
         """
         Method for serializing and object for sending.
-        :param data: DataPacket (or any object)
-        :return: pickled bytes representation of the object
+        :param data: DataPacket (or any object in legacy pickle mode)
+        :return: bytes representation of the object
         """
 
-        return pickle.dumps(obj)
+        if self.legacy_pickle:
+            return pickle.dumps(obj)
+        return codec.encode(obj.data, obj.header, timestamp=time.time() if self.timestamps else None)
 
-    def __reconstruct_object(self, byte_obj: bytes) -> DataPacket:
+    def _reconstruct_object(self, byte_obj: bytes) -> DataPacket:
         """
         Method for reconstructing object from bytes representation.
         :param byte_obj: bytes object
         :return: reconstructed DataPacket object
         """
 
-        return pickle.loads(byte_obj)
+        if self.legacy_pickle:
+            return pickle.loads(byte_obj)
+        data, header = codec.decode(byte_obj)
+        return self.DataPacket(data=data, header=header)
@@ -5,24 +5,34 @@ communicator class with RSA key exchange and symmetric encryption
 """
 
 import logging
+import time
 import rsa
-from cryptography.fernet import Fernet, InvalidToken
+import zmq
 from fiveinarow.ll_communictor import LLComm
+from fiveinarow import ciphers
+from fiveinarow.session_ticket import derive_key
 
 
 class EncryptedComm:
     SERVER = 'ser'
     CLIENT = 'cli'
 
+    llcomm_class = LLComm  # low level communicator implementation
+
     class RSAKeyUnsetException(Exception):
         pass
 
-    def __init__(self, mode, ip_addr, port, rsa_key_bits=None):
+    def __init__(self, mode, ip_addr, port, rsa_key_bits=None, socket_type=zmq.PAIR, llcomm=None, key_pool=None,
+                 suites=None):
         """
         :param mode: CLIENT or SERVER mode
         :param ip_addr: IP address of server
         :param port: communication port
         :param rsa_key_bits: key size in bits to generate, must be multiple of 256 and at least 1024 bits
+        :param socket_type: ZeroMQ socket type of the low level communicator
+        :param llcomm: low level communicator to use instead of making one, e.g. a session of a match server
+        :param key_pool: KeyPool the server takes its key-pair from instead of generating it
+        :param suites: cipher suite ids (see ciphers) to offer or accept, preferred first, all supported ones if None
         """
 
         assert(mode is not None)
@@ -46,38 +56,78 @@ class EncryptedComm:
                 assert (rsa_key_bits >= 1024 and rsa_key_bits % 256 == 0)
                 self.rsa_key_bits = rsa_key_bits
 
-        self.llcomm = LLComm(mode=self.mode, ip_addr=self.ip_addr, port=self.port)
+        if llcomm is not None:
+            self.llcomm = llcomm
+        else:
+            self.llcomm = self.llcomm_class(mode=self.mode, ip_addr=self.ip_addr, port=self.port, socket_type=socket_type)
 
+        self.key_pool = key_pool
         self.pubkey, self.privkey = None, None
         self.partner_pubkey = None
 
+        self.suites = list(suites) if suites is not None else list(ciphers.SUITES)
+        self.suite = ciphers.FERNET
         self.symm_key = None
         self.symmetric_cipher = None
 
         self.ready = False
 
-    def server_gen_rsa(self):
+        self.last_wire_size = 0  # bytes of the last message sent or received, after encryption
+        self.last_crypto_time = 0.0  # seconds the last encryption or decryption took
+        self.last_rejected = None  # last received message that could not be authenticated, see _decrypt
+
+    def server_gen_rsa(self, key_pair=None):
         """
-        Server mode function, generates new key-pair.
+        Server mode function, generates new key-pair or takes one from the key pool.
+        :param key_pair: (rsa.PublicKey, rsa.PrivateKey) to use instead, e.g. taken from a key pool by the caller
         :return: rsa.key.PublicKey
         """
 
-        (self.pubkey, self.privkey) = rsa.newkeys(self.rsa_key_bits)
+        if key_pair is not None:
+            (self.pubkey, self.privkey) = key_pair
+        elif self.key_pool is not None:
+            (self.pubkey, self.privkey) = self.key_pool.get()
+        else:
+            (self.pubkey, self.privkey) = rsa.newkeys(self.rsa_key_bits)
 
         return self.pubkey
 
+    def server_key_offer(self, key_pair=None):
+        """
+        Server mode function, data of the 'pubkey' message.
+        :param key_pair: key-pair to offer, see server_gen_rsa
+        :return: (rsa.key.PublicKey, cipher suites offered)
+        """
+
+        return self.server_gen_rsa(key_pair), self.suites
+
     def server_init_encryption(self, encrypted_symmkey):
         """
-        Stats server's encryption
-        :param encrypted_symmkey:
-        :return: None
+        Stats server's encryption, the cipher of an earlier key exchange is replaced only if this one succeeds.
+        :param encrypted_symmkey: suite id byte and symmetric key, encrypted with the public key.
+            A bare Fernet key from clients without suite negotiation is accepted too.
+        :return: bool, the new cipher is set, False also if no key was offered yet
         """
 
+        if self.privkey is None:
+            logging.error("symmetric key arrived before a public key was offered, symmetrical cipher untouched")
+            return False
+
         try:
-            self.symm_key = rsa.decrypt(encrypted_symmkey, self.privkey)
-            self._init_symm_encryption()
+            suite, symm_key = self.__split_session_key(rsa.decrypt(encrypted_symmkey, self.privkey))
         except rsa.DecryptionError:
             logging.error("cannot decrypt given data with private key, symmetrical cipher untouched")
+            return False
+
+        if suite not in self.suites:
+            logging.error("client chose cipher suite {}, which is not offered".format(suite))
+            return False
+
+        self.suite, self.symm_key = suite, symm_key
+        self.symmetric_cipher = None
+        self._init_symm_encryption()
+
+        return self.symmetric_cipher is not None
 
     def client_init_encryption(self):
         """
@@ -87,19 +137,66 @@ class EncryptedComm:
 
         self._init_symm_encryption()
 
-    def client_gen_symmetric_key(self, partner_pubkey):
+    def client_gen_symmetric_key(self, partner_offer):
         """
-        Generates random symmetric key, initialises cipher.
-        :param partner_pubkey: pubkey received from partner
-        :return: RSA encrypted symm key with partners public key
+        Chooses a cipher suite offered by the partner, generates random symmetric key.
+        :param partner_offer: data of the partner's 'pubkey' message, (pubkey, suites) or a bare pubkey
+        :return: RSA encrypted suite id and symm key with partners public key
         """
 
+        if isinstance(partner_offer, rsa.key.PublicKey):
+            partner_offer = (partner_offer, [])
+        partner_pubkey, offered_suites = partner_offer
         assert (isinstance(partner_pubkey, rsa.key.PublicKey))
 
         self.partner_pubkey = partner_pubkey
+        self.suite = ciphers.choose_suite(offered_suites, self.suites)
+
+        self.symm_key = ciphers.generate_key()
+        if len(offered_suites) == 0:
+            return rsa.encrypt(self.symm_key, self.partner_pubkey)  # the partner does not negotiate
+        return rsa.encrypt(self.session_key(), self.partner_pubkey)
+
+    def session_key(self):
+        """
+        :return: suite id byte and symmetric key of the current session
+        """
 
-        self.symm_key = Fernet.generate_key()
-        return rsa.encrypt(self.symm_key, self.partner_pubkey)
+        return bytes([self.suite]) + self.symm_key
+
+    @staticmethod
+    def __split_session_key(session_key):
+        """
+        :return: (suite id, symmetric key), keys without suite id byte are Fernet keys
+        """
+
+        if session_key[0] in ciphers.CIPHERS:
+            return session_key[0], session_key[1:]
+        return ciphers.FERNET, session_key
+
+    def resume_encryption(self, session_key, client_random, server_random):
+        """
+        Replaces the cipher with the one of a resumed session, both partners call it with the same values.
+        :param session_key: session_key() of the session the ticket was issued for
+        :param client_random: random bytes sent by the client with the ticket
+        :param server_random: random bytes sent by the server in 'resume_accept'
+        :return: None
+        """
+
+        suite, symm_key = self.__split_session_key(session_key)
+        self.suite = suite
+        self.symm_key = derive_key(symm_key, client_random, server_random)
+        self.symmetric_cipher = None
+        self._init_symm_encryption()
+
+    def reset_encryption(self):
+        """
+        Drops the symmetric cipher, messages are sent unencrypted until the next key exchange.
+        :return: None
+        """
+
+        self.symm_key = None
+        self.symmetric_cipher = None
 
     def _init_symm_encryption(self):
         """
@@ -110,7 +207,7 @@ class EncryptedComm:
         if self.symmetric_cipher is not None:
             logging.warning("Symmetric encryption cipher was already set")
         try:
-            self.symmetric_cipher = Fernet(self.symm_key)
+            self.symmetric_cipher = ciphers.make_cipher(self.suite, self.symm_key, self.mode)
             #self.ready = True
         except ValueError as e:
             logging.error(str(e))
@@ -119,26 +216,36 @@ class EncryptedComm:
     def _encrypt(self, secret):
         """
         Encrypts secret with symmetrical cipher IF AVAILABLE. Does nothing and returns input if no cipher is available.
+        The time it took and the size of the result are stored in last_crypto_time and last_wire_size.
         :param secret: data to encrypt
         :return: endrypted data
         """
 
+        start = time.perf_counter()
         if self.symmetric_cipher is None:
             if self.ready:
                 logging.warning("no cipher set, cannot encrypt")
             data = secret
         else:
             data = self.symmetric_cipher.encrypt(secret)
+        self.last_crypto_time = time.perf_counter() - start
+        self.last_wire_size = len(data)
 
         return data
 
     def _decrypt(self, data):
         """
         Decrypts given data with symmetrical cipher. Does nothing and returns input if no cipher is available.
-        :param data:
-        :return:
+        Once a cipher is set, messages it cannot authenticate are rejected: None is returned and the message is
+        kept in last_rejected, the communicator accepts only the plaintext messages of the handshakes from there.
+        The time it took and the size of the input are stored in last_crypto_time and last_wire_size.
+        :param data: received bytes
+        :return: decrypted bytes, None if the message was rejected
         """
 
+        start = time.perf_counter()
+        self.last_wire_size = len(data)
+        self.last_rejected = None
         if self.symmetric_cipher is None:
             if self.ready:
                 logging.warning("no cipher set, cannot decrypt")
@@ -146,29 +253,36 @@ class EncryptedComm:
         else:
             try:
                 secret = self.symmetric_cipher.decrypt(data)
-            except InvalidToken as e:
-                logging.warning("invalid token, cannot decrypt")
-                secret = data
+            except ciphers.InvalidMessage as e:
+                logging.warning("invalid token, message rejected")
+                self.last_rejected = data
+                secret = None
+        self.last_crypto_time = time.perf_counter() - start
 
         return secret
 
-    def send(self, data, timeout=None):
+    def send(self, data, timeout=None, plaintext=False):
         """
         Encrypts and sends data through LowLevel communicator.
         :param data: data to send
         :param timeout: has no effect
+        :param plaintext: send without encryption, for the messages of the handshakes
         :return: None
         """
 
         #logging.debug("sending encrypted data: {}".format(data))
-        encrypted_data = self._encrypt(data)
+        if plaintext:
+            encrypted_data = data
+            self.last_wire_size, self.last_crypto_time = len(data), 0.0
+        else:
+            encrypted_data = self._encrypt(data)
         self.llcomm.send(encrypted_data, timeout=timeout)
 
     def recv(self, timeout):
         """
         If receives data within the specified timeout tries to decrypt and return it.
         :param timeout: seconds, 0 for nonblocking, None for no timeout
-        :return: received data
+        :return: received data, None on timeout or if the message was rejected
         """
 
         encrypted_data = self.llcomm.recv(timeout=timeout)
@@ -177,6 +291,7 @@ class EncryptedComm:
             #logging.debug("recieved encrypted data: {}".format(data))
             return data
         else:
+            self.last_rejected = None
             return None
 
 
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+Computer opponent, iterative-deepening alpha-beta search on a game board
+"""
+
+import logging
+import time
+
+from fiveinarow.game_board import Player
+from fiveinarow.evaluator import Evaluator
+from fiveinarow.transposition import TranspositionTable
+
+
+class Engine:
+    WIN_SCORE = Evaluator.WIN_SCORE
+
+    # value of a num_to_win long window holding only one player's stones, indexed by missing stones
+    WINDOW_VALUES = Evaluator.WINDOW_VALUES
+    THREAT_SCORE = Evaluator.THREAT_SCORE  # evaluation of a position the player on move wins in one move
+
+    class SearchTimeout(Exception):
+        pass
+
+    def __init__(self, time_budget_ms=1000, max_depth=8, radius=2, max_branching=12, tt=None):
+        """
+        :param time_budget_ms: search time limit in milliseconds, None to always search to max_depth
+        :param max_depth: maximal search depth in plies
+        :param radius: candidate moves are empty cells at most this far from a stone
+        :param max_branching: number of best ordered candidate moves searched in each node
+        :param tt: TranspositionTable, may be shared between searches, a new 16 MiB table is made if None
+        """
+
+        self.time_budget_ms = time_budget_ms
+        self.max_depth = max_depth
+        self.radius = radius
+        self.max_branching = max_branching
+        self.tt = tt if tt is not None else TranspositionTable()
+
+        self.deadline = None
+        self.nodes = 0
+        self.evaluator = None  # follows the board during a search
+
+    def best_move(self, board, player_id, opponent_id=None):
+        """
+        Searches the best move for a player with iterative deepening until the time budget is spent.
+        :param board: Board, restored to its original state on return
+        :param player_id: player on move
+        :param opponent_id: the other player, defaults to 1 - player_id
+        :return: position tuple, None if the board is full
+        """
+
+        if opponent_id is None:
+            opponent_id = 1 - player_id
+
+        moves = self.ordered_moves(board, player_id, opponent_id)
+        if len(moves) == 0:
+            return None
+        if len(moves) == 1:
+            return moves[0]
+
+        self.deadline = time.perf_counter() + (self.time_budget_ms / 1000 if self.time_budget_ms is not None
+                                               else float('inf'))
+        self.nodes = 0
+        self.evaluator = Evaluator(board, self.WINDOW_VALUES)
+
+        best = moves[0]
+        try:
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    score, move = self._search_root(board, moves, depth, player_id, opponent_id)
+                except self.SearchTimeout:
+                    break
+
+                best = move
+                # search the previous best move first in the next iteration
+                moves.remove(move)
+                moves.insert(0, move)
+                logging.debug("depth {} best move {} score {} nodes {} tt hit rate {:.2f}".format(
+                    depth, move, score, self.nodes, self.tt.hit_rate()))
+                if abs(score) > self.WIN_SCORE // 2:  # forced win or loss found, deeper search will not change it
+                    break
+        finally:
+            self.evaluator.detach()
+            self.evaluator = None
+
+        return best
+
+    def _search_root(self, board, moves, depth, player_id, opponent_id):
+        """
+        Searches the root moves to a given depth.
+        :return: (score, move) of the best root move
+        """
+
+        alpha = -self.WIN_SCORE - 1
+        best = None
+        for move in moves:
+            score = self._search_move(board, move, depth, alpha, self.WIN_SCORE + 1, player_id, opponent_id)
+            if best is None or score > alpha:
+                alpha = score
+                best = move
+
+        return alpha, best
+
+    def _search_move(self, board, move, depth, alpha, beta, player_id, opponent_id):
+        """
+        Places a move, scores it from the mover's point of view and takes it back.
+        """
+
+        board.place(move, player_id)
+        try:
+            status = board.check_board()
+            if status is not None:
+                score = self.WIN_SCORE - board.num_moves if status[1] != (0, 0) else 0
+            else:
+                score = -self.__negamax(board, depth - 1, -beta, -alpha, opponent_id, player_id)
+        finally:
+            board.undo()
+
+        return score
+
+    def __negamax(self, board, depth, alpha, beta, player_id, opponent_id):
+        """
+        Alpha-beta search in negamax form, scores are from the point of view of the player on move.
+        """
+
+        self.nodes += 1
+        if self.nodes & 31 == 0 and time.perf_counter() > self.deadline:
+            raise self.SearchTimeout
+
+        if depth == 0:
+            return self.evaluate(board, player_id, opponent_id)
+
+        tt_move = None
+        entry = self.tt.probe(board.zobrist)
+        if entry is not None:
+            tt_depth, value, flag, move = entry
+            if move != TranspositionTable.NO_MOVE:
+                tt_move = divmod(move, board.size[1])
+            if tt_depth >= depth:
+                if flag == TranspositionTable.EXACT:
+                    return value
+                if flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+        alpha_orig = alpha  # after the table's bounds: a score not above a raised alpha is only an upper bound
+
+        moves = self.ordered_moves(board, player_id, opponent_id)[:self.max_branching]
+        if len(moves) == 0:
+            return 0
+        if tt_move is not None and not board.is_occupied(tt_move):
+            if tt_move in moves:
+                moves.remove(tt_move)
+            moves.insert(0, tt_move)
+
+        best_move = moves[0]
+        for move in moves:
+            score = self._search_move(board, move, depth, alpha, beta, player_id, opponent_id)
+            if score > alpha:
+                alpha = score
+                best_move = move
+                if alpha >= beta:
+                    break
+
+        if alpha <= alpha_orig:
+            flag = TranspositionTable.UPPER
+        elif alpha >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(board.zobrist, depth, alpha, flag, best_move[0] * board.size[1] + best_move[1])
+
+        return alpha
+
+    def candidate_moves(self, board):
+        """
+        Empty cells near the placed stones, the center cell on an empty board.
+        :param board: Board
+        :return: set of position tuples
+        """
+
+        if board.num_moves == 0:
+            return {(board.size[0] // 2, board.size[1] // 2)}
+
+        width, height = board.size
+        candidates = set()
+        for (x, y), _ in board.moves:
+            for cx in range(max(x - self.radius, 0), min(x + self.radius + 1, width)):
+                for cy in range(max(y - self.radius, 0), min(y + self.radius + 1, height)):
+                    candidates.add((cx, cy))
+
+        return {pos for pos in candidates if not board.is_occupied(pos)}
+
+    def ordered_moves(self, board, player_id, opponent_id):
+        """
+        Candidate moves ordered by the runs they make for the player and block for the opponent.
+        :return: list of position tuples, most promising first
+        """
+
+        n = board.num_to_win
+
+        def key(pos):
+            own = [min(length, n) for length in board.potential_runs(pos, player_id)]
+            other = [min(length, n) for length in board.potential_runs(pos, opponent_id)]
+            return (max(own) == n, max(other) == n,
+                    sum(length * length for length in own) + sum(length * length for length in other), pos)
+
+        return sorted(self.candidate_moves(board), key=key, reverse=True)
+
+    def evaluate(self, board, player_id, opponent_id):
+        """
+        Static evaluation, sums the values of all num_to_win long windows held by only one player.
+        During a search the incrementally updated evaluator of the searched board is read.
+        :return: score from the point of view of player_id
+        """
+
+        evaluator = self.evaluator
+        if evaluator is None or evaluator.board is not board:
+            evaluator = Evaluator(board, self.WINDOW_VALUES)
+            evaluator.detach()
+        return evaluator.evaluate(player_id, opponent_id)
+
+    def close(self):
+        """
+        Frees the resources kept between searches, the sequential engine has none.
+        :return: None
+        """
+
+        pass
+
+
+class EnginePlayer(Player):
+    def __init__(self, name, id, turn, time_budget_ms=1000, opponent_id=None, workers=1):
+        """
+        Player that chooses its own moves with an Engine.
+        :param time_budget_ms: thinking time per move in milliseconds
+        :param opponent_id: the other player's id, defaults to 1 - id
+        :param workers: number of processes searching the moves, more than one uses a ParallelEngine
+        """
+
+        super().__init__(name, id, turn)
+        self.time_budget_ms = time_budget_ms
+        self.opponent_id = 1 - id if opponent_id is None else opponent_id
+        self.workers = workers
+        self.engine = None
+
+    def __getstate__(self):
+        # the player is sent to the partner, the engine and its transposition table stay here
+        state = self.__dict__.copy()
+        state['engine'] = None
+        return state
+
+    def choose_move(self, board):
+        """
+        Searches a move on the board, the transposition table is kept between moves.
+        :param board: Board
+        :return: position tuple, None if there is no free cell
+        """
+
+        if self.engine is None:
+            if self.workers > 1:
+                from fiveinarow.parallel_engine import ParallelEngine
+
+                self.engine = ParallelEngine(workers=self.workers, time_budget_ms=self.time_budget_ms)
+            else:
+                self.engine = Engine(time_budget_ms=self.time_budget_ms)
+        return self.engine.best_move(board, self.id, self.opponent_id)
+
+    def close(self):
+        """
+        Closes the engine, e.g. stops the worker processes of a ParallelEngine. A later move starts a new one.
+        :return: None
+        """
+
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Static position evaluation from incrementally updated num_to_win long windows
+"""
+
+
+WINDOW_TABLES = dict()
+
+MIXED = -2  # owner of a window holding stones of more than one player
+
+
+def window_table(shape, num_to_win):
+    """
+    Every num_to_win long window of the board in the four Board.DIRECTIONS, the same for every board of the given shape.
+    :param shape: board size value-pair, tuple
+    :param num_to_win: window length
+    :return: (cells of each window, windows of each cell), cells are Board bit indices
+    """
+
+    cache_key = (tuple(shape), num_to_win)
+    if cache_key not in WINDOW_TABLES:
+        width, height = shape
+        stride = height + 1  # the Board's bit index layout
+        window_cells = []
+        cell_windows = [[] for _ in range(width * stride)]
+        for dx, dy in [(1, 0), (1, 1), (0, 1), (-1, 1)]:
+            for x in range(width):
+                for y in range(height):
+                    end_x, end_y = x + (num_to_win - 1) * dx, y + (num_to_win - 1) * dy
+                    if not (0 <= end_x < width and end_y < height):
+                        continue
+                    cells = [(x + k * dx) * stride + y + k * dy for k in range(num_to_win)]
+                    for cell in cells:
+                        cell_windows[cell].append(len(window_cells))
+                    window_cells.append(cells)
+        WINDOW_TABLES[cache_key] = (window_cells, cell_windows)
+
+    return WINDOW_TABLES[cache_key]
+
+
+class Evaluator:
+    WIN_SCORE = 10 ** 9
+
+    # value of a window holding only one player's stones, indexed by missing stones
+    WINDOW_VALUES = [WIN_SCORE // 10, 100000, 1000, 100, 10, 1]
+    THREAT_SCORE = WIN_SCORE // 4  # evaluation of a position the player on move wins in one move
+
+    def __init__(self, board, window_values=None):
+        """
+        Keeps the stone count of every num_to_win long window of the board up to date through the board's listener
+        hook, so placing or taking back a stone only touches the windows through its cell instead of the whole board.
+        The board is followed until detach is called.
+        :param board: Board, its moves so far are replayed
+        :param window_values: values of single player windows indexed by missing stones, WINDOW_VALUES if None
+        """
+
+        self.board = board
+        self.num_to_win = board.num_to_win
+        self.stride = board.stride
+        self.window_cells, self.cell_windows = window_table(board.size, board.num_to_win)
+
+        values = self.WINDOW_VALUES if window_values is None else window_values
+        # value of a window by the number of stones in it, the lookup table of the updates
+        self.values = [values[self.num_to_win - count] if self.num_to_win - count < len(values) else 0
+                       for count in range(self.num_to_win + 1)]
+
+        self.cleared()
+        for pos, player_id in board.moves:
+            self.placed(pos, player_id)
+        board.add_listener(self)
+
+    def detach(self):
+        """
+        Stops following the board.
+        :return: None
+        """
+
+        self.board.remove_listener(self)
+
+    def cleared(self):
+        num_windows = len(self.window_cells)
+        self.stones = dict()  # bit index -> player id
+        self.totals = [0] * num_windows  # stones in each window
+        self.owners = [None] * num_windows  # the only player in each window, None if empty, MIXED if shared
+        self.counts = dict()  # player id -> stones of the player in each window
+        self.scores = dict()  # player id -> sum of the values of the windows the player owns
+        self.histograms = dict()  # player id -> number of owned windows by the stones in them
+        self.threats = dict()  # player id -> {bit index of an empty cell completing a window: number of windows}
+
+    def __add_player(self, player_id):
+        self.counts[player_id] = [0] * len(self.window_cells)
+        self.scores[player_id] = 0
+        self.histograms[player_id] = [0] * (self.num_to_win + 1)
+        self.threats[player_id] = dict()
+
+    def __empty_cell(self, window):
+        for cell in self.window_cells[window]:
+            if cell not in self.stones:
+                return cell
+
+    def __remove_window(self, window, owner, count):
+        """
+        Takes a window's contribution off its owner's score, histogram and threats.
+        """
+
+        self.scores[owner] -= self.values[count]
+        self.histograms[owner][count] -= 1
+        if count == self.num_to_win - 1:
+            threats = self.threats[owner]
+            cell = self.__empty_cell(window)
+            if threats[cell] == 1:
+                del threats[cell]
+            else:
+                threats[cell] -= 1
+
+    def __add_window(self, window, owner, count):
+        self.scores[owner] += self.values[count]
+        self.histograms[owner][count] += 1
+        if count == self.num_to_win - 1:
+            threats = self.threats[owner]
+            cell = self.__empty_cell(window)
+            threats[cell] = threats.get(cell, 0) + 1
+
+    def placed(self, pos, player_id):
+        if player_id not in self.counts:
+            self.__add_player(player_id)
+
+        index = pos[0] * self.stride + pos[1]
+        counts = self.counts[player_id]
+        totals, owners = self.totals, self.owners
+        windows = self.cell_windows[index]
+
+        # the windows' old contributions are taken off while the cell is still empty, it is their threat cell
+        for window in windows:
+            owner = owners[window]
+            if owner is not None and owner != MIXED:
+                self.__remove_window(window, owner, totals[window])
+
+        self.stones[index] = player_id
+        for window in windows:
+            owner = owners[window]
+            total = totals[window] + 1
+            totals[window] = total
+            counts[window] += 1
+            if owner is None or owner == player_id:
+                owners[window] = player_id
+                self.__add_window(window, player_id, total)
+            else:
+                owners[window] = MIXED
+
+    def undone(self, pos, player_id):
+        index = pos[0] * self.stride + pos[1]
+        counts = self.counts[player_id]
+        totals, owners = self.totals, self.owners
+        windows = self.cell_windows[index]
+
+        for window in windows:
+            owner = owners[window]
+            if owner == player_id:
+                self.__remove_window(window, owner, totals[window])
+
+        del self.stones[index]
+        for window in windows:
+            total = totals[window] - 1
+            totals[window] = total
+            counts[window] -= 1
+            if total == 0:
+                owners[window] = None
+                continue
+            if owners[window] == MIXED:
+                owner = self.__owner(window, total)
+                if owner == MIXED:
+                    continue
+                owners[window] = owner
+            self.__add_window(window, owners[window], total)
+
+    def __owner(self, window, total):
+        for player_id, counts in self.counts.items():
+            if counts[window] == total:
+                return player_id
+        return MIXED
+
+    def threat_cells(self, player_id):
+        """
+        :return: positions where the player would complete num_to_win in a row
+        """
+
+        return [divmod(cell, self.stride) for cell in self.threats.get(player_id, ())]
+
+    def windows(self, player_id):
+        """
+        :return: list, number of windows holding only the player's stones, indexed by the number of stones
+        """
+
+        return list(self.histograms.get(player_id, [0] * (self.num_to_win + 1)))
+
+    def evaluate(self, player_id, opponent_id):
+        """
+        Sums the values of the windows held by only one player.
+        :param player_id: player on move, the score is from its point of view
+        :param opponent_id: the other player
+        :return: score, THREAT_SCORE if the player on move can complete a window,
+            -THREAT_SCORE // 2 if the opponent can complete windows on two cells, only one of them can be blocked
+        """
+
+        if len(self.threats.get(player_id, ())) > 0:
+            return self.THREAT_SCORE
+        if len(self.threats.get(opponent_id, ())) >= 2:
+            return -self.THREAT_SCORE // 2
+
+        return self.scores.get(player_id, 0) - self.scores.get(opponent_id, 0)
@@ -7,31 +7,32 @@ Five in a row game, network dual player mode
 import logging
 import pygame
 import socket
-import json
 import sys
 import time
 import os
 
-from fiveinarow.communicator import Communicator, TimeoutException, validate_hostname
-from fiveinarow.game_board import Grid, Board, Player
+from fiveinarow.game_session import GameSession
+from fiveinarow.pg_grid import Grid
+from fiveinarow.solver import Solver
 from fiveinarow.pg_text_input import TextBox
+from fiveinarow.text_cache import TEXT_CACHE
+from fiveinarow.frame_scheduler import FrameScheduler
+from fiveinarow.frame_profiler import FrameProfiler
 from fiveinarow.pg_button import PushButton
 
 
 class FiveInaRow:
-    SERVER = Communicator.SERVER
-    CLIENT = Communicator.CLIENT
+    SERVER = GameSession.SERVER
+    CLIENT = GameSession.CLIENT
 
     FIRSTMOVE = True
 
-    config_ids = ['numgridx', 'numgridy', 'bgcolor', 'gridcolor', 'n_to_win', 'port', 'rsakeybits', 'network_timeout',
-                  'connection_timeout', 'comm_timeout', 'verbose', 'bold_grid', 'textcolor', 'box_colors',
-                  'player_colors']
-
-    def __init__(self, mode, test=False):
+    def __init__(self, mode, test=False, bot=False, resume=None):
         """
-        Initialises game in given mode. Tries to load configuration.
+        Initialises the pygame front-end of a game session in given mode.
         :param mode: server or client mode
+        :param bot: the local player is played by the engine
+        :param resume: client mode, session of a previous connection (its comm.session) to resume without key exchange
         """
         if test:
             self.mode_str = "TEST"
@@ -41,42 +42,24 @@ class FiveInaRow:
         assert(mode in [self.SERVER, self.CLIENT])
 
         self.mode = mode
+        self.bot = bot
         self.mode_str = "Server" if self.mode == self.SERVER else "Client"
         self.window_size = (640, 640)
 
-        self.config_file_name = 'config.txt'
-        self.conf = dict()
-        try:
-            self.load_config()
-        except FileNotFoundError as e:
-            self.set_default_config()
-            self.save_config()
-        except json.JSONDecodeError as e:
-            print("Invalid JSON in config file, using default config")
-            self.set_default_config()
-
-        self.hello_header = b"hello_fir_server"
-
+        self.session = GameSession(mode, bot=bot, resume=resume)
+        self.session.on_move = self.__on_move
+        self.conf = self.session.conf
+        self.key_pool = None  # server mode, KeyPool of the rsa_key_cache config value
 
         self.sounds = dict()
         self.grid = None
-        self.player = None
-        self.other_player = None
-        self.server_conf = None
-        self.encrypted_comm = False
-        self.is_connected = False
-        self.is_ready = False
-        self.recv_buffer = []
+        self.overlay_rects = []
 
         self._pygame_init()
 
         self.mute = True
         self.__pygame_music_init()
 
-        self.game_is_on = False
-        self.board_status = None
-
-
     def start(self):
         """
         Starts the game init procedure. Initialises communicators, connection, encryption.
@@ -102,6 +85,8 @@ class FiveInaRow:
 
         pygame.init()
         self.clock = pygame.time.Clock()
+        self.scheduler = FrameScheduler(self.clock, max_fps=self.conf.get('fps', 60))
+        self.profiler = FrameProfiler(trace=bool(self.conf.get('frame_trace_file')))
         pygame.display.set_caption("Five in a row - {}".format(self.mode_str))
         self.screen = pygame.display.set_mode(self.window_size)
         self.done = False
@@ -120,61 +105,6 @@ class FiveInaRow:
         self.sounds['conn'] = pygame.mixer.Sound(os.path.join(sound_dir, 'connected.ogg'))
         self.sounds['end'] = pygame.mixer.Sound(os.path.join(sound_dir,'game_end3.ogg'))
 
-    def set_default_config(self):
-        """
-        Setting default config values.
-        :return: None
-        """
-
-        self.conf['numgridx'] = 15
-        self.conf['numgridy'] = 15
-        self.conf['bgcolor'] = (211, 211, 211)
-        self.conf['gridcolor'] = (42, 42, 42)
-        self.conf['n_to_win'] = 5
-        self.conf['port'] = 14522
-        self.conf['rsakeybits'] = 1024
-        self.conf['network_timeout'] = 15
-        self.conf['connection_timeout'] = 5
-        self.conf['comm_timeout'] = 3
-        self.conf['verbose'] = True
-        self.conf['bold_grid'] = False
-        self.conf['textcolor'] = (42, 42, 42)
-        self.conf['box_colors'] = {'akt': tuple(pygame.Color('dodgerblue2')),
-                                   'ina': tuple(pygame.Color('lightskyblue3')),
-                                   'txt': (42, 42, 42),
-                                   'bg': (211, 211, 211)}
-        self.conf['player_colors'] = [(255, 0, 0), (0, 0, 0)]
-
-    def __check_config(self):
-        """
-        Checks if the config file contains every needed config values, if one is missing, loads default config.
-        :return: None
-        """
-
-        for c in self.config_ids:
-            if c not in self.conf:
-                print("Config value missing: {}, using default config".format(c))
-                self.set_default_config()
-                return
-
-    def save_config(self):
-        """
-        Saves the configuration to a JSON file.
-        :return:
-        """
-        with open(self.config_file_name, 'w') as conf_file:
-            json.dump(self.conf, conf_file, sort_keys=True, indent=4)
-
-    def load_config(self):
-        """
-        Loads configuration values from JSON file
-        :return: None
-        """
-
-        with open(self.config_file_name, 'r') as conf_file:
-            self.conf = json.load(conf_file)
-            self.__check_config()
-
     def __init_server(self):
         """
         Initialises server mode. Prints servers ip addresses.
@@ -183,6 +113,13 @@ class FiveInaRow:
 
         self.ip_list = socket.gethostbyname_ex(socket.gethostname())[2]
 
+        # keys cached by previous runs are ready at once, a new one is made in the background while the setup runs
+        if self.conf.get('rsa_key_cache'):
+            from fiveinarow.keypool import KeyPool
+
+            self.key_pool = KeyPool(self.conf['rsakeybits'], size=1, cache_dir=self.conf['rsa_key_cache'])
+            self.key_pool.start()
+
         player_name = 'Player'
         numgridx = self.conf['numgridx']
         numgridy = self.conf['numgridy']
@@ -206,7 +143,7 @@ class FiveInaRow:
         firstmove = False
         while not self.done and not setup_complete:
             self.screen.fill(self.conf['bgcolor'])
-            for event in pygame.event.get():
+            for event in self.scheduler.wait():
                 self.__process_exit_event(event)
                 name_input_box.proc_event(event)
                 grid_input_boxx.proc_event(event)
@@ -254,51 +191,44 @@ class FiveInaRow:
                 pb.active(False)
 
             pygame.display.update()
-            self.clock.tick(15)
 
         if len(player_name) == 0:
             player_name = "server's player"
 
-        self.set_player(player_name, firstmove)
+        self.session.set_player(player_name, firstmove)
         self.conf['numgridx'] = numgridx
         self.conf['numgridy'] = numgridy
         self.conf['port'] = port
 
-        self.comm = Communicator(mode=self.SERVER)
-        self.comm.init_connection(port=self.conf['port'], rsa_key_bits=self.conf['rsakeybits'])
+        self.session.open_server(key_pool=self.key_pool)
+        self.scheduler.watch(self.session.comm.encomm.llcomm.socket)
 
-        while not self.done and not self.is_connected:
+        while not self.done and not self.session.is_ready:
             self.screen.fill(self.conf['bgcolor'])
-            for event in pygame.event.get():
+            for event in self.scheduler.wait():
                 self.__process_exit_event(event)
 
-            self.font = pygame.font.SysFont("Courier New", 24)
-            txt_surface = self.font.render("Your IP address is: ", True, self.conf['textcolor'])
+            txt_surface = TEXT_CACHE.render("Your IP address is: ", 24, self.conf['textcolor'], font="Courier New")
             self.screen.blit(txt_surface, (300, 15))
 
             # Render the current text.
             y = 55
             for ipaddr in self.ip_list:
-                txt_surface = self.font.render(ipaddr, True, self.conf['textcolor'])
+                txt_surface = TEXT_CACHE.render(ipaddr, 24, self.conf['textcolor'], font="Courier New")
                 self.screen.blit(txt_surface, (355, y))
                 y += 32
 
-            txt_surface = self.font.render("Port is: ", True, self.conf['textcolor'])
+            txt_surface = TEXT_CACHE.render("Port is: ", 24, self.conf['textcolor'], font="Courier New")
             self.screen.blit(txt_surface, (300, y))
-            txt_surface = self.font.render("{}".format(self.conf['port']), True, self.conf['textcolor'])
+            txt_surface = TEXT_CACHE.render("{}".format(self.conf['port']), 24, self.conf['textcolor'], font="Courier New")
             self.screen.blit(txt_surface, (355, y+40))
 
             pb.draw(setup_complete)
 
-            self.__recieve_data()
-            self.__process_recieved_data()
-
-            if self.is_connected:
+            if self.session.connect_step():
                 self.print_connected()
-                self.initial_connection()
 
             pygame.display.update()
-            self.clock.tick(15)
 
     def __init_client(self):
         """
@@ -306,7 +236,7 @@ class FiveInaRow:
         :return: None
         """
 
-        self.comm = Communicator(mode=self.CLIENT)
+        from fiveinarow.communicator import validate_hostname
 
         box_dim = (50, 50, 200, 32)
         ip_input_box = TextBox(self.screen, dim=box_dim, colors=self.conf['box_colors'], title="Enter host IP address:")
@@ -328,7 +258,7 @@ class FiveInaRow:
         firstmove = False
         while not self.done and not setup_complete:
             self.screen.fill(self.conf['bgcolor'])
-            for event in pygame.event.get():
+            for event in self.scheduler.wait():
                 self.__process_exit_event(event)
                 name_input_box.proc_event(event)
                 pb.proc_event(event)
@@ -378,59 +308,31 @@ class FiveInaRow:
                 pb.active(False)
 
             pygame.display.update()
-            self.clock.tick(15)
 
         if len(player_name) == 0:
             player_name = "client's player"
 
-        self.set_player(player_name, firstmove)
+        self.session.set_player(player_name, firstmove)
 
         self.ip_addr = ip_addr
         self.conf['port'] = port
 
-        self.comm.init_connection(port=self.conf['port'], hostname=self.ip_addr)
-        conn_start = time.time()
+        self.print_connecting()
+        pygame.display.update()
+        self.session.open_client(self.ip_addr)
+        self.scheduler.watch(self.session.comm.encomm.llcomm.socket)
 
-        self.__say_hello()
-        last_hello = time.time()
-
-        while not self.done and not self.is_ready:
+        while not self.done and not self.session.is_ready:
             self.screen.fill(self.conf['bgcolor'])
-            for event in pygame.event.get():
+            for event in self.scheduler.wait(timeout_ms=250):  # hello is repeated every 0.5 s
                 self.__process_exit_event(event)
 
             self.print_connecting()
-            if self.is_connected:
-                self.initial_connection()
-            else:
-                if time.time() - last_hello > 0.5:
-                    last_hello = time.time()
-                    self.__say_hello()
-                self.__recieve_data()
-                self.__process_recieved_data()
-            if (time.time() - conn_start) > self.conf['connection_timeout']:
-                self.comm.encomm.llcomm.clear_send_queue()
-                raise TimeoutException
+            if self.session.connect_step():
+                self.print_connected()
 
             pygame.display.update()
-            self.clock.tick(15)
-
-
-    def __say_hello(self):
-        """
-        Send a hello message to the partner (server).
-        TODO: Used for checking if connection is alive.
-        :return: None
-        """
-
-        self.__send(data=self.hello_header, header='hello')
 
-    def __answer_hello(self):
-        """
-        Send answer for the hello message to the partner (client).
-        :return: None
-        """
-        self.__send(data=self.hello_header[::-1], header='hello_answer')
 
     def __process_exit_event(self, event):
         """
@@ -452,20 +354,20 @@ class FiveInaRow:
         :param clear: wheter the screen should be fill with backgroud color before printing text (default clear)
         :param font: text font
         :param fontsize: size of the font (default 50)
-        :return: None
+        :return: rect of the text
         """
-        if clear:
-            self.screen.fill(self.conf['bgcolor'])
-        _font = pygame.font.SysFont(font, fontsize)
-        if color is not None:
-            textcolor = color
-        else:
-            textcolor = self.conf['textcolor']
-        txt_surface = _font.render(text, True, textcolor)
-        screensize = pygame.display.get_surface().get_size()
-        textsize = _font.size(text)
-        textpos = tuple(map(lambda x, y: (x - y) / 2, screensize, textsize))
-        self.screen.blit(txt_surface, textpos)
+        with self.profiler.phase('text'):
+            if clear:
+                self.screen.fill(self.conf['bgcolor'])
+            if color is not None:
+                textcolor = color
+            else:
+                textcolor = self.conf['textcolor']
+            txt_surface = TEXT_CACHE.render(text, fontsize, textcolor, font=font)
+            screensize = pygame.display.get_surface().get_size()
+            textsize = txt_surface.get_size()
+            textpos = tuple(map(lambda x, y: (x - y) / 2, screensize, textsize))
+            return self.__overlay(self.screen.blit(txt_surface, textpos))
 
     def print_text(self, text, pos, color=None, font=None, fontsize=16):
         """
@@ -475,15 +377,25 @@ class FiveInaRow:
         :param color: text color, tuple (default: 'textcolor' config)
         :param font: font name, str
         :param fontsize: font size, number (default: 16)
-        :return: None
+        :return: rect of the text
         """
-        _font = pygame.font.SysFont(font, fontsize)
-        if color is not None:
-            textcolor = color
-        else:
-            textcolor = self.conf['textcolor']
-        txt_surface = _font.render(text, True, textcolor)
-        self.screen.blit(txt_surface, pos)
+        with self.profiler.phase('text'):
+            if color is not None:
+                textcolor = color
+            else:
+                textcolor = self.conf['textcolor']
+            txt_surface = TEXT_CACHE.render(text, fontsize, textcolor, font=font)
+            return self.__overlay(self.screen.blit(txt_surface, pos))
+
+    def __overlay(self, rect):
+        """
+        Keeps track of the screen rects drawn over the grid in this frame, they are updated and erased next frame.
+        :param rect: pygame.Rect
+        :return: the rect
+        """
+
+        self.overlay_rects.append(rect)
+        return rect
 
     def print_connecting(self):
         txt = "Connecting to " + self.ip_addr + " . . ."
@@ -493,198 +405,38 @@ class FiveInaRow:
         text = "Connected"
         self.print_center_text(text)
 
-    def __apply_server_conf(self, recv_conf):
-        """
-        Apply selected configuration items recieved from server.
-        :param recv_conf: configuration dict
-        :return: None
-        """
-        if self.mode == self.CLIENT:
-            conf_to_apply = ['numgridx', 'numgridy', 'n_to_win']
-            for c in conf_to_apply:
-                self.conf[c] = recv_conf[c]
-
-    def initial_connection(self):
-        """
-        Initialising connection to partner.
-        :return: None
-        """
-        if not self.encrypted_comm:
-            self.encrypted_comm = self.comm.init_encryption()
-
-        if self.mode == self.CLIENT and self.encrypted_comm:
-            self.server_conf, header = self.__recv(timeout=0)
-            if header == 'server_config':
-                self.__apply_server_conf(self.server_conf)
-                self.is_ready = True
-                self.print_connected()
-
-        elif self.mode == self.SERVER and self.encrypted_comm:
-            self.__send(self.conf, 'server_config')
-            self.is_ready = True
-
-    def get_other_player(self):
-        """
-        TODO make it a 'partner_request'
-        Sends a request to the partner, to send its players info.
-        :return: None
-        """
-
-        self.__send(None, 'get_player')
-
-    def player_on_move(self, player_id):
-        """
-        Checks if player is allowed to move.
-        :param player_id:
-        :return: bool, if player is able to move
-        """
-
-        if player_id == self.other_player.id and self.other_player.turn:
-            return True
-        if player_id == self.player.id and self.player.turn:
-            return True
-
-        return False
-
-    def next_player(self):
+    def __on_move(self, pos, player_id):
         """
-        Go to the next player
-        :return: None
-        """
-
-        self.player.turn = not self.player.turn
-        self.other_player.turn = not self.other_player.turn
-
-    def send_request(self, request):
-        """
-        Send a request headered data packet to the partner.
-        :param request: request data
-        :return: None
-        """
-        self.__send(request, 'partner_request')
-
-    def __process_move(self, pos, player_id):
-        """
-        Checks if move is valid, places on board and updates game- and board status.
+        Plays the move sound for the partner's moves.
         :param pos: position tuple
         :param player_id: placing player's id
         :return: None
         """
 
-        if not self.game_is_on:
-            logging.debug('Dropped move {}, game is not on'.format(pos))
-            return
-
-        if self.player_on_move(player_id):
-            self.game_is_on, self.board_status, success = self.grid.place(pos, player_id)
-            if success:
-                self.next_player()
-                if player_id == self.player.id:
-                    self.__send(pos, 'move')
-
+        if player_id != self.session.player.id and not self.mute:
+            self.sounds['move'].play()
 
-
-    def __send(self, data, header):
+    def __show_hint(self):
         """
-        Sends data to partner.
-        :param data: data part
-        :param header: header part
+        Searches a forced win for the player, the first move of it is shown until the next move.
         :return: None
         """
 
-        self.comm.encrypted_send(data, header)
-
-    def __recv(self, timeout=0):
-        """
-        Receives data from partner.
-        :param timeout: receive timeout in seconds
-        :return: (data, header), None if nothing was received
-        """
-
-        return self.comm.encrypted_recv(timeout=timeout)
-
-    def __recieve_data(self, timeout=0, retries=0):
-        """
-        Receives data and appends it to the receive buffer.
-        :param timeout: timeout of each receiving attempt
-        :param retries: number of times to try again, ignored if timeout is 0
-        :return: None
-        """
+        session = self.session
+        if not session.game_is_on or not session.player_on_move(session.player.id):
+            return
 
-        if timeout == 0:
-            tries = 1
-        else:
-            tries = retries + 1
-        while tries > 0:
-            data, header = self.__recv(timeout=timeout)
-            if data is not None or header is not None:
-                self.recv_buffer.append((data, header))
-                return
-            tries -= 1
+        result, sequence = Solver(timeout_ms=500).solve(session.board, session.player.id, session.other_player.id)
+        self.hint = sequence[0] if result == Solver.WIN else Solver.UNKNOWN
 
-    def __process_recieved_data(self):
+    def __draw_profiler_overlay(self):
         """
-        If some data is in the receive buffer proccesses it and acts.
+        Prints the frame and phase times of the profiler below the score line.
         :return: None
         """
 
-        if len(self.recv_buffer) == 0:
-            return
-
-        for data, header in self.recv_buffer:
-            logging.debug("header: {}".format(header))
-            if header is None:
-                logging.debug("recieved data without header: {}".format(data), end='')
-                continue
-
-            if header == 'hello':
-                self.__answer_hello()
-                self.is_connected = True
-                continue
-
-            if header == 'hello_answer':
-                self.is_connected = True
-                continue
-
-            if header[:5] == 'echo_':
-                self.__send(data, header)
-                continue
-
-            if header == 'move':
-                if not self.mute:
-                    self.sounds['move'].play()
-                self.__process_move(data, self.other_player.id)
-                continue
-
-            if header == 'get_player':
-                self.__send(data=self.player, header='my_player')
-                continue
-
-            if header == 'my_player':
-                self.other_player = data
-                continue
-
-            if header == 'partner_request':
-                if data == 'next_player':
-                    self.next_player()
-                    continue
-
-                if data == 'new_game':
-                    self.req_new_game = True
-                    self.next_player()
-                    continue
-
-                if data == 'start_game':
-                    self.game_is_on = True
-                    continue
-
-        self.recv_buffer = []
-
-    def set_player(self, name: str, first_move=False):
-        player_id = 0 if self.mode == self.SERVER else 1
-        self.player = Player(name, id=player_id, turn=first_move)
-
-        #self.player.turn = False if self.mode == self.SERVER else True
+        for i, line in enumerate(self.profiler.overlay_text()):
+            self.print_text(line, (16, 40 + 16 * i), color=self.conf['textcolor'], font='Courier', fontsize=14)
 
     def __mute_unmute(self):
         """
@@ -707,26 +459,10 @@ class FiveInaRow:
         :return: None
         """
 
-        self.grid = Grid(screen=self.screen, clock=self.clock, conf=self.conf)
+        self.session.init_game()
+        self.grid = Grid(screen=self.screen, clock=self.clock, conf=self.conf, board=self.session.board)
         self.grid.draw_grid(animate=True)
 
-        self.get_other_player()
-        self.__recieve_data(timeout=1, retries=2)
-        self.__process_recieved_data()
-
-        self.send_request('start_game')
-        self.__recieve_data(timeout=1, retries=2)
-        self.__process_recieved_data()
-
-        if self.player.turn == self.other_player.turn:
-            if self.mode == self.SERVER:
-                self.player.turn = not self.player.turn
-                self.__send(data=self.player, header='my_player')
-            else:
-                self.__recieve_data(timeout=1, retries=2)
-                self.__process_recieved_data()
-
-
         pygame.mixer.music.load(os.path.join('sounds', 'bg_music.ogg'))
         pygame.mixer.music.play(-1)
         pygame.mixer.music.set_volume(pygame.mixer.music.get_volume() * 0.3)
@@ -740,11 +476,27 @@ class FiveInaRow:
 
     def start_game(self):
         """
-        Starts main game loop.
+        Starts main game loop. The session and the key pool are closed and the frame trace is written when the loop
+        ends, also if it ends with an exception.
         :return: None
         """
 
         self.init_game()
+        try:
+            self.__game_loop()
+        finally:
+            self.session.close()
+            if self.key_pool is not None:  # stops the key generating process
+                self.key_pool.close()
+                self.key_pool = None
+            if self.conf.get('frame_trace_file'):
+                self.profiler.write_trace(self.conf['frame_trace_file'])
+
+    def __game_loop(self):
+        """
+        Main game loop, runs until done is set or the window is closed.
+        :return: None
+        """
 
         muted_img = pygame.image.load(os.path.join('images', 'muted.png'))
         muted_img.convert_alpha()
@@ -754,38 +506,74 @@ class FiveInaRow:
 
         self.game_start_time = time.time()
         self.game_end_time = None
-        self.req_new_game = False
-        new_game = False
+        self.hint = None
+        session = self.session
 
+        # only the changed rects are updated: new stones, and the texts of this and the previous frame
+        dirty_rects = self.grid.render()
+        self.overlay_rects = []
+
+        profiler = self.profiler
         while not self.done:
-            self.screen.fill(self.conf['bgcolor'])
-            for event in pygame.event.get():
-                self.__process_exit_event(event)
-                self.grid.process_event(event)
-                pb.proc_event(event)
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_m:
-                    self.__mute_unmute()
-                #    self.comm.check_echo()
+            profiler.begin_frame()
+            with profiler.phase(FrameProfiler.WAIT):
+                events = self.scheduler.wait()
+
+            with profiler.phase('grid'):
+                for rect in self.overlay_rects:
+                    dirty_rects.append(self.grid.restore(rect))
+                self.overlay_rects = []
+
+            with profiler.phase('events'):
+                for event in events:
+                    self.__process_exit_event(event)
+                    self.grid.process_event(event)
+                    pb.proc_event(event)
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_m:
+                        self.__mute_unmute()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                        self.__show_hint()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                        profiler.toggle_overlay()
+                        self.scheduler.request_frame()
+                    #    self.comm.check_echo()
 
             last_move = self.grid.get_gridcoord()
 
-            if self.game_is_on:
-                if self.player_on_move(self.player.id):
-                    self.print_text("Your turn", (16, 10), color=self.conf['player_colors'][self.player.id])
+            if session.game_is_on:
+                if session.player_on_move(session.player.id):
+                    self.print_text("Your turn", (16, 10), color=self.conf['player_colors'][session.player.id])
+                    if self.bot:
+                        with profiler.phase('engine'):
+                            last_move = session.bot_move()
                 if last_move is not None:
-                    self.__process_move(last_move, self.player.id)
+                    with profiler.phase('move'):
+                        session.process_move(last_move, session.player.id)
                     self.grid.clear_gridcoord()
-
-            self.__recieve_data()
-            self.__process_recieved_data()
-
-            if not self.game_is_on and self.board_status is not None:
+                    self.hint = None
+                if self.hint is not None:
+                    hint_text = "no forced win" if self.hint == Solver.UNKNOWN else "win: {}, {}".format(*self.hint)
+                    self.print_text("Hint: " + hint_text, (16, 615), color=self.conf['textcolor'])
+
+            with profiler.phase('receive'):
+                session.receive_data()
+            with profiler.phase('process'):
+                num_moves = session.board.num_moves
+                session.process_received_data()
+                if self.bot and session.board.num_moves != num_moves:
+                    self.scheduler.request_frame()  # the engine answers the partner's move in the next frame
+
+            with profiler.phase('board'):
+                dirty_rects += self.grid.draw_board()
+                dirty_rects += self.grid.draw_win_line()
+
+            if not session.game_is_on and session.board_status is not None:
                 if self.bg_music_on:
                     self.bg_music_on = False
                     self.game_end_time = time.time()
-                    if self.player.id == self.board_status[0][1] and self.board_status[1] != (0, 0):
-                        self.player.wins()
-                        self.__send(data=self.player, header='my_player')
+                    if not session.is_tie():
+                        self.grid.start_win_line(session.board_status)
+                        self.scheduler.animate(Grid.WIN_LINE_TIME + 0.1)  # the frame after it draws the full line
 
                     if not self.mute:
                         pygame.mixer.music.pause()
@@ -793,46 +581,39 @@ class FiveInaRow:
 
 
 
-                if self.player.id == self.board_status[0][1] and self.board_status[1] != (0,0):
+                if session.is_winner():
                     #self.print_text("Winner", (310, 12), fontsize=24, color=self.conf['player_colors'][self.player.id])
                     self.print_center_text("YOU WIN", color=(255, 0, 0), clear=False, fontsize=100)
                 else:
                     self.print_center_text("GAME OVER", color=(255, 0, 0), clear=False, fontsize=100)
 
-                if self.board_status[1] == (0, 0):
+                if session.is_tie():
                     self.print_center_text("GAME OVER", color=(255, 0, 0), clear=False, fontsize=100)
-                    self.print_text("The match ended in a tie.", (225, 12), fontsize=24, color=self.conf['player_colors'][self.player.id])
+                    self.print_text("The match ended in a tie.", (225, 12), fontsize=24, color=self.conf['player_colors'][session.player.id])
 
-                pb.draw(new_game)
+                self.__overlay(pb.draw(session.new_game))
 
-                if pb.active():
-                    new_game = True
+                if pb.active() or self.bot:
                     pb.active(False)
-                    self.send_request('new_game')
-
-                if self.req_new_game and new_game:
-                    new_game = False
-                    self.send_request('next_player')
-                    self.req_new_game = False
-                    self.grid.board.clear()
-                    self.game_is_on = True
+                    session.request_new_game()
+
+                if session.start_new_game():
                     self.game_start_time = time.time()
-                    self.board_status = None
                     if not self.mute:
                         pygame.mixer.music.unpause()
                     self.bg_music_on = True
                     self.game_end_time = None
 
-            if self.other_player is not None:
+            if session.other_player is not None:
                 self.print_text(
-                    "You are: {me}   {mypoints}:{opponentpoints}   {opponentname}".format(me=self.player.name,
-                                                                                          mypoints=self.player.points,
-                                                                                          opponentname=self.other_player.name,
-                                                                                          opponentpoints=self.other_player.points),
-                    (100, 10), color=self.conf['player_colors'][self.player.id])
+                    "You are: {me}   {mypoints}:{opponentpoints}   {opponentname}".format(me=session.player.name,
+                                                                                          mypoints=session.player.points,
+                                                                                          opponentname=session.other_player.name,
+                                                                                          opponentpoints=session.other_player.points),
+                    (100, 10), color=self.conf['player_colors'][session.player.id])
 
             # print game time
-            if self.game_is_on:
+            if session.game_is_on:
                 game_time_text = time.strftime("%M:%S", time.gmtime(time.time()-self.game_start_time))
                 self.print_text("{}".format(game_time_text), (292, 615), color=self.conf['textcolor'], fontsize=20,
                                 font='Courier')
@@ -841,13 +622,14 @@ class FiveInaRow:
                 self.print_text("{}".format(game_time_text), (292, 615), color=self.conf['textcolor'], fontsize=20, font='Courier')
 
             if self.mute:
-                self.screen.blit(muted_img, (607, 4))
-
+                self.__overlay(self.screen.blit(muted_img, (607, 4)))
 
-            self.grid.draw_grid()
-            self.grid.draw_board()
+            if profiler.overlay_on:
+                self.__draw_profiler_overlay()
 
-            pygame.display.update()
-            self.clock.tick(15)
+            with profiler.phase('update'):
+                pygame.display.update(dirty_rects + self.overlay_rects)
+            dirty_rects = []
+            profiler.end_frame()
 
 
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Frame time profiler of the game loop: rolling per-phase statistics and Chrome trace output
+"""
+
+import collections
+import contextlib
+import json
+import os
+import time
+
+
+class FrameProfiler:
+    WAIT = 'wait'  # sleeping for the next frame, not counted in the frame time
+
+    def __init__(self, window=300, trace=False, max_trace_events=200000):
+        """
+        :param window: number of frames the statistics are computed over
+        :param trace: keep trace events of every frame and phase for write_trace
+        :param max_trace_events: trace events kept, the oldest ones are dropped first
+        """
+
+        self.window = window
+        self.frames = collections.deque(maxlen=window)  # busy seconds of the last frames
+        self.phases = dict()  # phase name -> deque of seconds per frame
+        self.current = dict()  # phase name -> seconds in the current frame
+
+        self.trace = trace
+        self.events = collections.deque(maxlen=max_trace_events)
+        self.origin = time.perf_counter()
+
+        self.frame_start = None
+        self.overlay_on = False
+        self.overlay_refresh = 0.5
+        self.overlay_lines = []
+        self.overlay_time = 0.0
+
+    def begin_frame(self):
+        self.current = dict()
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """
+        Adds the frame to the statistics, the time spent in the WAIT phase is not counted.
+        :return: busy seconds of the frame
+        """
+
+        if self.frame_start is None:
+            return 0.0
+
+        end = time.perf_counter()
+        busy = end - self.frame_start - self.current.get(self.WAIT, 0.0)
+        self.frames.append(busy)
+        for name, seconds in self.current.items():
+            if name not in self.phases:
+                self.phases[name] = collections.deque(maxlen=self.window)
+            self.phases[name].append(seconds)
+        for name in self.phases.keys() - self.current.keys():
+            self.phases[name].append(0.0)
+
+        if self.trace:
+            self.__trace_event('frame', self.frame_start, end)
+        self.frame_start = None
+
+        return busy
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Times the with block as a phase of the current frame, a phase may run several times in a frame.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.current[name] = self.current.get(name, 0.0) + end - start
+            if self.trace:
+                self.__trace_event(name, start, end)
+
+    def __trace_event(self, name, start, end):
+        self.events.append({'name': name, 'cat': 'frame' if name == 'frame' else 'phase', 'ph': 'X',
+                            'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+                            'pid': os.getpid(), 'tid': 0})
+
+    @staticmethod
+    def percentile(values, q):
+        """
+        :param values: iterable of numbers
+        :param q: percentile, 0 - 100
+        :return: nearest-rank percentile, 0.0 if there are no values
+        """
+
+        values = sorted(values)
+        if len(values) == 0:
+            return 0.0
+        return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+    def stats(self):
+        """
+        :return: dict of 'frame' and phase names -> (p50, p99) seconds over the window
+        """
+
+        stats = {'frame': (self.percentile(self.frames, 50), self.percentile(self.frames, 99))}
+        for name, values in self.phases.items():
+            stats[name] = (self.percentile(values, 50), self.percentile(values, 99))
+        return stats
+
+    def toggle_overlay(self):
+        self.overlay_on = not self.overlay_on
+        self.overlay_time = 0.0
+
+    def overlay_text(self):
+        """
+        Lines of the on-screen overlay, recomputed at most every overlay_refresh seconds to keep them readable.
+        :return: list of str
+        """
+
+        now = time.perf_counter()
+        if now - self.overlay_time >= self.overlay_refresh:
+            self.overlay_time = now
+            stats = self.stats()
+            self.overlay_lines = ["{:<8}{:>7.2f}{:>7.2f} ms".format(name, p50 * 1000, p99 * 1000)
+                                  for name, (p50, p99) in stats.items() if name != self.WAIT]
+            self.overlay_lines.insert(0, "{:<8}{:>7}{:>7}".format("frames", "p50", "p99"))
+        return self.overlay_lines
+
+    def write_trace(self, path):
+        """
+        Writes the trace events in Chrome's trace event format, it can be opened in chrome://tracing or Perfetto.
+        :param path: file name
+        :return: None
+        """
+
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}, trace_file)
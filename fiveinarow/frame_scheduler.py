@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Event driven frame pacing, the game loop sleeps until input, network data or a timeout
+"""
+
+import select
+import threading
+import time
+import pygame
+import zmq
+
+
+NETWORK_EVENT = pygame.event.custom_type()  # posted when the watched socket becomes readable
+
+
+class FrameScheduler:
+    def __init__(self, clock, max_fps=60):
+        """
+        :param clock: pygame.time.Clock of the game
+        :param max_fps: frame rate limit while there is something to do
+        """
+
+        self.clock = clock
+        self.max_fps = max_fps
+
+        self.socket = None
+        self.watcher = None
+        self.ack = threading.Event()
+        self.stopped = threading.Event()
+
+        self.frame_requested = False
+        self.animate_until = 0.0
+        self.frames = 0
+        self.idle_frames = 0  # frames that only ran because the timeout was over
+
+    def watch(self, socket):
+        """
+        Wakes the game loop when the socket has data to receive. A thread waits on the socket's file descriptor
+        and posts a NETWORK_EVENT, the socket itself is only used by the game loop's thread.
+        :param socket: zmq socket
+        :return: None
+        """
+
+        self.close()
+        self.stopped.clear()
+        self.socket = socket
+        self.ack.set()
+        self.watcher = threading.Thread(target=self.__watch, args=(socket.getsockopt(zmq.FD),), daemon=True)
+        self.watcher.start()
+
+    def __watch(self, fd):
+        while not self.stopped.is_set():
+            if not self.ack.wait(timeout=0.5):
+                continue
+            readable, _, _ = select.select([fd], [], [], 0.5)
+            if readable and not self.stopped.is_set():
+                self.ack.clear()
+                pygame.event.post(pygame.event.Event(NETWORK_EVENT))
+
+    def request_frame(self):
+        """
+        The next wait returns without blocking, e.g. when the game loop has work to do without input.
+        :return: None
+        """
+
+        self.frame_requested = True
+
+    def animate(self, duration):
+        """
+        Runs frames at max_fps for a while.
+        :param duration: seconds
+        :return: None
+        """
+
+        self.animate_until = max(self.animate_until, time.time() + duration)
+
+    def network_ready(self):
+        """
+        Checks the socket's events, this also rearms its edge-triggered file descriptor.
+        :return: bool, data is waiting on the watched socket
+        """
+
+        if self.socket is None:
+            return False
+        try:
+            return bool(self.socket.getsockopt(zmq.EVENTS) & zmq.POLLIN)
+        except zmq.ZMQError:
+            return False
+
+    def wait(self, timeout_ms=1000):
+        """
+        Waits for the next frame: returns at once while there is work to do, otherwise sleeps until an event,
+        network data or the timeout. Frames are never closer than 1 / max_fps.
+        :param timeout_ms: longest sleep, the frame rate of time dependent drawing like clocks
+        :return: list of pygame events
+        """
+
+        self.clock.tick(self.max_fps)
+        self.frames += 1
+
+        busy = self.frame_requested or time.time() < self.animate_until or self.network_ready()
+        self.frame_requested = False
+        events = []
+        if not busy:
+            self.ack.set()
+            event = pygame.event.wait(timeout_ms)
+            if event.type == pygame.NOEVENT:
+                self.idle_frames += 1
+            else:
+                events.append(event)
+
+        events.extend(pygame.event.get())
+        if any(event.type == NETWORK_EVENT for event in events):
+            self.ack.set()
+
+        return events
+
+    def close(self):
+        """
+        Stops watching the socket.
+        :return: None
+        """
+
+        if self.watcher is not None:
+            self.stopped.set()
+            self.ack.set()
+            self.watcher.join()
+            self.watcher = None
+        self.socket = None
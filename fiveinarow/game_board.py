@@ -1,293 +1,333 @@
 # -*- coding: utf-8 -*-
 
 """
-Five in a row game board, grid drawer based on pygame
+Five in a row game board, the pygame grid drawer is in pg_grid
 """
 
 import logging
-import pygame
-import numpy as np
-from functools import reduce
-import time
+import numbers
+import random
+
+
+ZOBRIST_KEYS = dict()
+
+
+def zobrist_keys(shape, player_id):
+    """
+    Random 64 bit Zobrist keys of a player's stones, the same for every board of the given shape.
+    :param shape: board size value-pair, tuple
+    :param player_id: owner of the stones
+    :return: list of keys indexed by Board bit index
+    """
+
+    cache_key = (tuple(shape), player_id)
+    if cache_key not in ZOBRIST_KEYS:
+        rng = random.Random("zobrist {} {} {}".format(shape[0], shape[1], player_id))
+        ZOBRIST_KEYS[cache_key] = [rng.getrandbits(64) for _ in range(shape[0] * (shape[1] + 1))]
+
+    return ZOBRIST_KEYS[cache_key]
+
 
 class Board:
+    NUMPY = 'numpy'
+    BITBOARD = 'bitboard'
+
+    EMPTY = -1  # value of empty cells in the int8 view returned by to_array
+
+    DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1)]
+
     class OccupiedException(Exception):
         pass
 
-    def __init__(self, shape, num_to_win):
+    def __init__(self, shape, num_to_win, storage=NUMPY):
         """
         Initialising the board with its size, number of moves in a row.
         :param shape: board size value-pair, tuple
         :param num_to_win: number of moves in a row to win
+        :param storage: cell storage, NUMPY (float64 grid) or BITBOARD (one integer bitboard per player)
         """
+        if storage not in [self.NUMPY, self.BITBOARD]:
+            raise ValueError("unknown board storage: {}".format(storage))
+
         self.size = shape
-        self.board = np.zeros(self.size)  # Using a numpy array, indexable with a coordinate pair
+        self.storage = storage
+        self.num_cells = self.size[0] * self.size[1]
+
+        # bitboards are laid out column by column, every column is followed by an always empty guard bit,
+        # so stepping along a line never wraps it to the next column
+        self.stride = self.size[1] + 1
+        # index offset of the neighbouring cell in each direction, guard bits keep off-grid neighbours unused
+        self.steps = [d[0] * self.stride + d[1] for d in self.DIRECTIONS]
+
         if max(self.size) < num_to_win:
             self.num_to_win = max(self.size)
             logging.info("num to win decreased to {}".format(self.num_to_win))
         else:
             self.num_to_win = num_to_win
 
-        self.last_move = None
-        self.occupied = set()
         self.gridcoord = None
+        self.zobrist_tables = dict()
+        self.listeners = []  # objects with placed(pos, player_id), undone(pos, player_id) and cleared() methods
+        self.clear()
+
+    def on_board(self, pos):
+        """
+        :param pos: position of any origin, e.g. a partner's move
+        :return: bool, pos is an (x, y) pair of integers within the board
+        """
+
+        try:
+            x, y = pos
+        except (TypeError, ValueError):
+            return False
+        return isinstance(x, numbers.Integral) and isinstance(y, numbers.Integral) and \
+            0 <= x < self.size[0] and 0 <= y < self.size[1]
 
     def place(self, pos, player_id):
+        if not self.on_board(pos):  # a bitboard would take the guard bit of y == size[1], numpy negative indices
+            raise IndexError("position {} is not on the board".format(pos))
         if not self.is_occupied(pos):
-            self.board[pos] = player_id
-            self.occupied.add(pos)
+            index = self.__bit_index(pos)
+            if self.storage == self.BITBOARD:
+                bit = 1 << index
+                self.bitboards[player_id] = self.bitboards.get(player_id, 0) | bit
+                self.occupied_bits |= bit
+                self.occupied = None
+            else:
+                self.board[pos] = player_id
+                self.occupied.add(pos)
+                self.__update_runs(index, player_id)
+            self.num_moves += 1
             self.last_move = (pos, player_id)
+            self.moves.append(self.last_move)
+            self.zobrist ^= self.__zobrist_keys(player_id)[index]
+            for listener in self.listeners:
+                listener.placed(pos, player_id)
         else:
             raise self.OccupiedException
 
-    def clear(self):
-        self.board = np.zeros(self.size)
-        self.occupied = set()
-
-    def __is_in_grid(self, pos):
-        x, y = pos
-        if x < 0 or self.size[0] <= x:
-            return False
-        if y < 0 or self.size[1] <= y:
-            return False
-
-        return True
-
-    def get_occupied(self):
-        return self.occupied
-
-    def is_occupied(self, pos):
-        return pos in self.occupied
+    def undo(self):
+        """
+        Takes back the last move, restores the run-length tables of a NUMPY board to their state before it.
+        :return: the removed move, ((x, y), player_id) tuple
+        """
 
-    def get_player_id(self, pos):
-        return int(self.board[pos])
+        if len(self.moves) == 0:
+            raise IndexError("no move to undo")
 
-    def __check_row(self, origin, direction):
-        to_count = self.num_to_win
-
-        player_id = origin[1]
-
-        count_minus_dir = 0
-        pos = origin[0]
-        while True:
-            pos = tuple(map(lambda p, d: (p - d), pos, direction))
-            if not self.__is_in_grid(pos):
-                break
-            if not self.is_occupied(pos):
-                break
-            if self.get_player_id(pos) == player_id:
-                count_minus_dir += 1
-
-        count_plus_dir = 0
-        pos = origin[0]
-        while True:
-            pos = tuple(map(lambda p, d: (p + d), pos, direction))
-            if not self.__is_in_grid(pos):
-                break
-            if not self.is_occupied(pos):
-                break
-            if self.get_player_id(pos) == player_id:
-                count_plus_dir += 1
-
-        if to_count <= count_plus_dir + count_minus_dir + 1:  # origin is not counted by the methods above
-            return True
+        pos, player_id = self.moves.pop()
+        self.zobrist ^= self.__zobrist_keys(player_id)[self.__bit_index(pos)]
+        if self.storage == self.BITBOARD:
+            bit = 1 << self.__bit_index(pos)
+            self.bitboards[player_id] &= ~bit
+            self.occupied_bits &= ~bit
+            self.occupied = None
         else:
-            return False
-
-    def check_board(self):
-        origin = self.last_move
-
-        if len(self.occupied) == reduce(lambda x, y: x * y, self.size):
-            logging.info("board is full")
-            return origin, (0, 0)
-
-        directions = [(1, 0), (1, 1), (0, 1), (-1, 1)]
-        for d in directions:
-            if self.__check_row(origin, d):
-                return origin, d
-
-        return None
+            self.board[pos] = 0
+            self.occupied.remove(pos)
+            changes, _ = self.run_history.pop()
+            for runs, index, old_length in reversed(changes):
+                if old_length is None:
+                    del runs[index]
+                else:
+                    runs[index] = old_length
+            self.last_runs = self.run_history[-1][1] if len(self.run_history) > 0 else None
+        self.num_moves -= 1
 
+        self.last_move = self.moves[-1] if len(self.moves) > 0 else None
 
-class Grid:
-    def __init__(self, screen, clock, conf):
-        self.screen = screen
-        self.clock = clock
-        self.conf = conf
-        self.__update_conf()
-        self.anim_speed = 20
-        self.board = Board((self.cols, self.rows), conf['n_to_win'])
-        self.gridcoord = None
+        for listener in self.listeners:
+            listener.undone(pos, player_id)
 
-    def set_anim_speed(self, speed):
-        self.anim_speed = speed
+        return pos, player_id
 
-    def __update_conf(self):
-        self.gridcolor = self.conf['gridcolor']
-        self.cols = self.conf['numgridx']
-        self.rows = self.conf['numgridy']
-        self.bold_grid = self.conf['bold_grid']
-        self.colors = self.conf['player_colors']
+    def clear(self):
+        if self.storage == self.BITBOARD:
+            self.bitboards = dict()
+            self.occupied_bits = 0
+            self.occupied = None  # set of the occupied cells, built by get_occupied on demand
+        else:
+            import numpy as np  # loaded on the first numpy board, bitboard users never pay for it
+            self.board = np.zeros(self.size)  # Using a numpy array, indexable with a coordinate pair
+            self.occupied = set()
+        self.num_moves = 0
+        self.last_move = None
+        self.moves = []
+        self.zobrist = 0  # Zobrist hash of the position, xor of the keys of all placed stones
 
-        xboundary = 30
-        yboundary = 30
-        screen_width, screen_height = self.screen.get_size()
+        # NUMPY boards only, BITBOARD boards read the runs from the bitboards instead.
+        # Per player and direction: cell index -> length of the run of stones the cell belongs to.
+        # Only the two end cells of a run are kept up to date, those are the only ones read by __update_runs.
+        self.runs = dict()
+        self.run_history = []  # per move: (changed (table, index, old length) entries, run lengths of the move)
+        self.last_runs = None
 
-        grid_bbh = screen_height - 2 * yboundary  # grid Bounding Box Height
-        grid_bbw = screen_width - 2 * xboundary
+        for listener in self.listeners:
+            listener.cleared()
 
-        self.squaresize = min((grid_bbw / self.cols, grid_bbh / self.rows))
+    def add_listener(self, listener):
+        """
+        Notifies an object of every change of the board, e.g. to keep incrementally updated tables in sync.
+        :param listener: object with placed(pos, player_id), undone(pos, player_id) and cleared() methods
+        :return: None
+        """
 
-        # tries to fit grid at best in the window
-        if self.cols / self.rows > 1:
-            if grid_bbw / grid_bbh > 1:
-                if self.cols / self.rows > grid_bbw / grid_bbh:
-                    self.grid_offset = (0, (grid_bbh - self.rows * self.squaresize) / 2)
-                else:
-                    self.grid_offset = ((grid_bbw - self.cols * self.squaresize) / 2, 0)
-            elif grid_bbw / grid_bbh < 1:
-                self.grid_offset = (0, (grid_bbh - grid_bbw + (self.cols - self.rows) * self.squaresize) / 2)
-            else:
-                self.grid_offset = (0, (self.cols - self.rows) * self.squaresize / 2)
-
-        elif self.cols / self.rows < 1:
-            if grid_bbw / grid_bbh > 1:
-                self.grid_offset = ((grid_bbw - grid_bbh + (self.rows - self.cols) * self.squaresize) / 2, 0)
-            elif grid_bbw / grid_bbh < 1:
-                if self.cols / self.rows > grid_bbw / grid_bbh:
-                    self.grid_offset = (0, (grid_bbh - self.rows * self.squaresize) / 2)
-                else:
-                    self.grid_offset = ((grid_bbw - self.cols * self.squaresize) / 2, 0)
-            else:
-                self.grid_offset = ((self.rows - self.cols) * self.squaresize / 2, 0)
+        self.listeners.append(listener)
 
-        else:
-            if grid_bbw / grid_bbh > 1:
-                self.grid_offset = ((grid_bbw - grid_bbh) / 2, 0)
-            elif grid_bbw / grid_bbh < 1:
-                self.grid_offset = (0, (grid_bbh - grid_bbw) / 2)
-            else:
-                self.grid_offset = (0, 0)
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
 
-        self.width = 2 if self.bold_grid else 1
+    def potential_runs(self, pos, player_id):
+        """
+        Run lengths a stone of the player would make on an empty cell, read from the run-length tables
+        or the player's bitboard.
+        :param pos: empty cell
+        :param player_id: player to place
+        :return: list of run lengths, one for each of the DIRECTIONS
+        """
 
-        grid_height = self.squaresize * self.rows
-        grid_width = self.squaresize * self.cols
+        index = self.__bit_index(pos)
+        if self.storage == self.BITBOARD:
+            return self.__bitboard_runs(index, self.bitboards.get(player_id, 0))
 
-        self.grid_size = (grid_width, grid_height)
+        player_runs = self.runs.get(player_id)
+        if player_runs is None:
+            return [1] * len(self.DIRECTIONS)
 
-        self.grid_rect = (xboundary + self.grid_offset[0], yboundary + self.grid_offset[1],
-                          xboundary + self.grid_offset[0] + grid_width, yboundary + self.grid_offset[1] + grid_height)
+        return [runs.get(index - step, 0) + runs.get(index + step, 0) + 1
+                for runs, step in zip(player_runs, self.steps)]
 
-    def draw_grid(self, flush=False, animate=False):
+    def __update_runs(self, index, player_id):
         """
-        Draws the game grid from individual lines.
-        :param flush: whether update the screen at end
-        :param animate: whwther update screen after each drawn line
+        Joins the runs next to a newly placed stone in every direction, records the changes for undo.
+        :param index: bit index of the placed stone
+        :param player_id: owner of the stone
         :return: None
         """
 
-        for r in range(self.rows + 1):
-            pos_y = self.squaresize * r + self.grid_rect[1]
+        if player_id not in self.runs:
+            self.runs[player_id] = [dict() for _ in self.DIRECTIONS]
+
+        changes = []
+        lengths = []
+        for runs, step in zip(self.runs[player_id], self.steps):
+            before = runs.get(index - step, 0)
+            after = runs.get(index + step, 0)
+            length = before + after + 1
+            for end in (index - before * step, index + after * step, index):
+                changes.append((runs, end, runs.get(end)))
+                runs[end] = length
+            lengths.append(length)
 
-            pos_x_start = self.grid_rect[0]
-            pos_x_end = self.grid_rect[2]
+        self.last_runs = lengths
+        self.run_history.append((changes, lengths))
 
-            x = pygame.draw.line(self.screen, self.gridcolor, (pos_x_start, pos_y), (pos_x_end, pos_y), self.width)
-            if animate:
-                pygame.display.update(x)
-                self.clock.tick(self.anim_speed)
+    def __bitboard_runs(self, index, bits):
+        """
+        Counts the stones of a bitboard next to a cell in every direction.
+        :param index: bit index of the cell, counted as a stone
+        :param bits: bitboard of a player
+        :return: list of run lengths, one for each of the DIRECTIONS
+        """
 
-        for c in range(self.cols + 1):
-            pos_x = self.squaresize * c + self.grid_rect[0]
+        lengths = []
+        for step in self.steps:
+            length = 1
+            for offset in (-step, step):
+                cell = index + offset
+                while cell >= 0 and (bits >> cell) & 1:
+                    length += 1
+                    cell += offset
+            lengths.append(length)
 
-            pos_y_start = self.grid_rect[1]
-            pos_y_end = self.grid_rect[3]
+        return lengths
 
-            x = pygame.draw.line(self.screen, self.gridcolor, (pos_x, pos_y_start), (pos_x, pos_y_end), self.width)
-            if animate:
-                pygame.display.update(x)
-                self.clock.tick(self.anim_speed)
+    def __zobrist_keys(self, player_id):
+        if player_id not in self.zobrist_tables:
+            self.zobrist_tables[player_id] = zobrist_keys(self.size, player_id)
+        return self.zobrist_tables[player_id]
 
-        if flush:
-            pygame.display.update()
+    def __bit_index(self, pos):
+        return pos[0] * self.stride + pos[1]
 
-    def process_event(self, event):
+    def __iter_bits(self, bits):
         """
-        Processes event for grid click, stores click coordinates
-        :param event: pygame event
-        :return: None
+        Yields grid coordinates of the set bits of a bitboard.
+        :param bits: bitboard, int
+        :return: generator of position tuples
         """
 
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self.gridcoord = self.get_clicked_cell(event.pos)
+        while bits:
+            lowest = bits & -bits
+            x, y = divmod(lowest.bit_length() - 1, self.stride)
+            yield x, y
+            bits ^= lowest
 
-    def get_clicked_cell(self, event_pos):
+    def get_occupied(self):
         """
-        Calculates grid coorfinates from window coordinates
-        :param event_pos: position tuple of the mouse click
-        :return: grid coordinates if click was over the grid else None
+        :return: set of the occupied positions, BITBOARD boards build it on the first call after a change
         """
 
-        posx = event_pos[0] - self.grid_rect[0]
-        posy = event_pos[1] - self.grid_rect[1]
-
-        if posx < 0 or self.grid_size[0] < posx:
-            return None
-        if posy < 0 or self.grid_size[1] < posy:
-            return None
-
-        x = int(posx / self.squaresize)
-        y = int(posy / self.squaresize)
-
-        return x, y
+        if self.occupied is None:
+            self.occupied = set(self.__iter_bits(self.occupied_bits))
+        return self.occupied
 
-    def get_gridcoord(self):
-        return self.gridcoord
+    def is_occupied(self, pos):
+        if self.storage == self.BITBOARD:
+            return (self.occupied_bits >> self.__bit_index(pos)) & 1 == 1
+        return pos in self.occupied
 
-    def clear_gridcoord(self):
-        self.gridcoord = None
+    def get_player_id(self, pos):
+        if self.storage == self.BITBOARD:
+            index = self.__bit_index(pos)
+            for player_id, bits in self.bitboards.items():
+                if (bits >> index) & 1:
+                    return player_id
+            return 0
+        return int(self.board[pos])
 
-    def draw_board(self):
+    def to_array(self):
         """
-        Draws all the players previous moves on the screen
-        :return: None
+        Makes a compact copy of the board, empty cells are EMPTY, others hold the player id.
+        :return: numpy.int8 array of the board's shape
         """
 
-        for pos in self.board.get_occupied():
-            player_id = self.board.get_player_id(pos)
-            self.__draw_move(pos, player_id)
+        import numpy as np
 
+        cells = np.full(self.size, self.EMPTY, dtype=np.int8)
+        if self.storage == self.BITBOARD:
+            num_bytes = (self.size[0] * self.stride + 7) // 8
+            for player_id, bits in self.bitboards.items():
+                unpacked = np.unpackbits(np.frombuffer(bits.to_bytes(num_bytes, 'little'), dtype=np.uint8),
+                                         bitorder='little')
+                mask = unpacked[:self.size[0] * self.stride].reshape(self.size[0], self.stride)[:, :self.size[1]]
+                cells[mask.astype(bool)] = player_id
+        else:
+            for pos in self.occupied:
+                cells[pos] = self.board[pos]
 
-    def __draw_move(self, pos, player_id):
-        """
-        Draws a single moves marker
-        :param pos:  grid coordinates
-        :param player_id: player id for color lookup
-        :return: None
-        """
+        return cells
 
-        pos_x = int(self.grid_rect[0] + pos[0] * self.squaresize + self.squaresize/2)
-        pos_y = int(self.grid_rect[1] + pos[1] * self.squaresize + self.squaresize/2)
-        markersize = int((self.squaresize*0.7)/2 )
+    def check_board(self):
+        origin = self.last_move
 
-        color = self.colors[player_id]
-        pygame.draw.circle(self.screen, color, (pos_x, pos_y), markersize)
+        if self.num_moves == self.num_cells:
+            logging.info("board is full")
+            return origin, (0, 0)
 
+        if origin is None:  # empty board, or every move was taken back
+            return None
 
-    def place(self, gridpos, player_id):
-        try:
-            self.board.place(gridpos, player_id)
-        except self.board.OccupiedException as e:
-            return True, None, False
-        board_status = self.board.check_board()
-        if board_status is not None:
-            if board_status[1] != (0,0):  # board is full
-                print("winning move ((x,y),id)={pos} in direction {dir}".format(pos=board_status[0], dir=board_status[1]))
-            return False, board_status, True
-            # game over
-
-        return True, None, True
+        last_runs = self.last_runs
+        if self.storage == self.BITBOARD:
+            pos, player_id = origin
+            last_runs = self.__bitboard_runs(self.__bit_index(pos), self.bitboards[player_id])
+
+        for d, length in zip(self.DIRECTIONS, last_runs):
+            if self.num_to_win <= length:
+                return origin, d
+
+        return None
 
 
 class Player:
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact binary game records, appending writer and memory-mapped lazy reader
+
+A record file is a sequence of games, each one is a fixed header followed by its moves:
+    header: magic b'FIRG', version, width, height, n_to_win, winner (int8, -1 for a tie or unfinished game),
+            flags (reserved), number of moves (uint32), little endian
+    moves:  one little endian uint16 per move, bit 15 is the player id, bits 7-13 are x, bits 0-6 are y
+"""
+
+import itertools
+import mmap
+import os
+import struct
+import numpy as np
+
+from fiveinarow.game_board import Board
+
+
+MAGIC = b'FIRG'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBbBI')
+
+MAX_SIZE = 127  # x and y are stored on 7 bits
+NO_WINNER = -1
+
+
+class RecordFormatError(Exception):
+    pass
+
+
+def check_game(size, num_to_win, winner):
+    """
+    Checks that a game's header values fit in the record format.
+    :raise ValueError: if a value can not be recorded
+    """
+
+    if not (0 < size[0] <= MAX_SIZE and 0 < size[1] <= MAX_SIZE):
+        raise ValueError("board size {} is too big to record".format(size))
+    if not 0 < num_to_win <= max(size):
+        raise ValueError("num to win {} can not be recorded".format(num_to_win))
+    if winner not in (NO_WINNER, 0, 1):
+        raise ValueError("winner {} can not be recorded".format(winner))
+
+
+def pack_move(pos, player_id):
+    """
+    Packs a move to its 2 byte representation.
+    :param pos: position tuple, coordinates below MAX_SIZE
+    :param player_id: 0 or 1
+    :return: int
+    """
+
+    if not (0 <= pos[0] < MAX_SIZE and 0 <= pos[1] < MAX_SIZE):
+        raise ValueError("move {} is out of the recordable area".format(pos))
+    if player_id not in (0, 1):
+        raise ValueError("player id {} can not be recorded".format(player_id))
+
+    return (player_id << 15) | (pos[0] << 7) | pos[1]
+
+
+def unpack_move(packed):
+    """
+    :param packed: 2 byte move
+    :return: ((x, y), player_id)
+    """
+
+    packed = int(packed)
+    return ((packed >> 7) & 0x7f, packed & 0x7f), packed >> 15
+
+
+class GameRecord:
+    def __init__(self, size, num_to_win, winner, moves):
+        """
+        One recorded game.
+        :param size: board size value-pair, tuple
+        :param num_to_win: number of moves in a row to win
+        :param winner: player id, NO_WINNER for a tie
+        :param moves: uint16 array of packed moves, a view into the record file for records read from a file
+        """
+
+        self.size = size
+        self.num_to_win = num_to_win
+        self.winner = winner
+        self.moves = moves
+
+    def __len__(self):
+        return len(self.moves)
+
+    def iter_moves(self):
+        """
+        :return: generator of ((x, y), player_id) tuples
+        """
+
+        for packed in self.moves:
+            yield unpack_move(packed)
+
+    def to_array(self, num_moves=None):
+        """
+        Position after the given number of moves, without replaying them one by one.
+        :param num_moves: number of moves to apply, all if None
+        :return: int8 array like Board.to_array
+        """
+
+        moves = self.moves[:num_moves].astype(np.int32)
+        cells = np.full(self.size, Board.EMPTY, dtype=np.int8)
+        cells[(moves >> 7) & 0x7f, moves & 0x7f] = moves >> 15
+
+        return cells
+
+    def replay(self, num_moves=None, storage=Board.NUMPY):
+        """
+        Places the moves on a new Board.
+        :param num_moves: number of moves to replay, all if None
+        :param storage: storage of the Board
+        :return: Board
+        """
+
+        board = Board(self.size, self.num_to_win, storage=storage)
+        for pos, player_id in itertools.islice(self.iter_moves(), num_moves):
+            board.place(pos, player_id)
+
+        return board
+
+
+class GameRecordWriter:
+    def __init__(self, path):
+        """
+        Opens a record file for appending.
+        :param path: file path
+        """
+
+        self.file = open(path, 'ab')
+        self.size = None
+        self.num_to_win = None
+        self.moves = None
+
+    def in_game(self):
+        return self.moves is not None
+
+    def start_game(self, size, num_to_win):
+        """
+        Starts recording a new game, an unfinished previous game is written without winner.
+        :param size: board size value-pair, tuple
+        :param num_to_win: number of moves in a row to win
+        :return: None
+        """
+
+        if self.in_game():
+            self.end_game(NO_WINNER)
+
+        check_game(size, num_to_win, NO_WINNER)
+
+        self.size = size
+        self.num_to_win = num_to_win
+        self.moves = []
+
+    def record_move(self, pos, player_id):
+        self.moves.append(pack_move(pos, player_id))
+
+    def end_game(self, winner):
+        """
+        Writes the recorded game to the file.
+        :param winner: player id, NO_WINNER for a tie
+        :return: None
+        """
+
+        self.write_packed(self.size, self.num_to_win, winner, self.moves)
+        self.moves = None
+
+    def write_game(self, size, num_to_win, winner, moves):
+        """
+        Writes a whole game at once.
+        :param moves: iterable of ((x, y), player_id) tuples
+        :return: None
+        """
+
+        self.write_packed(size, num_to_win, winner, [pack_move(pos, player_id) for pos, player_id in moves])
+
+    def write_packed(self, size, num_to_win, winner, packed_moves):
+        """
+        Writes a whole game of moves packed by pack_move.
+        :raise ValueError: if the header values can not be recorded, see check_game
+        """
+
+        check_game(size, num_to_win, winner)
+        header = HEADER.pack(MAGIC, VERSION, size[0], size[1], num_to_win, winner, 0, len(packed_moves))
+        self.file.write(header + np.asarray(packed_moves, dtype='<u2').tobytes())
+        self.file.flush()
+
+    def close(self):
+        if self.in_game():
+            self.end_game(NO_WINNER)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class GameRecordReader:
+    def __init__(self, path):
+        """
+        Memory-maps a record file, games are parsed only when they are accessed.
+        Records point into the mapping, they can not be used after close.
+        :param path: file path
+        """
+
+        self.file = open(path, 'rb')
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+        self.offsets = None
+
+    def __read(self, offset):
+        """
+        Parses the game at the given offset.
+        :return: (GameRecord, offset of the next game)
+        """
+
+        if offset + HEADER.size > len(self.data):
+            raise RecordFormatError("truncated header at offset {}".format(offset))
+
+        magic, version, width, height, num_to_win, winner, _, num_moves = HEADER.unpack_from(self.data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise RecordFormatError("not a game record at offset {}".format(offset))
+
+        moves_offset = offset + HEADER.size
+        end = moves_offset + 2 * num_moves
+        if end > len(self.data):
+            raise RecordFormatError("truncated moves at offset {}".format(offset))
+
+        moves = np.frombuffer(self.data, dtype='<u2', count=num_moves, offset=moves_offset)
+        return GameRecord((width, height), num_to_win, winner, moves), end
+
+    def __iter__(self):
+        offset = 0
+        while offset < len(self.data):
+            record, offset = self.__read(offset)
+            yield record
+
+    def index(self):
+        """
+        Builds the list of game offsets for random access, only the headers are read.
+        :return: list of offsets
+        """
+
+        if self.offsets is None:
+            self.offsets = []
+            offset = 0
+            while offset < len(self.data):
+                self.offsets.append(offset)
+                num_moves = HEADER.unpack_from(self.data, offset)[-1]
+                offset += HEADER.size + 2 * num_moves
+
+        return self.offsets
+
+    def __len__(self):
+        return len(self.index())
+
+    def __getitem__(self, item):
+        return self.__read(self.index()[item])[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                pass  # records still point into the mapping, it is released together with them
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
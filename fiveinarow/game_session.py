@@ -0,0 +1,792 @@
+# -*- coding: utf-8 -*-
+
+"""
+Five in a row game session: board, players, turns and the protocol with the partner, without user interface
+
+The network, crypto and engine modules are imported when the session first needs them.
+"""
+
+import logging
+import json
+import time
+
+from fiveinarow.game_board import Board, Player
+
+
+class GameSession:
+    SERVER = 'ser'  # Communicator.SERVER
+    CLIENT = 'cli'  # Communicator.CLIENT
+
+    HELLO_HEADER = b"hello_fir_server"
+
+    config_ids = ['numgridx', 'numgridy', 'bgcolor', 'gridcolor', 'n_to_win', 'port', 'rsakeybits', 'network_timeout',
+                  'connection_timeout', 'comm_timeout', 'verbose', 'bold_grid', 'textcolor', 'box_colors',
+                  'player_colors']
+
+    def __init__(self, mode, bot=False, resume=None, config_file_name='config.txt'):
+        """
+        Initialises a session in given mode. Tries to load configuration.
+        :param mode: server or client mode
+        :param bot: the local player is played by the engine
+        :param resume: client mode, session of a previous connection (its comm.session) to resume without key exchange
+        :param config_file_name: JSON configuration file, created with the default config if it is missing
+        """
+
+        assert(mode in [self.SERVER, self.CLIENT])
+
+        self.mode = mode
+        self.bot = bot
+
+        self.config_file_name = config_file_name
+        self.conf = dict()
+        try:
+            self.load_config()
+        except FileNotFoundError as e:
+            self.set_default_config()
+            self.save_config()
+        except json.JSONDecodeError as e:
+            print("Invalid JSON in config file, using default config")
+            self.set_default_config()
+
+        self.comm = None
+        self.board = None
+        self.recorder = None
+        self.player = None
+        self.other_player = None
+        self.server_conf = None
+        self.encrypted_comm = False
+        self.is_connected = False
+        self.is_ready = False
+        self.recv_buffer = []
+        self.resume_session = resume
+        self.resumed_state = None
+        self.ticket_issuer = None
+        self.session_id = None
+        self.rekey_pending = False  # server mode, a new key was offered after a failed resumption
+        self.awaiting_resume = False  # server mode, the client went away, see check_disconnect
+        self.monitor = None  # server mode, socket monitor reporting the client's disconnects
+
+        self.conn_start = None
+        self.last_hello = 0.0
+
+        self.game_is_on = False
+        self.board_status = None
+        self.game_ended = False  # end_game was called for the finished game
+        self.new_game = False  # own new game request was sent
+        self.req_new_game = False  # partner requested a new game
+        self.restart_sent = False  # own 'next_player' request starting the new game was sent
+        self.partner_restarted = False  # partner's 'next_player' request arrived
+        self.on_move = None  # called with (pos, player_id) after every placed move
+        self.done = False
+
+    def set_default_config(self):
+        """
+        Setting default config values.
+        :return: None
+        """
+
+        self.conf['numgridx'] = 15
+        self.conf['numgridy'] = 15
+        self.conf['bgcolor'] = (211, 211, 211)
+        self.conf['gridcolor'] = (42, 42, 42)
+        self.conf['n_to_win'] = 5
+        self.conf['port'] = 14522
+        self.conf['rsakeybits'] = 1024
+        self.conf['network_timeout'] = 15
+        self.conf['connection_timeout'] = 5
+        self.conf['comm_timeout'] = 3
+        self.conf['verbose'] = True
+        self.conf['bold_grid'] = False
+        self.conf['textcolor'] = (42, 42, 42)
+        self.conf['box_colors'] = {'akt': (28, 134, 238, 255),  # dodgerblue2
+                                   'ina': (141, 182, 205, 255),  # lightskyblue3
+                                   'txt': (42, 42, 42),
+                                   'bg': (211, 211, 211)}
+        self.conf['player_colors'] = [(255, 0, 0), (0, 0, 0)]
+
+    def __check_config(self):
+        """
+        Checks if the config file contains every needed config values, if one is missing, loads default config.
+        :return: None
+        """
+
+        for c in self.config_ids:
+            if c not in self.conf:
+                print("Config value missing: {}, using default config".format(c))
+                self.set_default_config()
+                return
+
+    def save_config(self):
+        """
+        Saves the configuration to a JSON file.
+        :return:
+        """
+        with open(self.config_file_name, 'w') as conf_file:
+            json.dump(self.conf, conf_file, sort_keys=True, indent=4)
+
+    def load_config(self):
+        """
+        Loads configuration values from JSON file
+        :return: None
+        """
+
+        with open(self.config_file_name, 'r') as conf_file:
+            self.conf = json.load(conf_file)
+            self.__check_config()
+
+    def set_player(self, name: str, first_move=False):
+        player_id = 0 if self.mode == self.SERVER else 1
+        if self.bot:
+            from fiveinarow.engine import EnginePlayer
+
+            self.player = EnginePlayer(name, id=player_id, turn=first_move,
+                                       time_budget_ms=self.conf.get('engine_time_ms', 1000),
+                                       workers=self.conf.get('engine_workers', 1))
+        else:
+            self.player = Player(name, id=player_id, turn=first_move)
+
+    def open_server(self, key_pool=None, llcomm=None):
+        """
+        Server mode, opens the socket the client connects to.
+        :param key_pool: KeyPool of pre-generated RSA key-pairs
+        :param llcomm: low level communicator to use instead of opening a socket
+        :return: None
+        """
+
+        from fiveinarow.communicator import Communicator
+        from fiveinarow.metrics import start_export
+        from fiveinarow.session_ticket import TicketIssuer, new_session_id
+
+        start_export(self.conf)
+
+        self.ticket_issuer = TicketIssuer()
+        self.session_id = new_session_id()
+        self.comm = Communicator(mode=self.SERVER, legacy_pickle=self.conf.get('legacy_pickle', False),
+                                 timestamps=self.conf.get('metrics_timestamps', False))
+        self.comm.init_connection(port=self.conf['port'], rsa_key_bits=self.conf['rsakeybits'], key_pool=key_pool,
+                                  suites=self.__suites(), llcomm=llcomm)
+        if llcomm is None:
+            import zmq
+
+            self.monitor = self.comm.encomm.llcomm.socket.get_monitor_socket(zmq.EVENT_DISCONNECTED)
+
+    def open_client(self, ip_addr, llcomm=None):
+        """
+        Client mode, connects to the server, or to a match server if it is configured. A resumable session
+        is resumed at once.
+        :param ip_addr: IP address or hostname of the server
+        :param llcomm: low level communicator to use instead of opening a socket
+        :return: None
+        """
+
+        import zmq
+        from fiveinarow.communicator import Communicator
+        from fiveinarow.metrics import start_export
+
+        start_export(self.conf)
+        socket_type = zmq.DEALER if self.conf.get('match_server') else zmq.PAIR
+        self.comm = Communicator(mode=self.CLIENT, legacy_pickle=self.conf.get('legacy_pickle', False),
+                                 timestamps=self.conf.get('metrics_timestamps', False))
+        self.comm.init_connection(port=self.conf['port'], hostname=ip_addr, socket_type=socket_type,
+                                  suites=self.__suites(), llcomm=llcomm)
+        self.conn_start = time.time()
+
+        if self.resume_session is not None:
+            from fiveinarow.communicator import TimeoutException
+
+            try:
+                self.resumed_state = self.comm.resume(self.resume_session, timeout=self.conf['connection_timeout'])
+            except TimeoutException:
+                logging.warning("no answer to session resumption, connecting")
+                return
+            if self.resumed_state is not None:
+                self.apply_server_conf(self.resumed_state)
+                self.is_connected = self.encrypted_comm = self.is_ready = True
+            else:
+                # the server refused the ticket and offers a new key exchange, it sends the game state after it
+                logging.info("session could not be resumed, exchanging keys")
+                self.is_connected = True
+
+    def __suites(self):
+        """
+        :return: cipher suite ids of the optional 'cipher_suites' config value, None for all supported suites
+        """
+
+        if not self.conf.get('cipher_suites'):
+            return None
+
+        from fiveinarow import ciphers
+
+        return [ciphers.NAMES[name] for name in self.conf['cipher_suites']]
+
+    def connect_step(self):
+        """
+        One step of connecting: the client says hello every 0.5 s until the server answers,
+        then both exchange the keys and the server configuration.
+        :return: bool, is_ready
+        """
+
+        if self.is_ready:
+            return True
+
+        if self.mode == self.CLIENT and self.is_connected:
+            self.initial_connection()
+        else:
+            if self.mode == self.CLIENT and time.time() - self.last_hello > 0.5:
+                self.last_hello = time.time()
+                self.say_hello()
+            self.receive_data()
+            self.process_received_data()
+            if self.mode == self.SERVER and self.is_connected:
+                self.initial_connection()
+
+        if self.mode == self.CLIENT and not self.is_ready and \
+                (time.time() - self.conn_start) > self.conf['connection_timeout']:
+            from fiveinarow.communicator import TimeoutException
+
+            self.comm.encomm.llcomm.clear_send_queue()
+            raise TimeoutException
+
+        return self.is_ready
+
+    def say_hello(self):
+        """
+        Send a hello message to the partner (server), repeated by connect_step until the server answers.
+        :return: None
+        """
+
+        self.send(data=self.HELLO_HEADER, header='hello')
+
+    def answer_hello(self):
+        """
+        Send answer for the hello message to the partner (client).
+        :return: None
+        """
+        self.send(data=self.HELLO_HEADER[::-1], header='hello_answer')
+
+    def apply_server_conf(self, recv_conf):
+        """
+        Apply selected configuration items recieved from server.
+        :param recv_conf: configuration dict
+        :return: None
+        """
+        if self.mode == self.CLIENT:
+            conf_to_apply = ['numgridx', 'numgridy', 'n_to_win']
+            for c in conf_to_apply:
+                self.conf[c] = recv_conf[c]
+
+            # a match server assigns the player ids and the first move, a resumed session keeps its player id
+            if 'player_id' in recv_conf:
+                self.player.id = recv_conf['player_id']
+            if 'first_move' in recv_conf:
+                self.player.turn = recv_conf['first_move']
+
+    def initial_connection(self):
+        """
+        Initialising connection to partner.
+        :return: None
+        """
+        if not self.encrypted_comm:
+            self.encrypted_comm = self.comm.init_encryption()
+
+        if self.mode == self.CLIENT and self.encrypted_comm:
+            self.server_conf, header = self.recv(timeout=0)
+            if header == 'resume_ok':  # key exchange after a failed resumption, the game goes on
+                self.resumed_state = self.server_conf
+            if header in ['server_config', 'resume_ok']:
+                self.apply_server_conf(self.server_conf)
+                self.is_ready = True
+
+        elif self.mode == self.SERVER and self.encrypted_comm:
+            self.send(self.conf, 'server_config')
+            self.comm.send_ticket(self.ticket_issuer, self.session_id)
+            self.is_ready = True
+
+    def init_game(self):
+        """
+        Creates the board and agrees on the players and their turns with the partner.
+        :return: None
+        """
+
+        self.board = Board((self.conf['numgridx'], self.conf['numgridy']), self.conf['n_to_win'],
+                           storage=self.conf.get('board_storage', Board.NUMPY))
+        if self.conf.get('record_file'):
+            from fiveinarow.game_record import GameRecordWriter
+
+            self.recorder = GameRecordWriter(self.conf['record_file'])
+        if self.resumed_state is not None:
+            self.restore_game(self.resumed_state)
+
+        self.get_other_player()
+        self.__receive_until(lambda: self.other_player is not None)
+
+        if self.resumed_state is None:
+            self.send_request('start_game')
+            self.__receive_until(lambda: self.game_is_on)
+
+        if self.player.turn == self.other_player.turn and self.resumed_state is None:
+            if self.mode == self.SERVER:
+                self.player.turn = not self.player.turn
+                self.send(data=self.player, header='my_player')
+            else:
+                self.__receive_until(lambda: self.player.turn != self.other_player.turn)
+
+    def __receive_until(self, condition, timeout=3):
+        """
+        Receives and processes messages until the condition holds, other messages arriving meanwhile are
+        processed too.
+        :param condition: function without arguments returning bool
+        :param timeout: seconds
+        :return: bool, the condition holds
+        """
+
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            self.receive_data(timeout=min(1.0, max(deadline - time.time(), 0.01)))
+            self.process_received_data()
+
+        return condition()
+
+    def get_other_player(self):
+        """
+        Sends a request to the partner, to send its players info.
+        :return: None
+        """
+
+        self.send(None, 'get_player')
+
+    def player_on_move(self, player_id):
+        """
+        Checks if player is allowed to move.
+        :param player_id:
+        :return: bool, if player is able to move
+        """
+
+        if player_id == self.other_player.id and self.other_player.turn:
+            return True
+        if player_id == self.player.id and self.player.turn:
+            return True
+
+        return False
+
+    def next_player(self):
+        """
+        Go to the next player
+        :return: None
+        """
+
+        self.player.turn = not self.player.turn
+        self.other_player.turn = not self.other_player.turn
+
+    def send_request(self, request):
+        """
+        Send a request headered data packet to the partner.
+        :param request: request data
+        :return: None
+        """
+        self.send(request, 'partner_request')
+
+    def place(self, pos, player_id):
+        """
+        Places a move on the board, records it and checks the board.
+        :param pos: position tuple
+        :param player_id: placing player's id
+        :return: (game is on, board status, success)
+        """
+
+        try:
+            self.board.place(pos, player_id)
+        except self.board.OccupiedException as e:
+            return True, None, False
+        if self.recorder is not None:
+            if not self.recorder.in_game():
+                self.recorder.start_game(self.board.size, self.board.num_to_win)
+            self.recorder.record_move(pos, player_id)
+        board_status = self.board.check_board()
+        if board_status is not None:
+            if board_status[1] != (0, 0):  # the direction is (0, 0) if the board is full
+                logging.info("winning move ((x,y),id)={pos} in direction {dir}".format(pos=board_status[0],
+                                                                                      dir=board_status[1]))
+            if self.recorder is not None:
+                from fiveinarow.game_record import NO_WINNER
+
+                self.recorder.end_game(board_status[0][1] if board_status[1] != (0, 0) else NO_WINNER)
+            return False, board_status, True
+            # game over
+
+        return True, None, True
+
+    def process_move(self, pos, player_id):
+        """
+        Checks if move is valid, places on board and updates game- and board status.
+        :param pos: position tuple
+        :param player_id: placing player's id
+        :return: bool, the move was placed
+        """
+
+        if not self.game_is_on:
+            logging.debug('Dropped move {}, game is not on'.format(pos))
+            return False
+
+        if not self.player_on_move(player_id):
+            return False
+
+        if not self.board.on_board(pos):
+            logging.warning('Dropped move {}, it is not on the board'.format(pos))
+            return False
+
+        self.game_is_on, self.board_status, success = self.place(pos, player_id)
+        if success:
+            self.next_player()
+            if player_id == self.player.id:
+                self.send(pos, 'move')
+            if not self.game_is_on:
+                self.end_game()
+            if self.on_move is not None:
+                self.on_move(pos, player_id)
+
+        return success
+
+    def bot_move(self):
+        """
+        :return: move of the engine if it plays the local player and it is on move, otherwise None
+        """
+
+        if not self.bot or not self.game_is_on or not self.player_on_move(self.player.id):
+            return None
+
+        return self.player.choose_move(self.board)
+
+    def is_winner(self):
+        """
+        :return: bool, the local player won the finished game
+        """
+
+        return self.board_status is not None and self.player.id == self.board_status[0][1] and \
+            self.board_status[1] != (0, 0)
+
+    def is_tie(self):
+        """
+        :return: bool, the finished game ended with a full board
+        """
+
+        return self.board_status is not None and self.board_status[1] == (0, 0)
+
+    def end_game(self):
+        """
+        Counts the point of a finished game once, the winner sends its updated player to the partner.
+        Called by process_move for the last move, before any later message could change the turns.
+        :return: bool, the game ended since the last call
+        """
+
+        if self.game_is_on or self.board_status is None or self.game_ended:
+            return False
+
+        self.game_ended = True
+        if self.is_winner():
+            self.player.wins()
+            self.send(data=self.player, header='my_player')
+
+        return True
+
+    def request_new_game(self):
+        """
+        Asks the partner for a new game, it starts when both asked.
+        :return: None
+        """
+
+        if not self.new_game:
+            self.new_game = True
+            self.send_request('new_game')
+
+    def start_new_game(self):
+        """
+        Starts the new game when both partners asked for it. Both send a 'next_player' request then, the game
+        starts when the partner's one arrived too, so neither moves before the turns are settled on both sides.
+        :return: bool, a new game was started
+        """
+
+        if self.req_new_game and self.new_game and not self.restart_sent:
+            self.restart_sent = True
+            self.send_request('next_player')
+
+        if not (self.restart_sent and self.partner_restarted):
+            return False
+
+        self.new_game = False
+        self.req_new_game = False
+        self.restart_sent = False
+        self.partner_restarted = False
+        self.board.clear()
+        self.game_is_on = True
+        self.board_status = None
+        self.game_ended = False
+
+        return True
+
+    def send(self, data, header):
+        """
+        Sends data to partner.
+        :param data: data part
+        :param header: header part
+        :return: None
+        """
+
+        self.comm.encrypted_send(data, header)
+
+    def recv(self, timeout=0):
+        """
+        Receives data from partner.
+        :param timeout: receive timeout in seconds
+        :return: (data, header), None if nothing was received
+        """
+
+        return self.comm.encrypted_recv(timeout=timeout)
+
+    def receive_data(self, timeout=0, retries=0):
+        """
+        Receives data and appends it to the receive buffer.
+        :param timeout: timeout of each receiving attempt
+        :param retries: number of times to try again, ignored if timeout is 0
+        :return: None
+        """
+
+        self.check_disconnect()
+        if timeout == 0:
+            tries = 1
+        else:
+            tries = retries + 1
+        while tries > 0:
+            data, header = self.recv(timeout=timeout)
+            if data is not None or header is not None:
+                self.recv_buffer.append((data, header))
+                return
+            tries -= 1
+
+    def check_disconnect(self):
+        """
+        Server mode, enters the resumption state when the client of an encrypted session went away: the cipher is
+        dropped, and until a client is back only its 'resume' and the key exchange offered after a failed resumption
+        are accepted. A 'resume' or key exchange is never taken while a cipher is set.
+        :return: None
+        """
+
+        if self.monitor is None:
+            return
+
+        from zmq.utils.monitor import recv_monitor_message
+
+        while self.monitor.poll(0):
+            recv_monitor_message(self.monitor)  # only disconnects are reported
+            if self.comm.encomm.symmetric_cipher is not None:
+                logging.info("client disconnected, waiting for it to resume the session")
+                self.comm.encomm.reset_encryption()
+                self.awaiting_resume = True
+                self.rekey_pending = False
+
+    def process_received_data(self):
+        """
+        If some data is in the receive buffer proccesses it and acts.
+        :return: None
+        """
+
+        if len(self.recv_buffer) == 0:
+            return
+
+        for data, header in self.recv_buffer:
+            logging.debug("header: {}".format(header))
+            if header is None:
+                logging.debug("recieved data without header: {}".format(data))
+                continue
+
+            if self.awaiting_resume:
+                if header == 'resume':
+                    self.resume_client(data)
+                elif header == 'encrypted_symm_key' and self.rekey_pending:
+                    self.rekey_client(data)
+                else:
+                    logging.warning("dropped {} before the session was resumed".format(header))
+                continue
+
+            if header == 'hello':
+                self.answer_hello()
+                self.is_connected = True
+                continue
+
+            if header == 'hello_answer':
+                self.is_connected = True
+                continue
+
+            if header[:5] == 'echo_':
+                self.send(data, header)
+                continue
+
+            if header == 'move':
+                self.process_move(data, self.other_player.id)
+                continue
+
+            if header == 'get_player':
+                self.send(data=self.player, header='my_player')
+                continue
+
+            if header == 'my_player':
+                self.other_player = data
+                continue
+
+            if header == 'session_ticket':
+                self.comm.store_ticket(data)
+                continue
+
+            if header == 'partner_request':
+                if data == 'next_player':
+                    self.next_player()
+                    self.partner_restarted = True
+                    continue
+
+                if data == 'new_game':
+                    self.req_new_game = True
+                    self.next_player()
+                    continue
+
+                if data == 'start_game':
+                    self.game_is_on = True
+                    continue
+
+        self.recv_buffer = []
+
+    def resume_client(self, data):
+        """
+        Resumes the session of a reconnecting client, sends it the game state and a new ticket.
+        If the ticket is not accepted, a new key is offered instead, see rekey_client. Only called in the
+        resumption state, see check_disconnect.
+        :param data: data of the 'resume' message
+        :return: None
+        """
+
+        if self.comm.accept_resume(self.ticket_issuer, data) is None:
+            self.send(self.comm.encomm.server_key_offer(), 'pubkey')
+            self.rekey_pending = True
+            return
+
+        self.awaiting_resume = False
+        self.send_game_state()
+
+    def rekey_client(self, data):
+        """
+        Finishes the key exchange offered after a failed resumption, then sends the game state like a resumption.
+        The session stays in the resumption state if the exchange fails.
+        :param data: data of the 'encrypted_symm_key' message
+        :return: None
+        """
+
+        self.rekey_pending = False
+        if self.comm.encomm.server_init_encryption(data):
+            self.awaiting_resume = False
+            self.send_game_state()
+
+    def send_game_state(self):
+        """
+        Sends the game state in a 'resume_ok' message and a ticket of the session to the client.
+        :return: None
+        """
+
+        points = [0, 0]
+        points[self.player.id] = self.player.points
+        points[self.other_player.id] = self.other_player.points
+        on_move = self.player.id if self.player.turn else self.other_player.id
+        state = {'numgridx': self.conf['numgridx'], 'numgridy': self.conf['numgridy'], 'n_to_win': self.conf['n_to_win'],
+                 'player_id': self.other_player.id, 'on_move': on_move, 'game_is_on': self.game_is_on,
+                 'points': points, 'moves': self.board.moves}
+        self.send(state, 'resume_ok')
+        self.comm.send_ticket(self.ticket_issuer, self.session_id)
+
+    def restore_game(self, state):
+        """
+        Puts the game state of a resumed session on the board.
+        :param state: data of the 'resume_ok' message
+        :return: None
+        """
+
+        for pos, player_id in state['moves']:
+            self.board.place(pos, player_id)
+        self.board_status = self.board.check_board()
+        self.game_is_on = state['game_is_on']
+        self.player.points = state['points'][self.player.id]
+        self.player.turn = state['on_move'] == self.player.id
+
+    def wait(self, timeout):
+        """
+        Waits until data arrives from the partner.
+        :param timeout: seconds
+        :return: bool, data is waiting
+        """
+
+        return bool(self.comm.encomm.llcomm.poller.poll(int(timeout * 1000)))
+
+    def run(self, ip_addr=None, max_games=None, poll_timeout=0.1):
+        """
+        Plays without user interface, the local player is the engine: connects, then plays games until max_games
+        were finished or done is set. New games are requested at once after a game ended.
+        :param ip_addr: client mode, IP address or hostname of the server
+        :param max_games: number of games to play, no limit if None
+        :param poll_timeout: seconds to wait for the partner's messages at once
+        :return: None
+        """
+
+        assert(self.bot)
+
+        if self.comm is None:
+            if self.mode == self.SERVER:
+                self.open_server()
+            else:
+                self.open_client(ip_addr)
+
+        while not self.done and not self.connect_step():
+            self.wait(poll_timeout)
+
+        self.init_game()
+
+        games = 0
+        while not self.done:
+            move = self.bot_move()
+            if move is not None:
+                self.process_move(move, self.player.id)
+            else:
+                self.wait(poll_timeout)
+
+            self.receive_data()
+            self.process_received_data()
+
+            if self.game_ended and not self.new_game:
+                games += 1
+                logging.info("game {} over, {}:{}".format(games, self.player.points, self.other_player.points))
+                if max_games is not None and games >= max_games:
+                    break
+                self.request_new_game()
+
+            self.start_new_game()
+
+    def close(self):
+        """
+        Closes the connection, the engine of a bot player and the game recorder.
+        :return: None
+        """
+
+        if self.comm is not None:
+            if self.monitor is not None:
+                self.comm.encomm.llcomm.socket.disable_monitor()
+                self.monitor.close(linger=0)
+                self.monitor = None
+            self.comm.encomm.llcomm.socket.close(linger=0)
+
+        if self.bot and self.player is not None:  # stops the worker processes of a parallel engine
+            self.player.close()
+
+        if self.recorder is not None:  # an unfinished game is written without winner
+            self.recorder.close()
+            self.recorder = None
+
+        if self.conf.get('metrics_file'):
+            from fiveinarow.metrics import METRICS
+
+            METRICS.dump(self.conf['metrics_file'])
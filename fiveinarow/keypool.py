@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pool of pre-generated RSA key-pairs, filled by a background process and optionally cached on disk
+"""
+
+import collections
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import rsa
+from concurrent.futures import ProcessPoolExecutor
+
+
+def generate_key(key_bits):
+    """
+    Generates a key-pair, runs in the pool's worker process.
+    :param key_bits: key size in bits
+    :return: PEM encoded private key, bytes
+    """
+
+    _, privkey = rsa.newkeys(key_bits)
+    return privkey.save_pkcs1()
+
+
+class KeyPool:
+    SUFFIX = '.pem'
+
+    def __init__(self, key_bits=1024, size=4, cache_dir=None, max_age=7 * 24 * 3600):
+        """
+        Every key is handed out only once, also by pools of other processes sharing the cache directory:
+        a cached key is claimed on the disk before it is used, see __claim.
+        :param key_bits: key size in bits
+        :param size: number of keys kept ready
+        :param cache_dir: directory the ready keys are stored in between runs, no disk cache if None
+        :param max_age: seconds after cached keys expire and are deleted unused
+        """
+
+        self.key_bits = key_bits
+        self.size = size
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+        self.keys = collections.deque()  # (PEM bytes, cache file path or None), oldest first
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.__load_cache()
+
+    def __load_cache(self):
+        """
+        Loads the unexpired cached keys of the pool's key size, deletes the expired ones.
+        :return: None
+        """
+
+        prefix = "{}-".format(self.key_bits)
+        now = time.time()
+        cached = []
+        for name in os.listdir(self.cache_dir):
+            if not (name.startswith(prefix) and name.endswith(self.SUFFIX)):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                created = os.path.getmtime(path)
+                if now - created > self.max_age:
+                    os.remove(path)
+                    continue
+                with open(path, 'rb') as key_file:
+                    cached.append((created, key_file.read(), path))
+            except OSError as e:
+                logging.warning("cannot read cached key {}: {}".format(path, e))
+
+        for _, pem, path in sorted(cached):
+            self.keys.append((pem, path))
+        logging.debug("{} cached RSA keys loaded".format(len(self.keys)))
+
+    def start(self):
+        """
+        Starts the background process and generates keys until the pool is full. The process is started with
+        forkserver, or spawn where it is not available, like the workers of ParallelEngine.
+        :return: None
+        """
+
+        if self.executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(method))
+        self.refill()
+
+    def refill(self):
+        """
+        Submits generation of the missing keys, if the pool is started.
+        :return: None
+        """
+
+        if self.executor is None:
+            return
+
+        with self.lock:
+            missing = self.size - len(self.keys) - self.pending
+            self.pending += max(missing, 0)
+        for _ in range(missing):
+            future = self.executor.submit(generate_key, self.key_bits)
+            future.add_done_callback(self.__key_generated)
+
+    def __key_generated(self, future):
+        """
+        Adds a key made by the background process to the pool and the disk cache.
+        :param future: future of generate_key
+        :return: None
+        """
+
+        with self.lock:
+            self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            if not future.cancelled():
+                logging.error("RSA key generation failed: {}".format(future.exception()))
+            return
+
+        pem = future.result()
+        path = None
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, "{}-{}{}".format(self.key_bits, uuid.uuid4().hex, self.SUFFIX))
+            try:
+                self.__write_private(path, pem)
+            except OSError as e:
+                logging.warning("cannot cache RSA key: {}".format(e))
+                path = None
+
+        with self.lock:
+            self.keys.append((pem, path))
+
+    @staticmethod
+    def __write_private(path, data):
+        """
+        Writes a private key readable only by the owner. It is written to a temporary file first and renamed,
+        so a crash never leaves a truncated key for the next run to load.
+        :param path: file path
+        :param data: bytes
+        :return: None
+        """
+
+        temp_path = path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'wb') as key_file:
+                key_file.write(data)
+                key_file.flush()
+                os.fsync(key_file.fileno())
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def get(self, generate=True):
+        """
+        Takes a key-pair from the pool.
+        :param generate: generate a key-pair in place if the pool is empty, otherwise None is returned
+            and the caller can try again when the background process refilled the pool
+        :return: (rsa.PublicKey, rsa.PrivateKey), None if the pool is empty and generate is False
+        """
+
+        while True:
+            with self.lock:
+                key = self.keys.popleft() if len(self.keys) > 0 else None
+            if key is None or key[1] is None or self.__claim(key[1]):
+                break
+            logging.debug("cached RSA key {} was taken by another process".format(key[1]))
+
+        if key is None:
+            self.misses += 1
+            if not generate:
+                self.refill()
+                return None
+            logging.debug("RSA key pool is empty, generating key")
+            pubkey, privkey = rsa.newkeys(self.key_bits)
+        else:
+            self.hits += 1
+            pem, _ = key
+            privkey = rsa.PrivateKey.load_pkcs1(pem)
+            pubkey = rsa.PublicKey(privkey.n, privkey.e)
+
+        self.refill()
+
+        return pubkey, privkey
+
+    @staticmethod
+    def __claim(path):
+        """
+        Claims a cached key for this process: the file is renamed to a unique name, which succeeds in only one
+        of the processes sharing the cache directory, then deleted. A claimed file left behind is never loaded.
+        :param path: cache file path of the key
+        :return: bool, the key may be used, False if another process took it
+        """
+
+        claimed = "{}.{}.claimed".format(path, uuid.uuid4().hex)
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return False
+        try:
+            os.remove(claimed)
+        except OSError as e:
+            logging.warning("cannot delete claimed RSA key {}: {}".format(claimed, e))
+
+        return True
+
+    def __len__(self):
+        return len(self.keys)
+
+    def close(self):
+        """
+        Stops the background process, keys being generated are dropped. Ready keys stay in the disk cache.
+        :return: None
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
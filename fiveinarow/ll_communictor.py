@@ -12,13 +12,22 @@ class LLComm:
     SERVER = 'ser'
     CLIENT = 'cli'
 
-    def __init__(self, mode, ip_addr=None, port=None):
+    def __init__(self, mode, ip_addr=None, port=None, socket_type=zmq.PAIR):
+        """
+        :param mode: CLIENT or SERVER mode
+        :param ip_addr: IP address of server
+        :param port: communication port
+        :param socket_type: ZeroMQ socket type, PAIR for a single partner, DEALER for a client of a match server
+        """
+
         if mode in [self.SERVER, self.CLIENT]:
             self.mode = mode
         else:
             raise ValueError
 
         self.port = port
+        self.socket_type = socket_type
+        self.last_wait = 0.0  # seconds the last recv waited for data
 
         if self.mode == self.SERVER:
             self.ip_text = 'localhost'
@@ -34,11 +43,12 @@ class LLComm:
         :return: None
         """
 
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.PAIR)
+        self.context = self._new_context()
+        self.socket = self.context.socket(self.socket_type)
         bind_address = "tcp://*:{port}".format(port=self.port)
         logging.info(bind_address)
         self.socket.bind(bind_address)
+        self.__init_poller()
 
     def __init_client(self):
         """
@@ -46,11 +56,28 @@ class LLComm:
         :return: None
         """
 
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.PAIR)
+        self.context = self._new_context()
+        self.socket = self.context.socket(self.socket_type)
         server_addr = "tcp://{ip}:{port}".format(ip=self.ip_text, port=self.port)
         logging.info(server_addr)
         self.socket.connect(server_addr)
+        self.__init_poller()
+
+    def _new_context(self):
+        """
+        :return: ZeroMQ context for the socket
+        """
+
+        return zmq.Context()
+
+    def __init_poller(self):
+        """
+        Registers the socket for incoming messages, blocking receives wait on the poller.
+        :return: None
+        """
+
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
 
     def send(self, data, timeout):
         """
@@ -64,31 +91,28 @@ class LLComm:
 
     def recv(self, timeout=0.0):
         """
-        Receive data
-        :param timeout:
-        :return: data
+        Receive data. Blocking receives wait on a zmq.Poller, so they return as soon as a message arrives.
+        The time spent waiting is stored in last_wait.
+        :param timeout: seconds, 0 for nonblocking, None for 30 seconds
+        :return: data, None if nothing arrived within timeout
         """
 
-        if timeout == 0.0:
+        if timeout is None:
+            timeout = 30
+
+        start = time.perf_counter()
+        data = None
+        if timeout == 0.0 or self.poller.poll(timeout * 1000):
             try:
                 data = self.socket.recv(flags=zmq.NOBLOCK)
-                return data
             except zmq.Again as e:
-                return None
-        else:
-            if timeout is None:
-                timeout = 30
-            start = time.time()
-            timeout_sec = timeout
-            while time.time() - start < timeout_sec:
-                try:
-                    data = self.socket.recv(flags=zmq.NOBLOCK)
-                    return data
-                except zmq.Again as e:
-                    time.sleep(.99)
+                pass
+        self.last_wait = time.perf_counter() - start
 
+        if data is None and timeout != 0.0:
             logging.error("communication timed out")
-            return None
+
+        return data
 
     def clear_send_queue(self, timeout_ms=100):
         """
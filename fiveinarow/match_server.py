@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+"""
+Match server, hosts many games in one process on a single ZeroMQ ROUTER socket
+"""
+
+import collections
+import logging
+import time
+import zmq
+
+from fiveinarow.communicator import Communicator
+from fiveinarow.game_board import Board
+from fiveinarow.keypool import KeyPool
+from fiveinarow.session_ticket import TicketIssuer, new_session_id
+
+
+class RouterLink:
+    """
+    Low level communicator of one client session, sends through the server's ROUTER socket.
+    Received messages are put into the inbox by the server.
+    """
+
+    def __init__(self, socket, identity):
+        self.socket = socket
+        self.identity = identity
+        self.inbox = collections.deque()
+        self.last_wait = 0.0
+
+    def send(self, data, timeout=None):
+        self.socket.send_multipart([self.identity, data])
+
+    def recv(self, timeout=0.0):
+        """
+        :param timeout: has no effect, the server only reads messages that already arrived
+        :return: next message of the session, None if there is none
+        """
+
+        return self.inbox.popleft() if len(self.inbox) > 0 else None
+
+    def clear_send_queue(self, timeout_ms=100):
+        pass
+
+
+class Session:
+    HANDSHAKE = 'handshake'
+    LOBBY = 'lobby'
+    PLAYING = 'playing'
+
+    def __init__(self, socket, identity, rsa_key_bits, key_pool=None, timestamps=False):
+        self.identity = identity
+        self.link = RouterLink(socket, identity)
+        self.comm = Communicator(mode=Communicator.SERVER, timestamps=timestamps)
+        self.comm.init_connection(port=0, rsa_key_bits=rsa_key_bits, llcomm=self.link, key_pool=key_pool)
+
+        self.session_id = new_session_id()
+        self.state = self.HANDSHAKE
+        self.key_sent = False
+        self.match = None
+        self.player_id = None
+        self.last_seen = time.time()
+
+    def send(self, data, header):
+        self.comm.encrypted_send(data, header)
+
+    def take_over(self, session):
+        """
+        Continues on the connection of a new session, used when a client resumes this session after reconnecting.
+        :param session: session of the new connection, its encryption is already resumed
+        :return: None
+        """
+
+        self.identity = session.identity
+        self.link = session.link
+        self.comm = session.comm
+
+
+class Match:
+    def __init__(self, sessions, conf):
+        """
+        A game between two sessions, the server keeps its own board to validate moves.
+        :param sessions: pair of sessions, their index is their player id
+        :param conf: game configuration, 'numgridx', 'numgridy' and 'n_to_win' are used
+        """
+
+        self.sessions = sessions
+        self.board = Board((conf['numgridx'], conf['numgridy']), conf['n_to_win'])
+        self.over = False
+        self.points = [0, 0]
+        self.next_mover = None  # the loser starts the next game, like the clients' turn swapping does
+
+    def partner(self, session):
+        return self.sessions[1 - session.player_id]
+
+    def state(self, session):
+        """
+        :param session: session the state is sent to
+        :return: game state of a 'resume_ok' message
+        """
+
+        return {'numgridx': self.board.size[0], 'numgridy': self.board.size[1], 'n_to_win': self.board.num_to_win,
+                'player_id': session.player_id, 'on_move': self.next_mover, 'game_is_on': not self.over,
+                'points': self.points, 'moves': self.board.moves}
+
+
+class MatchServer:
+    HELLO_HEADER = b"hello_fir_server"
+
+    def __init__(self, port, conf, rsa_key_bits=1024, handshake_timeout=60, match_timeout=1800, key_pool=None):
+        """
+        Binds the ROUTER socket.
+        :param port: TCP port
+        :param conf: game configuration sent to the clients, 'numgridx', 'numgridy' and 'n_to_win' are used
+        :param rsa_key_bits: RSA key size of the sessions' key exchange
+        :param handshake_timeout: seconds after sessions not in a match are dropped if they stay silent,
+            and after a match whose game is over is ended if no new game is started
+        :param match_timeout: seconds after a match is ended if both of its sessions stay silent during a game
+        :param key_pool: KeyPool of the sessions' key-pairs, by default one cached in the optional
+            'rsa_key_cache' directory of conf. It is started by the server, handshakes wait for its keys.
+        """
+
+        self.port = port
+        self.conf = conf
+        self.rsa_key_bits = rsa_key_bits
+        self.handshake_timeout = handshake_timeout
+        self.match_timeout = match_timeout
+        if key_pool is None:
+            key_pool = KeyPool(rsa_key_bits, cache_dir=conf.get('rsa_key_cache'))
+        key_pool.start()
+        self.key_pool = key_pool
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.ROUTER)
+        bind_address = "tcp://*:{port}".format(port=port)
+        logging.info(bind_address)
+        self.socket.bind(bind_address)
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+
+        self.sessions = dict()
+        self.resumable = dict()  # session id -> session in a match
+        self.ticket_issuer = TicketIssuer()
+        self.lobby = collections.deque()
+        self.key_queue = collections.deque()  # sessions waiting for a key-pair of the pool, oldest first
+        self.matches = set()
+        self.num_matches = 0
+        self.done = False
+
+    def serve_forever(self, poll_timeout=1.0):
+        """
+        Serves clients until done is set.
+        :param poll_timeout: seconds between checks of done and idle sessions
+        :return: None
+        """
+
+        while not self.done:
+            self.poll(poll_timeout)
+            self.drop_idle_sessions()
+
+    def poll(self, timeout=0.0):
+        """
+        Waits for messages and processes every one that arrived. Handshakes waiting for a key-pair are continued
+        when the key pool has one, the wait is kept short while there are such handshakes.
+        :param timeout: seconds to wait for the first message
+        :return: number of processed messages
+        """
+
+        self.__offer_keys()
+        if len(self.key_queue) > 0:
+            timeout = min(timeout, 0.05)
+
+        count = 0
+        if not self.poller.poll(timeout * 1000):
+            self.__offer_keys()
+            return count
+
+        while True:
+            try:
+                identity, payload = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            except ValueError:
+                logging.warning("dropped message with unexpected frames")
+                continue
+
+            session = self.sessions.get(identity)
+            if session is None:
+                session = Session(self.socket, identity, self.rsa_key_bits, self.key_pool,
+                                  timestamps=self.conf.get('metrics_timestamps', False))
+                self.sessions[identity] = session
+            session.last_seen = time.time()
+            session.link.inbox.append(payload)
+
+            try:
+                data, header = session.comm.encrypted_recv(timeout=0)
+                if header is not None:
+                    self.process_message(session, data, header)
+            except Exception:  # one misbehaving client must not stop the games of the others
+                logging.exception("dropped session after an error in its message")
+                self.drop_session(session)
+            count += 1
+
+        return count
+
+    def process_message(self, session, data, header):
+        """
+        Acts on one message of a session: runs the handshake, pairs sessions in the lobby and relays game messages.
+        :return: None
+        """
+
+        if header == 'hello':
+            session.send(self.HELLO_HEADER[::-1], 'hello_answer')
+            if not session.key_sent:
+                session.key_sent = True
+                self.key_queue.append(session)
+                self.__offer_keys()
+            return
+
+        if header == 'resume' and session.state == Session.HANDSHAKE:
+            self.__resume(session, data)
+            return
+
+        if header == 'encrypted_symm_key' and session.state == Session.HANDSHAKE:
+            if not session.comm.encomm.server_init_encryption(data):
+                logging.warning("dropped session with a failed key exchange")
+                self.drop_session(session)
+                return
+            session.state = Session.LOBBY
+            self.lobby.append(session)
+            self.__pair_sessions()
+            return
+
+        if session.state != Session.PLAYING:
+            logging.debug("dropped {} from session not in a match".format(header))
+            return
+
+        match = session.match
+        partner = match.partner(session)
+
+        if header == 'move':
+            if not self.__valid_move(match, session, data):
+                logging.debug("dropped invalid move {} in match".format(data))
+                return
+            partner.send(data, 'move')
+            return
+
+        if header == 'partner_request' and data == 'next_player' and match.over:
+            match.board.clear()
+            match.over = False
+
+        if header in ['get_player', 'my_player', 'partner_request'] or header[:5] == 'echo_':
+            partner.send(data, header)
+
+    def __offer_keys(self):
+        """
+        Sends 'pubkey' to the queued sessions while the key pool has key-pairs. Generating a key on the server loop
+        would stall every game, so the handshakes wait for the pool's background process instead.
+        :return: None
+        """
+
+        while len(self.key_queue) > 0:
+            session = self.key_queue[0]
+            if self.sessions.get(session.identity) is not session or session.state != Session.HANDSHAKE:
+                self.key_queue.popleft()
+                continue
+            key_pair = self.key_pool.get(generate=False) if len(self.key_pool) > 0 else None
+            if key_pair is None:
+                return
+            self.key_queue.popleft()
+            session.send(session.comm.encomm.server_key_offer(key_pair), 'pubkey')
+
+    def __resume(self, session, data):
+        """
+        Moves a resumed session to the connection it was resumed on, and sends it the state of its match.
+        If it can not be resumed, the client gets a new key offer and joins the lobby after the key exchange.
+        :param session: new session of the reconnected client
+        :param data: data of the 'resume' message
+        :return: None
+        """
+
+        session_id = session.comm.accept_resume(self.ticket_issuer, data)
+        resumed = self.resumable.get(session_id) if session_id is not None else None
+        if resumed is None:
+            if session_id is not None:  # valid ticket of an ended match, drop the cipher this resumption set up
+                session.comm.encomm.reset_encryption()
+                session.send(None, 'resume_failed')
+            if not session.key_sent:
+                session.key_sent = True
+                self.key_queue.append(session)
+                self.__offer_keys()
+            return
+
+        del self.sessions[resumed.identity]
+        resumed.take_over(session)
+        self.sessions[resumed.identity] = resumed
+        resumed.send(resumed.match.state(resumed), 'resume_ok')
+        resumed.comm.send_ticket(self.ticket_issuer, resumed.session_id)
+        logging.info("session resumed")
+
+    def __valid_move(self, match, session, pos):
+        """
+        Places the move on the match's board if the game is on and the session did not make the previous move.
+        :return: bool
+        """
+
+        if match.over:
+            return False
+        board = match.board
+        if match.next_mover != session.player_id:
+            return False
+        if not board.on_board(pos):
+            return False
+        try:
+            board.place(tuple(pos), session.player_id)
+        except Board.OccupiedException:
+            return False
+
+        status = board.check_board()
+        match.over = status is not None
+        match.next_mover = 1 - session.player_id
+        if match.over and status[1] != (0, 0):
+            match.points[session.player_id] += 1
+        return True
+
+    def __pair_sessions(self):
+        """
+        Starts matches from the sessions waiting in the lobby, the first player alternates between matches.
+        :return: None
+        """
+
+        while len(self.lobby) >= 2:
+            sessions = [self.lobby.popleft(), self.lobby.popleft()]
+            match = Match(sessions, self.conf)
+            first = self.num_matches % 2
+            match.next_mover = first
+            self.num_matches += 1
+
+            self.matches.add(match)
+            for player_id, session in enumerate(sessions):
+                session.state = Session.PLAYING
+                session.match = match
+                session.player_id = player_id
+                conf = {'numgridx': self.conf['numgridx'], 'numgridy': self.conf['numgridy'],
+                        'n_to_win': self.conf['n_to_win'], 'player_id': player_id, 'first_move': player_id == first}
+                session.send(conf, 'server_config')
+                session.comm.send_ticket(self.ticket_issuer, session.session_id)
+                self.resumable[session.session_id] = session
+
+            logging.info("match {} started, {} sessions".format(self.num_matches, len(self.sessions)))
+
+    def end_match(self, match):
+        """
+        Forgets a match and its sessions, they can not be resumed any more.
+        :param match: Match
+        :return: None
+        """
+
+        self.matches.discard(match)
+        for session in match.sessions:
+            if self.sessions.get(session.identity) is session:
+                del self.sessions[session.identity]
+            self.resumable.pop(session.session_id, None)
+        logging.info("match ended, {} matches, {} sessions".format(len(self.matches), len(self.sessions)))
+
+    def drop_session(self, session):
+        """
+        Forgets a session, and ends its match if it is in one.
+        :param session: Session
+        :return: None
+        """
+
+        if session.match is not None:
+            self.end_match(session.match)
+        elif self.sessions.get(session.identity) is session:
+            del self.sessions[session.identity]
+        if session in self.lobby:
+            self.lobby.remove(session)
+
+    def drop_idle_sessions(self):
+        """
+        Forgets sessions that did not finish the handshake or wait in the lobby without any message for too long.
+        Matches are ended when both sessions stay silent for match_timeout, or for handshake_timeout after a game
+        is over, which also covers clients that disconnected.
+        :return: None
+        """
+
+        now = time.time()
+        for match in list(self.matches):
+            timeout = self.handshake_timeout if match.over else self.match_timeout
+            if max(session.last_seen for session in match.sessions) < now - timeout:
+                self.end_match(match)
+
+        limit = now - self.handshake_timeout
+        for identity, session in list(self.sessions.items()):
+            if session.state != Session.PLAYING and session.last_seen < limit:
+                del self.sessions[identity]
+                if session in self.lobby:
+                    self.lobby.remove(session)
+
+    def close(self):
+        self.key_pool.close()
+        self.socket.setsockopt(zmq.LINGER, 100)
+        self.socket.close()
+        self.context.term()
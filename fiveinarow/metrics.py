@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+"""
+Counters and histograms of the communicator layers, queryable at runtime and exported in Prometheus text format
+"""
+
+import bisect
+import contextlib
+import http.server
+import os
+import threading
+import time
+
+
+SECONDS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 16384, 65536)
+
+
+class Histogram:
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        """
+        :param buckets: upper bounds of the buckets, an infinite bucket is added
+        """
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation inside its bucket, like Prometheus' histogram_quantile.
+        :param q: quantile, 0 <= q <= 1
+        :return: estimated value, None if nothing was observed
+        """
+
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count > 0 and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Metrics are identified by a name and labels, they are created on their first update.
+        Updates are thread safe, the game loop, the frame scheduler and the HTTP endpoint may share them.
+        """
+
+        self.enabled = True  # updates are dropped if False
+        self.lock = threading.Lock()
+        self.counters = dict()  # (name, labels) -> value
+        self.histograms = dict()  # (name, labels) -> Histogram
+        self.server = None
+        self.dumper = None
+
+    @staticmethod
+    def __key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds to a counter.
+        :param name: metric name
+        :param value: increment
+        :param labels: label values, str
+        :return: None
+        """
+
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        """
+        Adds a value to a histogram.
+        :param name: metric name
+        :param value: observed value
+        :param buckets: bucket bounds, used when the histogram is created
+        :param labels: label values, str
+        :return: None
+        """
+
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """
+        Observes the seconds spent in the with block.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name, **labels):
+        """
+        :return: value of a counter, 0 if it was never increased
+        """
+
+        with self.lock:
+            return self.counters.get(self.__key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        """
+        :return: Histogram, None if nothing was observed
+        """
+
+        with self.lock:
+            return self.histograms.get(self.__key(name, labels))
+
+    def summary(self, name):
+        """
+        :param name: histogram name
+        :return: dict of label dict string -> count, mean, p50, p99 of the histograms of that name
+        """
+
+        with self.lock:
+            return {str(dict(labels)): {'count': h.count, 'mean': h.mean(), 'p50': h.quantile(0.5),
+                                        'p99': h.quantile(0.99)}
+                    for (metric, labels), h in self.histograms.items() if metric == name}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    @staticmethod
+    def __labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if len(labels) == 0:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for name, value in labels) + '}'
+
+    def render(self):
+        """
+        :return: all metrics in Prometheus text exposition format
+        """
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append('# TYPE {} counter'.format(name))
+                lines.append('{}{} {}'.format(name, self.__labels(labels), value))
+
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append('# TYPE {} histogram'.format(name))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(name, self.__labels(labels, [('le', bound)]), cumulative))
+                lines.append('{}_sum{} {}'.format(name, self.__labels(labels), histogram.sum))
+                lines.append('{}_count{} {}'.format(name, self.__labels(labels), histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes the Prometheus text to a file, e.g. for the node exporter's textfile collector.
+        :param path: file name, replaced atomically
+        :return: None
+        """
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temp_path, path)
+
+    def dump_every(self, path, interval=10.0):
+        """
+        Dumps the metrics to a file periodically from a daemon thread.
+        :param path: file name
+        :param interval: seconds between dumps
+        :return: None
+        """
+
+        if self.dumper is not None:
+            return
+
+        def dump_loop():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        self.dumper = threading.Thread(target=dump_loop, daemon=True)
+        self.dumper.start()
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Serves the Prometheus text on http://host:port/metrics from a daemon thread.
+        :param port: TCP port, 0 for a free one
+        :param host: address to listen on, local only by default
+        :return: the port listened on
+        """
+
+        if self.server is not None:
+            return self.server.server_address[1]
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return self.server.server_address[1]
+
+    def close(self):
+        """
+        Stops the HTTP endpoint.
+        :return: None
+        """
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+METRICS = Metrics()  # shared by every communicator of the process
+
+
+def start_export(conf, metrics=METRICS):
+    """
+    Starts the exports of the optional config values 'metrics_file' (written every 'metrics_interval' seconds)
+    and 'metrics_port' (HTTP endpoint on localhost).
+    :param conf: config dict
+    :param metrics: Metrics to export
+    :return: None
+    """
+
+    if conf.get('metrics_file'):
+        metrics.dump_every(conf['metrics_file'], interval=conf.get('metrics_interval', 10.0))
+    if conf.get('metrics_port'):
+        metrics.serve(conf['metrics_port'])
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Engine searching the root moves in parallel on worker processes
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fiveinarow.game_board import Board
+from fiveinarow.engine import Engine
+from fiveinarow.evaluator import Evaluator
+from fiveinarow.transposition import TranspositionTable
+
+
+_board_cache = None  # (moves, board, evaluator) of the last task of this worker process
+_tt_cache = None  # (search id, memory, table) of the search the last task of this worker process belonged to
+
+
+def task_board(task):
+    """
+    Board of a task with an evaluator attached. Consecutive tasks of a search share the position, so the board
+    of the previous task is reused; searches restore it to the position they started from.
+    :return: (Board, Evaluator)
+    """
+
+    global _board_cache
+
+    key = (task['shape'], task['num_to_win'], task['storage'], tuple(task['moves']))
+    if _board_cache is None or _board_cache[0] != key:
+        board = Board(task['shape'], task['num_to_win'], storage=task['storage'])
+        for pos, player_id in task['moves']:
+            board.place(pos, player_id)
+        _board_cache = (key, board, Evaluator(board))
+
+    return _board_cache[1], _board_cache[2]
+
+
+def task_tt(task):
+    """
+    Transposition table of a task, shared by the tasks of the same search on this worker process.
+    The table is cleared when a task of a new search arrives.
+    :return: TranspositionTable
+    """
+
+    global _tt_cache
+
+    memory = task['engine']['tt_memory']
+    if _tt_cache is None or _tt_cache[1] != memory:
+        _tt_cache = (task['search_id'], memory, TranspositionTable(memory))
+    elif _tt_cache[0] != task['search_id']:
+        _tt_cache[2].clear()
+        _tt_cache = (task['search_id'], memory, _tt_cache[2])
+
+    return _tt_cache[2]
+
+
+def search_root_move(task):
+    """
+    Searches one move of the task's position on the worker's copy of the board, with the worker's transposition
+    table of the search. A position is always reached at the same remaining depth in an iteration of a search,
+    and the entries of the earlier iterations are too shallow to cut it off, so the table only saves nodes:
+    whether a move beats alpha, and its exact score if it does, do not depend on the earlier tasks of the worker.
+    :param task: dict with the board ('shape', 'num_to_win', 'storage', 'moves'), the root 'move', 'depth',
+        'alpha', 'beta', 'player_id', 'opponent_id', 'engine' (Engine keyword arguments and 'tt_memory'),
+        'deadline' (time.time() value, None for no limit) and 'search_id' (same for the tasks of a best_move call)
+    :return: (score of the move from the mover's point of view, searched nodes), score is None on timeout
+    """
+
+    settings = dict(task['engine'])
+    del settings['tt_memory']
+    engine = Engine(tt=task_tt(task), **settings)
+    if task['deadline'] is None:
+        engine.deadline = float('inf')
+    else:
+        engine.deadline = time.perf_counter() + task['deadline'] - time.time()
+        if engine.deadline < time.perf_counter():  # most root moves are refuted in fewer nodes than the check interval
+            return None, 0
+
+    board, engine.evaluator = task_board(task)
+    try:
+        score = engine._search_move(board, task['move'], task['depth'], task['alpha'], task['beta'],
+                                    task['player_id'], task['opponent_id'])
+    except Engine.SearchTimeout:
+        score = None
+
+    return score, engine.nodes
+
+
+class ParallelEngine(Engine):
+    def __init__(self, workers=None, tt_memory=1024 * 1024, **kwargs):
+        """
+        Root-split search: the first ordered root move is searched to get a bound, then the other root moves are
+        searched against it at the same time on a process pool. The first move's replies are split the same way,
+        down the leftmost path of the tree. Every task searches on its own board copy, the tasks of a search
+        share the transposition table of their worker process. With a fixed max_depth and no time limit the chosen
+        move is the same on every run and for any number of workers.
+        The workers are started with forkserver, or spawn where it is not available: forking copies the threads
+        and sockets of the game.
+        :param workers: number of worker processes, number of CPUs if None
+        :param tt_memory: transposition table size of each worker process in bytes
+        :param kwargs: Engine keyword arguments
+        """
+
+        kwargs.setdefault('tt', TranspositionTable(0))  # the workers search with their own tables
+        super().__init__(**kwargs)
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_memory = tt_memory
+        self.executor = None  # started on the first search, kept between moves
+        self.search_id = 0
+
+    def best_move(self, board, player_id, opponent_id=None):
+        self.search_id += 1
+        return super().best_move(board, player_id, opponent_id)
+
+    def _search_root(self, board, moves, depth, player_id, opponent_id):
+        """
+        Searches the root moves to a given depth on the worker processes.
+        :return: (score, move) of the best root move, the first one in moves order if scores are equal
+        """
+
+        if self.executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context(method))
+
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.time() + self.deadline - time.perf_counter()
+        task = {'shape': tuple(board.size), 'num_to_win': board.num_to_win, 'storage': board.storage,
+                'moves': list(board.moves), 'depth': depth, 'beta': self.WIN_SCORE + 1, 'player_id': player_id,
+                'opponent_id': opponent_id, 'deadline': deadline, 'search_id': self.search_id,
+                'engine': {'radius': self.radius, 'max_branching': self.max_branching, 'max_depth': self.max_depth,
+                           'tt_memory': self.tt_memory}}
+
+        return self.__search_siblings(task, moves, self.__search_first(board, task, moves[0]))
+
+    def __search_first(self, board, task, move):
+        """
+        Scores the first move of a position. Its replies are split like the root moves, recursively for the first
+        reply, so only the leftmost path of the tree is searched without siblings running in parallel.
+        :param board: Board at the task's position, restored on return
+        :param task: task of the position
+        :param move: first move of the position
+        :return: exact score of the move from the mover's point of view
+        """
+
+        board.place(move, task['player_id'])
+        try:
+            replies = []
+            if task['depth'] > 1 and board.check_board() is None:
+                replies = self.ordered_moves(board, task['opponent_id'], task['player_id'])[:self.max_branching]
+
+            if len(replies) == 0:  # the move ends the game or the depth, one task scores it
+                return self.__result(self.executor.submit(search_root_move, dict(task, move=move,
+                                                                                 alpha=-self.WIN_SCORE - 1)))
+
+            reply_task = dict(task, moves=task['moves'] + [(move, task['player_id'])], depth=task['depth'] - 1,
+                              player_id=task['opponent_id'], opponent_id=task['player_id'])
+            score, _ = self.__search_siblings(reply_task, replies, self.__search_first(board, reply_task, replies[0]))
+            return -score
+        finally:
+            board.undo()
+
+    def __search_siblings(self, task, moves, first_score):
+        """
+        Searches moves[1:] in parallel with the first move's score as lower bound.
+        :param task: task of the position the moves are made in
+        :param moves: moves of the position, moves[0] is already scored
+        :param first_score: exact score of moves[0]
+        :return: (score, move) of the best move, the first one in moves order if scores are equal
+        """
+
+        alpha = first_score
+        best = moves[0]
+        futures = [self.executor.submit(search_root_move, dict(task, move=move, alpha=alpha)) for move in moves[1:]]
+        try:
+            for move, future in zip(moves[1:], futures):
+                score = self.__result(future)
+                if score > alpha:  # exact, the window's upper bound is above any score
+                    alpha = score
+                    best = move
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return alpha, best
+
+    def __result(self, future):
+        score, nodes = future.result()
+        self.nodes += nodes
+        if score is None:
+            raise self.SearchTimeout
+        return score
+
+    def close(self):
+        """
+        Stops the worker processes.
+        :return: None
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
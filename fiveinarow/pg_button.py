@@ -6,12 +6,14 @@ Push button for pygame
 
 import pygame
 
+from fiveinarow.text_cache import TEXT_CACHE
+
 class PushButton:
     def __init__(self, screen, dim, colors, text):
         self.screen = screen
         self.dim = dim
         self.text = text
-        self.font = pygame.font.SysFont("Courier New", 16)
+        self.font_name = "Courier New"
         self.pushbutton = pygame.Rect(self.dim)
         self.colors = colors
         self.box_color = self.colors['ina']
@@ -41,12 +43,14 @@ class PushButton:
             pygame.draw.rect(self.screen, self.box_color, self.pushbutton)
 
         text_color = tuple(map(lambda a, b: a - b, (255, 255, 255), self.box_color))
-        txt_surface = self.font.render(self.text, True, text_color)
+        txt_surface = TEXT_CACHE.render(self.text, 16, text_color, font=self.font_name)
         # Resize the box if the text is too long.
         width = txt_surface.get_width() + 10
         self.pushbutton.w = width
 
         # Blit the text.
-        self.screen.blit(txt_surface, (self.pushbutton.x + 5, self.pushbutton.y + self.dim[3]/2 - 9))
+        text_rect = self.screen.blit(txt_surface, (self.pushbutton.x + 5, self.pushbutton.y + self.dim[3]/2 - 9))
+
+        return self.pushbutton.union(text_rect)
 
 
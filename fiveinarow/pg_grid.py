@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+Grid drawer of the game board for pygame
+"""
+
+import time
+import pygame
+
+from fiveinarow.game_board import Board
+
+
+class Grid:
+    WIN_LINE_TIME = 0.5  # seconds the win line takes to cross the winning stones
+
+    def __init__(self, screen, clock, conf, board=None):
+        """
+        :param screen: pygame display surface
+        :param clock: pygame.time.Clock
+        :param conf: game configuration
+        :param board: Board to draw, e.g. the board of a GameSession, a new one if None
+        """
+        self.screen = screen
+        self.clock = clock
+        self.conf = conf
+        self.__update_conf()
+        self.anim_speed = 20
+        if board is None:
+            board = Board((self.cols, self.rows), conf['n_to_win'], storage=conf.get('board_storage', Board.NUMPY))
+        self.board = board
+        self.gridcoord = None
+
+        # retained rendering: grid lines drawn once to the background, stones added to the surface as they are placed
+        self.background = None
+        self.surface = None
+        self.drawn_moves = []
+        self.win_line = None  # (start, end, start time) of the win line being drawn
+
+    def set_anim_speed(self, speed):
+        self.anim_speed = speed
+
+    def __update_conf(self):
+        self.gridcolor = self.conf['gridcolor']
+        self.cols = self.conf['numgridx']
+        self.rows = self.conf['numgridy']
+        self.bold_grid = self.conf['bold_grid']
+        self.colors = self.conf['player_colors']
+
+        xboundary = 30
+        yboundary = 30
+        screen_width, screen_height = self.screen.get_size()
+
+        grid_bbh = screen_height - 2 * yboundary  # grid Bounding Box Height
+        grid_bbw = screen_width - 2 * xboundary
+
+        self.squaresize = min((grid_bbw / self.cols, grid_bbh / self.rows))
+
+        # tries to fit grid at best in the window
+        if self.cols / self.rows > 1:
+            if grid_bbw / grid_bbh > 1:
+                if self.cols / self.rows > grid_bbw / grid_bbh:
+                    self.grid_offset = (0, (grid_bbh - self.rows * self.squaresize) / 2)
+                else:
+                    self.grid_offset = ((grid_bbw - self.cols * self.squaresize) / 2, 0)
+            elif grid_bbw / grid_bbh < 1:
+                self.grid_offset = (0, (grid_bbh - grid_bbw + (self.cols - self.rows) * self.squaresize) / 2)
+            else:
+                self.grid_offset = (0, (self.cols - self.rows) * self.squaresize / 2)
+
+        elif self.cols / self.rows < 1:
+            if grid_bbw / grid_bbh > 1:
+                self.grid_offset = ((grid_bbw - grid_bbh + (self.rows - self.cols) * self.squaresize) / 2, 0)
+            elif grid_bbw / grid_bbh < 1:
+                if self.cols / self.rows > grid_bbw / grid_bbh:
+                    self.grid_offset = (0, (grid_bbh - self.rows * self.squaresize) / 2)
+                else:
+                    self.grid_offset = ((grid_bbw - self.cols * self.squaresize) / 2, 0)
+            else:
+                self.grid_offset = ((self.rows - self.cols) * self.squaresize / 2, 0)
+
+        else:
+            if grid_bbw / grid_bbh > 1:
+                self.grid_offset = ((grid_bbw - grid_bbh) / 2, 0)
+            elif grid_bbw / grid_bbh < 1:
+                self.grid_offset = (0, (grid_bbh - grid_bbw) / 2)
+            else:
+                self.grid_offset = (0, 0)
+
+        self.width = 2 if self.bold_grid else 1
+
+        grid_height = self.squaresize * self.rows
+        grid_width = self.squaresize * self.cols
+
+        self.grid_size = (grid_width, grid_height)
+
+        self.grid_rect = (xboundary + self.grid_offset[0], yboundary + self.grid_offset[1],
+                          xboundary + self.grid_offset[0] + grid_width, yboundary + self.grid_offset[1] + grid_height)
+
+    def draw_grid(self, flush=False, animate=False):
+        """
+        Draws the game grid from individual lines.
+        :param flush: whether update the screen at end
+        :param animate: whwther update screen after each drawn line
+        :return: None
+        """
+
+        self.__draw_lines(self.screen, animate)
+
+        if flush:
+            pygame.display.update()
+
+    def __draw_lines(self, surface, animate=False):
+        """
+        Draws the grid lines on a surface.
+        :param animate: update the screen after each line, surface has to be the screen
+        :return: None
+        """
+
+        for r in range(self.rows + 1):
+            pos_y = self.squaresize * r + self.grid_rect[1]
+
+            pos_x_start = self.grid_rect[0]
+            pos_x_end = self.grid_rect[2]
+
+            x = pygame.draw.line(surface, self.gridcolor, (pos_x_start, pos_y), (pos_x_end, pos_y), self.width)
+            if animate:
+                pygame.display.update(x)
+                self.clock.tick(self.anim_speed)
+
+        for c in range(self.cols + 1):
+            pos_x = self.squaresize * c + self.grid_rect[0]
+
+            pos_y_start = self.grid_rect[1]
+            pos_y_end = self.grid_rect[3]
+
+            x = pygame.draw.line(surface, self.gridcolor, (pos_x, pos_y_start), (pos_x, pos_y_end), self.width)
+            if animate:
+                pygame.display.update(x)
+                self.clock.tick(self.anim_speed)
+
+    def render(self):
+        """
+        Draws the background and the stones on the board again, and puts the whole surface on the screen.
+        :return: list of changed screen rects
+        """
+
+        self.background = pygame.Surface(self.screen.get_size())
+        self.background.fill(self.conf['bgcolor'])
+        self.__draw_lines(self.background)
+
+        self.surface = self.background.copy()
+        self.drawn_moves = []
+        self.win_line = None
+        self.__draw_new_moves()
+
+        return [self.screen.blit(self.surface, (0, 0))]
+
+    def restore(self, rect):
+        """
+        Puts the grid's surface back on the screen in a rect, erasing what was drawn there over it.
+        :param rect: screen rect
+        :return: the rect
+        """
+
+        return self.screen.blit(self.surface, rect, rect)
+
+    def process_event(self, event):
+        """
+        Processes event for grid click, stores click coordinates
+        :param event: pygame event
+        :return: None
+        """
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.gridcoord = self.get_clicked_cell(event.pos)
+
+    def get_clicked_cell(self, event_pos):
+        """
+        Calculates grid coorfinates from window coordinates
+        :param event_pos: position tuple of the mouse click
+        :return: grid coordinates if click was over the grid else None
+        """
+
+        posx = event_pos[0] - self.grid_rect[0]
+        posy = event_pos[1] - self.grid_rect[1]
+
+        if posx < 0 or self.grid_size[0] < posx:
+            return None
+        if posy < 0 or self.grid_size[1] < posy:
+            return None
+
+        x = int(posx / self.squaresize)
+        y = int(posy / self.squaresize)
+
+        return x, y
+
+    def get_gridcoord(self):
+        return self.gridcoord
+
+    def clear_gridcoord(self):
+        self.gridcoord = None
+
+    def draw_board(self):
+        """
+        Draws the moves placed since the last call on the grid's surface and the screen.
+        Everything is drawn again if moves were taken back or the board was cleared.
+        :return: list of changed screen rects
+        """
+
+        num_drawn = len(self.drawn_moves)
+        moves = self.board.moves
+        if self.surface is None or len(moves) < num_drawn or \
+                (num_drawn > 0 and moves[num_drawn - 1] != self.drawn_moves[-1]):
+            return self.render()
+
+        return [self.restore(rect) for rect in self.__draw_new_moves()]
+
+    def __draw_new_moves(self):
+        """
+        Draws the board's moves that are not on the grid's surface yet.
+        :return: list of rects of the new markers
+        """
+
+        new_moves = self.board.moves[len(self.drawn_moves):]
+        self.drawn_moves.extend(new_moves)
+
+        return [self.__draw_move(pos, player_id) for pos, player_id in new_moves]
+
+    def __draw_move(self, pos, player_id):
+        """
+        Draws a single moves marker on the grid's surface
+        :param pos:  grid coordinates
+        :param player_id: player id for color lookup
+        :return: rect of the marker
+        """
+
+        markersize = int((self.squaresize*0.7)/2 )
+
+        color = self.colors[player_id]
+        return pygame.draw.circle(self.surface, color, self.__cell_center(pos), markersize)
+
+    def __cell_center(self, pos):
+        """
+        :param pos: grid coordinates
+        :return: window coordinates of the cell's center
+        """
+
+        return (int(self.grid_rect[0] + pos[0] * self.squaresize + self.squaresize/2),
+                int(self.grid_rect[1] + pos[1] * self.squaresize + self.squaresize/2))
+
+    def start_win_line(self, status):
+        """
+        Starts drawing a line across the winning stones, draw_win_line draws it as it grows.
+        :param status: board status of a won game, see Board.check_board
+        :return: None
+        """
+
+        (pos, player_id), (dx, dy) = status
+        ends = []
+        for step in [-1, 1]:
+            x, y = pos
+            while self.__is_players((x + step * dx, y + step * dy), player_id):
+                x, y = x + step * dx, y + step * dy
+            ends.append(self.__cell_center((x, y)))
+
+        self.win_line = (ends[0], ends[1], time.time())
+
+    def __is_players(self, pos, player_id):
+        x, y = pos
+        return 0 <= x < self.cols and 0 <= y < self.rows and self.board.is_occupied(pos) and \
+            self.board.get_player_id(pos) == player_id
+
+    def draw_win_line(self):
+        """
+        Draws the part of the win line it grew to since its start, on the grid's surface and the screen.
+        :return: list of changed screen rects
+        """
+
+        if self.win_line is None:
+            return []
+
+        start, end, start_time = self.win_line
+        progress = min((time.time() - start_time) / self.WIN_LINE_TIME, 1.0)
+        if progress == 1.0:
+            self.win_line = None
+
+        tip = (start[0] + (end[0] - start[0]) * progress, start[1] + (end[1] - start[1]) * progress)
+        rect = pygame.draw.line(self.surface, self.conf['textcolor'], start, tip, max(int(self.squaresize / 8), 2))
+        return [self.restore(rect)]
@@ -6,13 +6,15 @@ Text input box for pygame
 
 import pygame
 
+from fiveinarow.text_cache import TEXT_CACHE
+
 class TextBox:
     def __init__(self, screen, dim, colors, title=None, default_text=''):
         self.screen = screen
         self.dim = dim
         self.text = default_text
         self.default_text = default_text
-        self.font = pygame.font.SysFont("Courier New", 24)
+        self.font_name = "Courier New"
         self.input_box = pygame.Rect(self.dim)
         self.colors = colors
         self.box_color = self.colors['ina']
@@ -69,7 +71,7 @@ class TextBox:
     def draw(self):
         # print title
         if self.title is not None:
-            txt_surface = self.font.render(self.title, True, self.colors['txt'])
+            txt_surface = TEXT_CACHE.render(self.title, 24, self.colors['txt'], font=self.font_name)
             self.screen.blit(txt_surface, (self.input_box.x - 45, self.input_box.y - 35))
 
         # Render the current text.
@@ -77,7 +79,7 @@ class TextBox:
             text_color = self.colors['txt']
         else:
             text_color = tuple(map(lambda a, b: a - b, (255, 255, 255), self.colors['bg']))
-        txt_surface = self.font.render(self.text, True, text_color)
+        txt_surface = TEXT_CACHE.render(self.text, 24, text_color, font=self.font_name)
         # Resize the box if the text is too long.
         width = max(self.dim[2], txt_surface.get_width() + 10)
         self.input_box.w = width
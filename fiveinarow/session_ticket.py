@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Session tickets, let a reconnecting client resume its encrypted session without a new RSA key exchange
+"""
+
+import base64
+import os
+import struct
+import time
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+SESSION_ID_SIZE = 16
+CLIENT_RANDOM_SIZE = 32
+SERVER_RANDOM_SIZE = 32
+RESUME_INFO = b'fiveinarow session resumption'
+
+TICKET = struct.Struct('<{}s'.format(SESSION_ID_SIZE))
+
+
+def new_session_id():
+    return os.urandom(SESSION_ID_SIZE)
+
+
+def derive_key(symm_key, client_random, server_random):
+    """
+    Derives the symmetric key of a resumed session. Both partners add randomness, so every resumption gets
+    a fresh key, also if the client's 'resume' message is replayed.
+    :param symm_key: symmetric key of the session the ticket was issued for
+    :param client_random: random bytes sent by the client with the ticket
+    :param server_random: random bytes of the server's 'resume_accept' answer
+    :return: urlsafe base64 encoded 32 byte key, the key format of every cipher suite
+    """
+
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=client_random + server_random, info=RESUME_INFO)
+    return base64.urlsafe_b64encode(hkdf.derive(symm_key))
+
+
+class TicketIssuer:
+    def __init__(self, ticket_key=None, lifetime=3600):
+        """
+        Makes and opens tickets, only the server knows the ticket key. Every ticket is accepted only once.
+        :param ticket_key: Fernet key the tickets are encrypted with, a new random one if None
+        :param lifetime: seconds tickets are accepted after they were issued
+        """
+
+        self.cipher = Fernet(ticket_key if ticket_key is not None else Fernet.generate_key())
+        self.lifetime = lifetime
+        self.used = dict()  # opened ticket -> time it expires, kept until then
+
+    def issue(self, session_id, session_key):
+        """
+        :param session_id: SESSION_ID_SIZE bytes identifying the session
+        :param session_key: cipher suite and symmetric key of the session, see EncryptedComm.session_key
+        :return: ticket, bytes
+        """
+
+        return self.cipher.encrypt(TICKET.pack(session_id) + session_key)
+
+    def open(self, ticket):
+        """
+        :param ticket: ticket presented by a client
+        :return: (session_id, session_key), None if the ticket is invalid, expired or was opened before
+        """
+
+        try:
+            data = self.cipher.decrypt(bytes(ticket), ttl=self.lifetime)
+        except (InvalidToken, TypeError):
+            return None
+
+        now = time.time()
+        self.used = {used: expires for used, expires in self.used.items() if expires > now}
+        if bytes(ticket) in self.used:
+            return None
+        self.used[bytes(ticket)] = now + self.lifetime
+
+        return data[:TICKET.size], data[TICKET.size:]
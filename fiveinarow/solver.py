@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+"""
+Threat-space search solver, finds forced wins made of fours and open threes
+"""
+
+import logging
+import time
+
+from fiveinarow.game_board import Board
+
+
+class Solver:
+    WIN = 'win'
+    UNKNOWN = 'unknown'
+
+    class BudgetExceeded(Exception):
+        pass
+
+    def __init__(self, max_nodes=20000, timeout_ms=1000, max_depth=8, radius=2):
+        """
+        :param max_nodes: number of attacker nodes searched before giving up
+        :param timeout_ms: time limit in milliseconds
+        :param max_depth: maximal number of threats in a winning sequence
+        :param radius: threats are searched at most this far from the attacker's stones
+        """
+
+        self.max_nodes = max_nodes
+        self.timeout_ms = timeout_ms
+        self.max_depth = max_depth
+        self.radius = radius
+
+        self.nodes = 0
+        self.deadline = None
+
+    def solve(self, board, player_id, opponent_id=None):
+        """
+        Searches a forced win for the player on move. Only threats are tried for the attacker, so
+        a WIN is a proof, while UNKNOWN means there is no threat-space win or the budget ran out.
+        :param board: Board, restored to its original state on return
+        :param player_id: attacker, player on move
+        :param opponent_id: defender, defaults to 1 - player_id
+        :return: (WIN, list of moves of the main line, starting with the attacker's) or (UNKNOWN, None)
+        """
+
+        if opponent_id is None:
+            opponent_id = 1 - player_id
+
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.timeout_ms / 1000
+
+        try:
+            for depth in range(1, self.max_depth + 1):
+                sequence = self.__attack(board, depth, player_id, opponent_id)
+                if sequence is not None:
+                    return self.WIN, sequence
+        except self.BudgetExceeded:
+            logging.debug("solver budget exceeded after {} nodes".format(self.nodes))
+
+        return self.UNKNOWN, None
+
+    def __attack(self, board, depth, attacker, defender):
+        """
+        OR node, one threat of the attacker has to win against every defence.
+        :return: winning main line, None if not found
+        """
+
+        self.nodes += 1
+        if self.nodes > self.max_nodes or time.perf_counter() > self.deadline:
+            raise self.BudgetExceeded
+
+        wins = self.winning_cells(board, attacker, self.__nearby(board, attacker, 1))
+        if len(wins) > 0:
+            return [wins[0]]
+
+        defender_wins = self.winning_cells(board, defender, self.__nearby(board, defender, 1))
+        if len(defender_wins) > 1 or depth == 0:
+            return None
+
+        if len(defender_wins) == 1:
+            moves = defender_wins  # the block has to be a threat itself
+        else:
+            moves = self.threat_moves(board, attacker)
+
+        # replies of the defender with a four of its own, these answer any three
+        counter_fours = [cell for cell, stones in self.__line_strengths(board, defender, self.radius)
+                         if stones >= board.num_to_win - 2]
+
+        for move in moves:
+            board.place(move, attacker)
+            try:
+                defences = self.defences(board, move, attacker, defender, counter_fours)
+                sequence = None
+                if defences is not None:
+                    sequence = self.__defend(board, depth, defences, attacker, defender)
+            finally:
+                board.undo()
+
+            if sequence is not None:
+                return [move] + sequence
+
+        return None
+
+    def __defend(self, board, depth, defences, attacker, defender):
+        """
+        AND node, every defence has to lose.
+        :return: main line after the threat, None if a defence holds
+        """
+
+        if len(defences) == 0:
+            # more completion cells than the defender can block
+            wins = self.winning_cells(board, attacker, self.__nearby(board, attacker, 1))
+            return [wins[0], wins[1]]
+
+        main_line = None
+        for defence in defences:
+            board.place(defence, defender)
+            try:
+                sequence = self.__attack(board, depth - 1, attacker, defender)
+            finally:
+                board.undo()
+            if sequence is None:
+                return None
+            if main_line is None:
+                main_line = [defence] + sequence
+
+        return main_line
+
+    def threat_moves(self, board, attacker):
+        """
+        Cells where the attacker may make a four or a three, fours first.
+        :return: list of position tuples
+        """
+
+        n = board.num_to_win
+        strengths = [(stones, cell) for cell, stones in self.__line_strengths(board, attacker, self.radius)
+                     if stones >= n - 3]
+        strengths.sort(key=lambda s: (-s[0], s[1]))
+
+        return [cell for _, cell in strengths]
+
+    def defences(self, board, move, attacker, defender, counter_fours=()):
+        """
+        Defender replies to a move of the attacker.
+        :param move: the attacker's last move, already placed
+        :param counter_fours: cells where the defender makes a four, valid replies to a three
+        :return: list of replies, empty if the threat can not be stopped, None if the move is not a threat
+        """
+
+        if len(self.winning_cells(board, defender, self.__nearby(board, defender, 1))) > 0:
+            return None  # the defender completes a line first
+
+        n = board.num_to_win
+        windows = self.windows(board, move, attacker)
+
+        wins = {empty[0] for stones, empty in windows if stones == n - 1}
+        if len(wins) > 1:
+            return []
+        if len(wins) == 1:
+            return list(wins)
+
+        # three: a cell where the attacker makes two completion cells, defended on those cells
+        replies = set()
+        for cell in {cell for stones, empty in windows if stones == n - 2 for cell in empty}:
+            board.place(cell, attacker)
+            try:
+                four_wins = {empty[0] for stones, empty in self.windows(board, cell, attacker) if stones == n - 1}
+            finally:
+                board.undo()
+            if len(four_wins) > 1:
+                replies.add(cell)
+                replies.update(four_wins)
+
+        if len(replies) == 0:
+            return None
+
+        replies.update(cell for cell in counter_fours if not board.is_occupied(cell))
+
+        return sorted(replies)
+
+    def windows(self, board, pos, player_id):
+        """
+        Lines of num_to_win cells through a cell, that contain no stone of other players.
+        :param pos: cell, the player's stone or empty
+        :return: list of (number of the player's stones, list of empty cells) for each window
+        """
+
+        n = board.num_to_win
+        width, height = board.size
+        windows = []
+        for dx, dy in Board.DIRECTIONS:
+            line = []
+            for k in range(1 - n, n):
+                cell = (pos[0] + k * dx, pos[1] + k * dy)
+                if not (0 <= cell[0] < width and 0 <= cell[1] < height):
+                    line.append(None)
+                elif not board.is_occupied(cell):
+                    line.append((cell, False))
+                elif board.get_player_id(cell) == player_id:
+                    line.append((cell, True))
+                else:
+                    line.append(None)
+
+            for start in range(n):
+                window = line[start:start + n]
+                if None in window:
+                    continue
+                empty = [cell for cell, own in window if not own]
+                windows.append((n - len(empty), empty))
+
+        return windows
+
+    def __line_strengths(self, board, player_id, radius):
+        """
+        Most stones of the player in a window through each empty cell near its stones.
+        :return: list of (cell, number of stones) pairs
+        """
+
+        strengths = []
+        for cell in self.__nearby(board, player_id, radius):
+            windows = self.windows(board, cell, player_id)
+            if len(windows) > 0:
+                strengths.append((cell, max(stones for stones, _ in windows)))
+
+        return strengths
+
+    def winning_cells(self, board, player_id, cells):
+        """
+        Empty cells completing a line of num_to_win for the player, looked up in the board's run-length tables.
+        :param cells: cells to check
+        :return: sorted list of position tuples
+        """
+
+        return sorted(cell for cell in cells
+                      if not board.is_occupied(cell) and max(board.potential_runs(cell, player_id)) >= board.num_to_win)
+
+    def __nearby(self, board, player_id, radius):
+        """
+        Empty cells at most radius away from a stone of the player.
+        """
+
+        width, height = board.size
+        cells = set()
+        for (x, y), owner in board.moves:
+            if owner != player_id:
+                continue
+            for cx in range(max(x - radius, 0), min(x + radius + 1, width)):
+                for cy in range(max(y - radius, 0), min(y + radius + 1, height)):
+                    if not board.is_occupied((cx, cy)):
+                        cells.add((cx, cy))
+
+        return sorted(cells)
+
+
+def annotate_game(shape, num_to_win, moves, solver=None):
+    """
+    Replays a finished game and searches a forced win for the player on move before every move.
+    :param shape: board size value-pair, tuple
+    :param num_to_win: number of moves in a row to win
+    :param moves: list of ((x, y), player_id) moves
+    :param solver: Solver to use, a default one if None
+    :return: list of (move number, player_id, winning main line) for positions with a forced win
+    """
+
+    if solver is None:
+        solver = Solver()
+
+    board = Board(shape, num_to_win)
+    annotations = []
+    for number, (pos, player_id) in enumerate(moves):
+        opponent_id = next((owner for _, owner in moves if owner != player_id), 1 - player_id)
+        result, sequence = solver.solve(board, player_id, opponent_id)
+        if result == Solver.WIN:
+            annotations.append((number, player_id, sequence))
+        board.place(pos, player_id)
+
+    return annotations
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared LRU caches of pygame fonts and rendered text surfaces
+"""
+
+import collections
+import pygame
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        """
+        :param max_size: number of items kept, the least recently used one is dropped first
+        """
+
+        self.max_size = max_size
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """
+        :param key: hashable key
+        :param factory: function making the item if it is not cached
+        :return: cached or new item
+        """
+
+        try:
+            item = self.items[key]
+        except KeyError:
+            self.misses += 1
+            item = factory()
+            self.items[key] = item
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+            return item
+
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        self.items.clear()
+
+
+class TextCache:
+    def __init__(self, max_fonts=32, max_surfaces=512):
+        """
+        Surfaces returned by render are shared, they must not be drawn on.
+        :param max_fonts: number of cached Font objects
+        :param max_surfaces: number of cached rendered texts
+        """
+
+        self.fonts = LRUCache(max_fonts)
+        self.surfaces = LRUCache(max_surfaces)
+
+    def font(self, name, size):
+        """
+        :param name: system font name, the default font if None
+        :param size: font size
+        :return: pygame.font.Font
+        """
+
+        return self.fonts.get((name, size), lambda: pygame.font.SysFont(name, size))
+
+    def render(self, text, size, color, font=None, antialias=True):
+        """
+        :param text: text to render
+        :param size: font size
+        :param color: text color, tuple or list
+        :param font: system font name, the default font if None
+        :param antialias: smooth edges
+        :return: pygame.Surface of the text
+        """
+
+        color = tuple(color)
+        return self.surfaces.get((font, size, text, color, antialias),
+                                 lambda: self.font(font, size).render(text, antialias, color))
+
+    def stats(self):
+        """
+        :return: dict of cache sizes and hit rates
+        """
+
+        return {'fonts': len(self.fonts), 'font_hit_rate': self.fonts.hit_rate(),
+                'surfaces': len(self.surfaces), 'surface_hit_rate': self.surfaces.hit_rate()}
+
+
+TEXT_CACHE = TextCache()  # shared by every text drawn by the game
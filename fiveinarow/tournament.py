@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+Headless engine versus engine games, distributed over worker processes
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from fiveinarow.game_board import Board
+from fiveinarow.engine import Engine
+from fiveinarow.transposition import TranspositionTable
+from fiveinarow.game_record import GameRecordWriter, NO_WINNER
+
+
+def make_engine(settings):
+    """
+    Makes an engine from a settings dict holding Engine keyword arguments and an optional 'tt_memory' in bytes.
+    :param settings: dict
+    :return: Engine
+    """
+
+    settings = dict(settings)
+    tt = TranspositionTable(settings.pop('tt_memory', 16 * 1024 * 1024))
+    return Engine(tt=tt, **settings)
+
+
+def play_game(game):
+    """
+    Plays one game between two engines on a Board, without display and network.
+    :param game: dict with 'game_id', 'numgridx', 'numgridy', 'n_to_win', 'first_player' (0 or 1) and
+        'engines', a pair of engine settings for player 0 and 1
+    :return: result dict: game id, board size, winner id (None for a tie), winning direction, moves and timing
+    """
+
+    board = Board((game['numgridx'], game['numgridy']), game['n_to_win'])
+    engines = [make_engine(settings) for settings in game['engines']]
+
+    player_id = game['first_player']
+    status = None
+    move_times = []
+    start = time.perf_counter()
+    while status is None:
+        move_start = time.perf_counter()
+        move = engines[player_id].best_move(board, player_id, 1 - player_id)
+        move_times.append(round(time.perf_counter() - move_start, 4))
+
+        board.place(move, player_id)
+        status = board.check_board()
+        player_id = 1 - player_id
+
+    (_, last_player), direction = status
+    tie = direction == (0, 0)
+
+    return {'game_id': game['game_id'],
+            'numgridx': game['numgridx'],
+            'numgridy': game['numgridy'],
+            'n_to_win': board.num_to_win,
+            'first_player': game['first_player'],
+            'winner': None if tie else last_player,
+            'direction': None if tie else direction,
+            'moves': [[pos[0], pos[1], owner] for pos, owner in board.moves],
+            'move_times': move_times,
+            'duration': round(time.perf_counter() - start, 4)}
+
+
+def run_tournament(output_file, num_games, engines, numgridx=15, numgridy=15, n_to_win=5, workers=None,
+                   max_pending=None, record_file=None):
+    """
+    Plays games on a process pool and appends every result to a JSONL file as soon as it is finished.
+    Player 0 and 1 take turns in starting the games.
+    :param output_file: path of the JSONL file, appended to
+    :param num_games: number of games
+    :param engines: pair of engine settings for player 0 and 1, see make_engine
+    :param numgridx: board width
+    :param numgridy: board height
+    :param n_to_win: number of moves in a row to win
+    :param workers: number of worker processes, number of CPUs if None
+    :param max_pending: number of games submitted ahead, limits memory for long runs, 4 per worker if None
+    :param record_file: binary game record file the games are also appended to, see game_record
+    :return: dict of win counts: {0: ..., 1: ..., None: ...}
+    """
+
+    games = ({'game_id': game_id, 'numgridx': numgridx, 'numgridy': numgridy, 'n_to_win': n_to_win,
+              'first_player': game_id % 2, 'engines': engines} for game_id in range(num_games))
+
+    wins = {0: 0, 1: 0, None: 0}
+    recorder = GameRecordWriter(record_file) if record_file is not None else None
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(output_file, 'a') as out:
+        if max_pending is None:
+            max_pending = 4 * (workers or os.cpu_count() or 1)
+
+        pending = set()
+        for game in games:
+            pending.add(executor.submit(play_game, game))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _write_results(done, out, wins, recorder)
+
+        done, _ = wait(pending)
+        _write_results(done, out, wins, recorder)
+
+    if recorder is not None:
+        recorder.close()
+
+    logging.info("tournament finished: {}".format(wins))
+    return wins
+
+
+def _write_results(futures, out, wins, recorder):
+    for future in futures:
+        result = future.result()
+        wins[result['winner']] += 1
+        out.write(json.dumps(result) + '\n')
+        if recorder is not None:
+            recorder.write_game((result['numgridx'], result['numgridy']), result['n_to_win'],
+                                NO_WINNER if result['winner'] is None else result['winner'],
+                                (((x, y), owner) for x, y, owner in result['moves']))
+    out.flush()
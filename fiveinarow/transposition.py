@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fixed size transposition table for positions identified by their Zobrist hash
+"""
+
+import numpy as np
+
+
+class TranspositionTable:
+    EXACT = 0
+    LOWER = 1  # value is a lower bound, search failed high
+    UPPER = 2  # value is an upper bound, search failed low
+
+    DEPTH_PREFERRED = 0
+    ALWAYS_REPLACE = 1
+
+    NO_MOVE = -1
+    EMPTY_DEPTH = -1
+
+    # bytes used by one entry: key, value, move, depth, flag
+    ENTRY_SIZE = 8 + 8 + 2 + 1 + 1
+
+    def __init__(self, memory_bytes=16 * 1024 * 1024):
+        """
+        Allocates all entries up front, the table never grows.
+        Every bucket has a depth-preferred slot, kept while deeper searched entries arrive, and an always-replace slot.
+        :param memory_bytes: memory budget of the table
+        """
+
+        self.num_buckets = max(1, memory_bytes // (2 * self.ENTRY_SIZE))
+
+        self.keys = np.zeros((self.num_buckets, 2), dtype=np.uint64)
+        self.values = np.zeros((self.num_buckets, 2), dtype=np.int64)
+        self.moves = np.full((self.num_buckets, 2), self.NO_MOVE, dtype=np.int16)
+        self.depths = np.full((self.num_buckets, 2), self.EMPTY_DEPTH, dtype=np.int8)
+        self.flags = np.zeros((self.num_buckets, 2), dtype=np.int8)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        :param key: 64 bit Zobrist hash
+        :return: (depth, value, flag, move) tuple, None if the position is not stored
+        """
+
+        bucket = key % self.num_buckets
+        for slot in (self.DEPTH_PREFERRED, self.ALWAYS_REPLACE):
+            if self.depths[bucket, slot] != self.EMPTY_DEPTH and int(self.keys[bucket, slot]) == key:
+                self.hits += 1
+                return (int(self.depths[bucket, slot]), int(self.values[bucket, slot]), int(self.flags[bucket, slot]),
+                        int(self.moves[bucket, slot]))
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag, move=NO_MOVE):
+        """
+        Stores a search result. It goes to the depth-preferred slot if that holds the same position or a shallower
+        search, otherwise to the always-replace slot.
+        :param key: 64 bit Zobrist hash
+        :param depth: remaining search depth of the result
+        :param value: search value
+        :param flag: EXACT, LOWER or UPPER
+        :param move: best move found, NO_MOVE if there is none
+        :return: None
+        """
+
+        bucket = key % self.num_buckets
+        if int(self.keys[bucket, self.DEPTH_PREFERRED]) == key or depth >= self.depths[bucket, self.DEPTH_PREFERRED]:
+            slot = self.DEPTH_PREFERRED
+        else:
+            slot = self.ALWAYS_REPLACE
+
+        self.keys[bucket, slot] = key
+        self.values[bucket, slot] = value
+        self.moves[bucket, slot] = move
+        self.depths[bucket, slot] = depth
+        self.flags[bucket, slot] = flag
+        self.stores += 1
+
+    def clear(self):
+        self.depths.fill(self.EMPTY_DEPTH)
+        self.moves.fill(self.NO_MOVE)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes > 0 else 0.0
+
+    def memory_usage(self):
+        """
+        :return: bytes allocated by the entries
+        """
+
+        return sum(a.nbytes for a in (self.keys, self.values, self.moves, self.depths, self.flags))
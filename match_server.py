@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Five in a row match server, pairs connecting clients and hosts their games
+"""
+
+import json
+import logging
+from fiveinarow import setup_logging
+from fiveinarow.match_server import MatchServer
+from fiveinarow.metrics import METRICS, start_export
+
+setup_logging()
+
+conf = {'numgridx': 15, 'numgridy': 15, 'n_to_win': 5, 'port': 14522, 'rsakeybits': 1024}
+try:
+    with open('config.txt', 'r') as conf_file:
+        conf.update(json.load(conf_file))
+except (FileNotFoundError, json.JSONDecodeError):
+    pass
+
+logging.info("Starting match server instance")
+server = MatchServer(conf['port'], conf, rsa_key_bits=conf['rsakeybits'])
+start_export(conf)
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+server.close()
+if conf.get('metrics_file'):
+    METRICS.dump(conf['metrics_file'])
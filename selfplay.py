@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Five in a row headless engine versus engine tournament
+"""
+
+import argparse
+import logging
+from fiveinarow import setup_logging
+from fiveinarow.tournament import run_tournament
+
+parser = argparse.ArgumentParser(description="Plays engine versus engine games without display and network.")
+parser.add_argument('--games', type=int, default=100, help="number of games")
+parser.add_argument('--workers', type=int, default=None, help="worker processes (default: number of CPUs)")
+parser.add_argument('--numgridx', type=int, default=15, help="board width")
+parser.add_argument('--numgridy', type=int, default=15, help="board height")
+parser.add_argument('--n-to-win', type=int, default=5, help="number of moves in a row to win")
+parser.add_argument('--time-ms', type=int, nargs='+', default=[200], help="thinking time per move, one or two values")
+parser.add_argument('--max-depth', type=int, nargs='+', default=[8], help="search depth, one or two values")
+parser.add_argument('--output', default='selfplay.jsonl', help="JSONL file the results are appended to")
+parser.add_argument('--record', default=None, help="binary game record file the games are appended to")
+args = parser.parse_args()
+
+setup_logging(logging.INFO)
+
+engines = [{'time_budget_ms': args.time_ms[min(i, len(args.time_ms) - 1)],
+            'max_depth': args.max_depth[min(i, len(args.max_depth) - 1)]} for i in range(2)]
+
+logging.info("Starting {} games, engines: {}".format(args.games, engines))
+run_tournament(args.output, args.games, engines, numgridx=args.numgridx, numgridy=args.numgridy,
+               n_to_win=args.n_to_win, workers=args.workers, record_file=args.record)
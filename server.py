@@ -6,9 +6,28 @@ Five in a row game server
 """
 
 import logging
-from fiveinarow.fiveinarow import FiveInaRow
+import sys
+from fiveinarow import setup_logging
+
+setup_logging()
+
+bot = '--bot' in sys.argv  # the server's player is the engine
+headless = '--headless' in sys.argv  # no window and sound, the engine plays
 
 logging.info("Starting server instance")
-fir = FiveInaRow(FiveInaRow.SERVER)
-fir.start()
-fir.start_game()
\ No newline at end of file
+if headless:
+    from fiveinarow.game_session import GameSession
+
+    session = GameSession(GameSession.SERVER, bot=True)
+    session.set_player("server's player")
+    try:
+        session.run()
+    except KeyboardInterrupt:
+        pass
+    session.close()
+else:
+    from fiveinarow.fiveinarow import FiveInaRow
+
+    fir = FiveInaRow(FiveInaRow.SERVER, bot=bot)
+    fir.start()
+    fir.start_game()
@@ -8,6 +8,835 @@ Five in a row module tests
 from nose.tools import *
 from fiveinarow.fiveinarow import *
 from fiveinarow.game_board import *
+from fiveinarow.pg_grid import Grid
 from fiveinarow.communicator import *
+from fiveinarow.ll_communictor import LLComm
+from fiveinarow.async_communicator import AsyncCommunicator
+from fiveinarow.batch import check_boards, stack_boards
+from fiveinarow.engine import Engine, EnginePlayer
+from fiveinarow.evaluator import Evaluator
+from fiveinarow.parallel_engine import ParallelEngine
+from fiveinarow.transposition import TranspositionTable
+from fiveinarow.solver import Solver
+from fiveinarow.game_record import GameRecordWriter, GameRecordReader, NO_WINNER
+from fiveinarow.tournament import run_tournament
+from fiveinarow import codec
+from fiveinarow.keypool import KeyPool
+from fiveinarow.session_ticket import TicketIssuer, derive_key, new_session_id
+from fiveinarow import ciphers
+from fiveinarow.text_cache import LRUCache, TextCache
+from fiveinarow.frame_scheduler import FrameScheduler, NETWORK_EVENT
+from fiveinarow.frame_profiler import FrameProfiler
+from fiveinarow.game_session import GameSession
+from fiveinarow.match_server import MatchServer
+from fiveinarow.metrics import Metrics, METRICS
+from cryptography.fernet import Fernet
+import numpy as np
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zmq
 
-# do some tests
\ No newline at end of file
+
+def play(board, moves, first_player=0):
+    """
+    Places moves alternately for the two players, returns the last board status.
+    """
+    status = None
+    for i, pos in enumerate(moves):
+        board.place(pos, (first_player + i) % 2)
+        status = board.check_board()
+    return status
+
+
+def free_port():
+    """
+    TCP port nothing listens on, for the tests binding sockets.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def close_llcomm(llcomm):
+    llcomm.socket.close(linger=0)
+    llcomm.context.term()
+
+
+def test_board_storages_agree():
+    moves = [(3, 3), (0, 0), (4, 4), (0, 1), (5, 5), (0, 2), (6, 6), (9, 0), (7, 7)]
+    runs = []
+    for storage in [Board.NUMPY, Board.BITBOARD]:
+        board = Board((10, 8), 5, storage=storage)
+        assert_equal(play(board, moves), (((7, 7), 0), (1, 1)))
+        assert_equal(board.get_player_id((0, 1)), 1)
+        assert_true(board.is_occupied((9, 0)))
+        assert_false(board.is_occupied((9, 7)))
+        assert_equal(board.get_occupied(), set(moves))
+
+        cells = board.to_array()
+        assert_equal(cells.dtype, np.int8)
+        assert_equal(cells[3, 3], 0)
+        assert_equal(cells[0, 2], 1)
+        assert_equal(cells[1, 1], Board.EMPTY)
+
+        runs.append([board.potential_runs(pos, player_id) for pos in [(2, 2), (0, 3), (8, 1)] for player_id in [0, 1]])
+        board.undo()
+        assert_equal(board.get_occupied(), set(moves[:-1]))
+        assert_equal(board.check_board(), None)
+
+    assert_equal(runs[0], runs[1])
+
+
+def test_board_no_win_across_opponent():
+    for storage in [Board.NUMPY, Board.BITBOARD]:
+        board = Board((10, 10), 5, storage=storage)
+        board.place((2, 0), 1)
+        assert_is_none(play(board, [(0, 0), (9, 9), (1, 0), (9, 8), (3, 0), (9, 7), (4, 0)]))
+
+
+def test_board_full():
+    for storage in [Board.NUMPY, Board.BITBOARD]:
+        board = Board((2, 2), 5, storage=storage)
+        status = play(board, [(0, 0), (1, 0), (1, 1), (0, 1)])
+        assert_equal(status[1], (0, 0))
+        assert_raises(Board.OccupiedException, board.place, (0, 0), 1)
+        for pos in [(0, 2), (2, 0), (-1, 0), (0.0, 1), (0, 1, 2), None]:
+            assert_raises(IndexError, board.place, pos, 1)
+        assert_equal(board.num_moves, 4)
+
+
+def test_session_drops_moves_off_the_board():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        session = GameSession(GameSession.SERVER, config_file_name=os.path.join(cache_dir, 'config.txt'))
+        session.set_player('server')
+        session.other_player = Player('client', id=1, turn=True)
+        session.board = Board((7, 7), 4, storage=Board.BITBOARD)
+        session.game_is_on = True
+        assert_false(session.process_move((0, 7), 1))
+        assert_false(session.process_move('(0, 0)', 1))
+        assert_equal(session.board.num_moves, 0)
+        assert_true(session.other_player.turn)
+
+
+def test_board_undo():
+    for storage in [Board.NUMPY, Board.BITBOARD]:
+        board = Board((9, 9), 4, storage=storage)
+        play(board, [(0, 0), (5, 5), (1, 1), (5, 6), (2, 2)])
+        assert_equal(board.undo(), ((2, 2), 0))
+        assert_equal(board.last_move, ((5, 6), 1))
+        assert_false(board.is_occupied((2, 2)))
+
+        assert_is_none(play(board, [(3, 3)]))
+        assert_equal(play(board, [(5, 7), (8, 8), (5, 4)], first_player=1), (((5, 4), 1), (0, 1)))
+        board.undo()
+        assert_is_none(play(board, [(5, 3)], first_player=1))
+        assert_equal(play(board, [(2, 2)]), (((2, 2), 0), (1, 1)))
+
+        while board.num_moves > 0:
+            board.undo()
+        assert_is_none(board.check_board())
+        assert_is_none(Board((9, 9), 4, storage=storage).check_board())
+
+
+def test_batch_check_boards():
+    won = Board((15, 15), 5)
+    play(won, [(10, 2), (0, 0), (9, 3), (0, 1), (8, 4), (0, 2), (7, 5), (0, 3), (6, 6)])
+    open_game = Board((15, 15), 5)
+    play(open_game, [(7, 7), (7, 8), (8, 8)])
+    winner, direction, cell = check_boards(stack_boards([open_game, won]), 5)
+
+    assert_equal(list(winner), [Board.EMPTY, 0])
+    assert_equal(tuple(direction[1]), (-1, 1))
+    assert_equal(tuple(cell[1]), (10, 2))
+    assert_equal(tuple(cell[0]), (-1, -1))
+
+
+def test_engine_wins_and_blocks():
+    board = Board((15, 15), 5)
+    play(board, [(7, 7), (0, 0), (8, 7), (0, 1), (9, 7), (0, 2), (10, 7)])
+    engine = Engine(time_budget_ms=200)
+    assert_in(engine.best_move(board, 1), [(6, 7), (11, 7)])
+    assert_in(engine.best_move(board, 0), [(6, 7), (11, 7)])
+    assert_equal(len(board.moves), 7)
+
+    # a lower bound from the table that no move reaches leaves only an upper bound, not an exact score
+    board = Board((15, 15), 5)
+    play(board, [(7, 7), (8, 8)])
+    engine = Engine(time_budget_ms=None, max_depth=1)
+    engine.deadline = float('inf')
+    bound = Engine.WIN_SCORE // 2
+    engine.tt.store(board.zobrist, 1, bound, TranspositionTable.LOWER)
+    assert_equal(engine._Engine__negamax(board, 1, -Engine.WIN_SCORE - 1, Engine.WIN_SCORE + 1, 0, 1), bound)
+    assert_equal(engine.tt.probe(board.zobrist)[1:3], (bound, TranspositionTable.UPPER))
+
+
+def test_evaluator_incremental():
+    board = Board((50, 50), 7, storage=Board.BITBOARD)
+    evaluator = Evaluator(board)
+    play(board, [(10, 10), (20, 20), (11, 11), (20, 21), (12, 12), (20, 22), (13, 13), (20, 23), (14, 14)])
+    assert_equal(evaluator.windows(0)[5], 3)
+    assert_equal(evaluator.threat_cells(0), [])
+
+    board.place((15, 15), 0)
+    assert_equal(sorted(evaluator.threat_cells(0)), [(9, 9), (16, 16)])
+    assert_equal(evaluator.evaluate(0, 1), Evaluator.THREAT_SCORE)
+    assert_equal(evaluator.evaluate(1, 0), -Evaluator.THREAT_SCORE // 2)
+
+    rng = random.Random(3)
+    cells = [(x, y) for x in range(5, 15) for y in range(18, 28) if not board.is_occupied((x, y))]
+    for pos in rng.sample(cells, 40):
+        board.place(pos, rng.randint(0, 1))
+    for _ in range(25):
+        board.undo()
+    fresh = Evaluator(board)
+    assert_equal((evaluator.scores, evaluator.histograms, evaluator.threats),
+                 (fresh.scores, fresh.histograms, fresh.threats))
+
+    board.clear()
+    assert_equal(evaluator.evaluate(0, 1), 0)
+    evaluator.detach()
+    fresh.detach()
+    assert_equal(board.listeners, [])
+
+
+def test_parallel_engine_deterministic():
+    board = Board((15, 15), 5)
+    play(board, [(7, 7), (8, 8), (8, 6), (6, 8), (7, 8), (7, 9), (7, 6), (9, 7), (7, 5), (7, 4), (10, 6), (9, 6)])
+    results = [Engine(time_budget_ms=None, max_depth=3).best_move(board, 0)]
+    for workers in [1, 2, 3]:
+        engine = ParallelEngine(workers=workers, time_budget_ms=None, max_depth=3)
+        try:
+            for _ in range(2):  # the second search starts with the workers' tables of the first one cleared
+                results.append(engine.best_move(board, 0))
+        finally:
+            engine.close()
+    assert_equal(len(set(results)), 1)
+    assert_equal(len(board.moves), 12)
+
+    player = EnginePlayer('bot', 0, True, time_budget_ms=200, workers=2)
+    player.choose_move(board)
+    executor = player.engine.executor
+    player.close()
+    assert_is_none(player.engine)
+    assert_raises(RuntimeError, executor.submit, abs, 0)
+
+    board = Board((15, 15), 5)
+    play(board, [(7, 7), (0, 0), (8, 7), (0, 1), (9, 7), (0, 2), (10, 7)])
+    engine = ParallelEngine(workers=2, time_budget_ms=2000)
+    try:
+        assert_in(engine.best_move(board, 1), [(6, 7), (11, 7)])
+    finally:
+        engine.close()
+
+
+def test_zobrist_transposition():
+    first = Board((15, 15), 5)
+    play(first, [(7, 7), (8, 8), (6, 6), (9, 9)])
+    second = Board((15, 15), 5, storage=Board.BITBOARD)
+    play(second, [(6, 6), (9, 9), (7, 7), (8, 8)])
+    assert_equal(first.zobrist, second.zobrist)
+
+    first.undo()
+    assert_not_equal(first.zobrist, second.zobrist)
+    first.clear()
+    assert_equal(first.zobrist, 0)
+
+
+def test_transposition_table_replacement():
+    tt = TranspositionTable(memory_bytes=2 * TranspositionTable.ENTRY_SIZE)
+    assert_is_none(tt.probe(12345))
+    tt.store(12345, 4, 10, TranspositionTable.EXACT, 7)
+    tt.store(999, 2, -3, TranspositionTable.UPPER)
+    tt.store(555, 1, 8, TranspositionTable.LOWER)
+
+    assert_equal(tt.probe(12345), (4, 10, TranspositionTable.EXACT, 7))
+    assert_is_none(tt.probe(999))
+    assert_equal(tt.probe(555), (1, 8, TranspositionTable.LOWER, TranspositionTable.NO_MOVE))
+    assert_equal((tt.hits, tt.misses), (2, 2))
+
+
+def test_solver_double_three():
+    board = Board((15, 15), 5)
+    play(board, [(6, 7), (0, 0), (7, 7), (0, 14), (8, 8), (14, 0), (8, 9), (14, 14)])
+    result, sequence = Solver(timeout_ms=5000).solve(board, 0)
+    assert_equal(result, Solver.WIN)
+    assert_equal(sequence[0], (8, 7))
+
+    status = play(board, sequence)
+    assert_equal(status[0][1], 0)
+    assert_equal(Solver(timeout_ms=5000).solve(Board((15, 15), 5), 0), (Solver.UNKNOWN, None))
+
+
+def test_game_record_roundtrip():
+    path = os.path.join(tempfile.mkdtemp(), 'games.fir')
+    moves = [((7, 7), 0), ((0, 0), 1), ((8, 7), 0), ((49, 49), 1)]
+    with GameRecordWriter(path) as writer:
+        writer.write_game((50, 50), 5, NO_WINNER, moves)
+        writer.start_game((15, 10), 4)
+        writer.record_move((14, 9), 1)
+        writer.end_game(1)
+
+    with GameRecordReader(path) as reader:
+        assert_equal(len(reader), 2)
+        records = list(reader)
+        assert_equal(list(records[0].iter_moves()), moves)
+        assert_equal(records[0].winner, NO_WINNER)
+        assert_equal((reader[1].size, reader[1].num_to_win, reader[1].winner), ((15, 10), 4, 1))
+
+        board = records[0].replay(num_moves=3)
+        assert_equal(board.moves, moves[:3])
+        assert_true((records[0].to_array(3) == board.to_array()).all())
+
+    with GameRecordWriter(path) as writer:
+        assert_raises(ValueError, writer.write_game, (15, 15), 5, 0, [((130, 5), 0)])
+        assert_raises(ValueError, writer.write_game, (15, 15), 5, 0, [((5, 5), 2)])
+        assert_raises(ValueError, writer.write_game, (200, 15), 5, 0, [])
+        assert_raises(ValueError, writer.write_game, (15, 15), 5, 2, [])
+    assert_equal(len(GameRecordReader(path)), 2)
+
+
+def test_tournament():
+    out_dir = tempfile.mkdtemp()
+    results_path = os.path.join(out_dir, 'results.jsonl')
+    records_path = os.path.join(out_dir, 'games.fir')
+    engine = {'time_budget_ms': None, 'max_depth': 2, 'tt_memory': 1024 * 1024}
+    wins = run_tournament(results_path, 2, [engine, engine], numgridx=9, numgridy=9, n_to_win=4, workers=1,
+                          record_file=records_path)
+    assert_equal(sum(wins.values()), 2)
+
+    with open(results_path) as results_file:
+        results = sorted((json.loads(line) for line in results_file), key=lambda result: result['game_id'])
+    assert_equal([result['first_player'] for result in results], [0, 1])
+    assert_equal(sum(1 for result in results if result['winner'] is None), wins[None])
+
+    with GameRecordReader(records_path) as reader:
+        assert_equal(len(reader), 2)
+        recorded = {tuple((x, y, owner) for (x, y), owner in record.iter_moves()): record for record in reader}
+        for result in results:
+            record = recorded[tuple(tuple(move) for move in result['moves'])]
+            assert_equal((record.size, record.num_to_win), ((9, 9), 4))
+            assert_equal(record.winner, NO_WINNER if result['winner'] is None else result['winner'])
+            assert_is_not_none(record.replay().check_board())
+
+
+def test_codec_roundtrip():
+    assert_equal(len(codec.encode((14, 3), 'move')), 7)
+    assert_equal(codec.decode(codec.encode((14, 3), 'move')), ((14, 3), 'move'))
+    assert_equal(codec.decode(codec.encode('new_game', 'partner_request')), ('new_game', 'partner_request'))
+    assert_equal(codec.decode(codec.encode(b'x1', 'echo_ser')), (b'x1', 'echo_ser'))
+
+    conf = {'numgridx': 19, 'numgridy': 15, 'n_to_win': 5, 'port': 14522}
+    assert_equal(codec.decode(codec.encode(conf, 'server_config'))[0], {'numgridx': 19, 'numgridy': 15, 'n_to_win': 5})
+
+    player = Player('Játékos', id=1, turn=True)
+    player.wins()
+    data, header = codec.decode(codec.encode(player, 'my_player'))
+    assert_equal((data.name, data.id, data.turn, data.points), ('Játékos', 1, True, 1))
+
+    pubkey = rsa.PublicKey(2 ** 1023 + 1, 65537)
+    assert_equal(codec.decode(codec.encode((pubkey, [2, 1]), 'pubkey'))[0], (pubkey, [2, 1]))
+    assert_raises(codec.CodecError, codec.decode, b'\x01\x08\x00\x01')
+
+    payload = codec.encode(conf, 'server_config', timestamp=1234.5)
+    assert_equal(codec.decode(payload)[0], {'numgridx': 19, 'numgridy': 15, 'n_to_win': 5})
+    assert_equal(codec.timestamp(payload), 1234.5)
+    assert_is_none(codec.timestamp(codec.encode((14, 3), 'move')))
+
+
+def test_metrics():
+    metrics = Metrics()
+    for value in [0.001, 0.002, 0.003, 0.2]:
+        metrics.observe('latency_seconds', value, header='move')
+    metrics.inc('messages_total', header='move')
+    metrics.inc('messages_total', 2, header='move')
+
+    histogram = metrics.histogram('latency_seconds', header='move')
+    assert_equal(histogram.count, 4)
+    assert_true(0.001 <= histogram.quantile(0.5) <= 0.0025)
+    assert_equal(metrics.counter('messages_total', header='move'), 3)
+
+    text = metrics.render()
+    assert_in('messages_total{header="move"} 3', text)
+    assert_in('latency_seconds_bucket{header="move",le="+Inf"} 4', text)
+    assert_in('latency_seconds_count{header="move"} 4', text)
+
+    port = free_port()
+    server = Communicator(Communicator.SERVER, timestamps=True)
+    server.init_connection(port=port, rsa_key_bits=1024)
+    client = Communicator(Communicator.CLIENT, timestamps=True)
+    client.init_connection(port=port, hostname='localhost')
+    try:
+        METRICS.reset()
+        client.encrypted_send((3, 4), header='move')
+        assert_equal(server.encrypted_recv(timeout=3), ((3, 4), 'move'))
+        assert_equal(METRICS.counter('fiveinarow_messages_total', direction='received', header='move'), 1)
+        assert_equal(METRICS.histogram('fiveinarow_latency_seconds', header='move').count, 1)
+        assert_equal(METRICS.histogram('fiveinarow_message_bytes', direction='sent', header='move',
+                                       stage='wire').sum, 15)
+    finally:
+        for comm in [server, client]:
+            close_llcomm(comm.encomm.llcomm)
+
+
+def test_ll_comm_recv_timeout():
+    port = free_port()
+    server = LLComm(LLComm.SERVER, port=port)
+    client = LLComm(LLComm.CLIENT, ip_addr='localhost', port=port)
+    try:
+        start = time.perf_counter()
+        assert_is_none(server.recv(timeout=0.05))
+        assert_true(0.04 <= server.last_wait <= time.perf_counter() - start < 0.5)
+
+        client.send(b'ping', timeout=1)
+        assert_equal(server.recv(timeout=5), b'ping')
+        assert_true(server.last_wait < 5)
+
+        assert_is_none(server.recv())
+        assert_true(server.last_wait < 0.05)
+    finally:
+        close_llcomm(server)
+        close_llcomm(client)
+
+
+def test_async_communicator():
+    async def play_session(server, client):
+        assert_equal(await asyncio.gather(server.init_encryption(timeout=10), client.init_encryption(timeout=10)),
+                     [True, True])
+
+        moves = []
+        unhandled = []
+
+        async def echo(data):
+            await server.encrypted_send(data, header='echo_cli')
+
+        dispatch = asyncio.ensure_future(server.dispatch(
+            {'move': moves.append, 'echo_srv': echo, 'partner_request': lambda data: False},
+            default=lambda data, header: unhandled.append(header)))
+
+        await client.encrypted_send((3, 4), header='move')
+        await client.encomm.send(b'\xff malformed')
+        await client.encrypted_send(None, header='get_player')
+        await client.encrypted_send(b'\x00ping', header='echo_srv')
+        assert_equal(await client.wait_for_header('echo_cli', timeout=5), b'\x00ping')
+        await client.encrypted_send('new_game', header='partner_request')
+        await asyncio.wait_for(dispatch, 5)
+
+        assert_equal(moves, [(3, 4)])
+        assert_equal(unhandled, ['get_player'])
+        assert_equal(await client.encrypted_recv(timeout=0.05), (None, None))
+
+    port = free_port()
+    server = AsyncCommunicator(AsyncCommunicator.SERVER)
+    server.init_connection(port=port, rsa_key_bits=1024)
+    client = AsyncCommunicator(AsyncCommunicator.CLIENT)
+    client.init_connection(port=port, hostname='localhost')
+    try:
+        asyncio.run(play_session(server, client))
+    finally:
+        for comm in [server, client]:
+            comm.encomm.llcomm.socket.close(linger=0)
+
+
+def test_key_pool_cache():
+    cache_dir = tempfile.mkdtemp()
+    pool = KeyPool(1024, size=1, cache_dir=cache_dir)
+    pool.start()
+    deadline = time.time() + 60
+    while len(pool) == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    pool.close()
+    assert_equal(len(os.listdir(cache_dir)), 1)
+    assert_equal(os.stat(os.path.join(cache_dir, os.listdir(cache_dir)[0])).st_mode & 0o777, 0o600)
+
+    pool = KeyPool(1024, size=1, cache_dir=cache_dir)
+    other_pool = KeyPool(1024, size=1, cache_dir=cache_dir)  # another process sharing the cache
+    assert_equal((len(pool), len(other_pool)), (1, 1))
+    pubkey, privkey = pool.get()
+    assert_equal(pool.hits, 1)
+    assert_equal(other_pool.get(generate=False), None)
+    assert_equal((other_pool.hits, len(other_pool)), (0, 0))
+    assert_equal(rsa.decrypt(rsa.encrypt(b'key', pubkey), privkey), b'key')
+    assert_equal(os.listdir(cache_dir), [])
+    assert_equal(len(KeyPool(2048, cache_dir=cache_dir)), 0)
+
+
+def test_session_ticket():
+    issuer = TicketIssuer()
+    session_id, symm_key = new_session_id(), Fernet.generate_key()
+    ticket = issuer.issue(session_id, symm_key)
+    assert_equal(issuer.open(ticket), (session_id, symm_key))
+    assert_equal(issuer.open(ticket), None)  # tickets are single-use
+    assert_equal(TicketIssuer().open(issuer.issue(session_id, symm_key)), None)
+    assert_equal(issuer.open(b'garbage'), None)
+    assert_not_equal(derive_key(symm_key, b'a' * 32, b'c' * 32), derive_key(symm_key, b'b' * 32, b'c' * 32))
+    assert_not_equal(derive_key(symm_key, b'a' * 32, b'c' * 32), derive_key(symm_key, b'a' * 32, b'd' * 32))
+
+    state = {'numgridx': 15, 'numgridy': 10, 'n_to_win': 5, 'player_id': 1, 'on_move': 0, 'game_is_on': True,
+             'points': (2, 3), 'moves': [((7, 7), 0), ((14, 9), 1)]}
+    assert_equal(codec.decode(codec.encode(state, 'resume_ok')), (state, 'resume_ok'))
+    assert_equal(codec.decode(codec.encode((ticket, b'r' * 32), 'resume')), ((ticket, b'r' * 32), 'resume'))
+
+
+def test_ciphers():
+    key = ciphers.generate_key()
+    for suite in ciphers.SUITES:
+        server = ciphers.make_cipher(suite, key, Communicator.SERVER)
+        client = ciphers.make_cipher(suite, key, Communicator.CLIENT)
+        messages = [server.encrypt(b'move %d' % i) for i in range(3)]
+        assert_equal([client.decrypt(message) for message in messages], [b'move 0', b'move 1', b'move 2'])
+        assert_raises(ciphers.InvalidMessage, client.decrypt, b'x' * 40)
+
+    server = ciphers.make_cipher(ciphers.CHACHA20_POLY1305, key, Communicator.SERVER)
+    client = ciphers.make_cipher(ciphers.CHACHA20_POLY1305, key, Communicator.CLIENT)
+    message = client.encrypt(b'(7, 7)')
+    assert_equal(len(message), 6 + 28)
+    assert_equal(server.decrypt(message), b'(7, 7)')
+    assert_raises(ciphers.InvalidMessage, server.decrypt, message)  # replay
+    assert_raises(ciphers.InvalidMessage, client.decrypt, client.encrypt(b'own'))  # other direction's nonce
+
+    # a second connection with the same key uses other nonces, and its messages are not taken by the first one
+    other_client = ciphers.make_cipher(ciphers.CHACHA20_POLY1305, key, Communicator.CLIENT)
+    other_message = other_client.encrypt(b'(7, 7)')
+    assert_not_equal(other_message[:12], message[:12])
+    assert_raises(ciphers.InvalidMessage, server.decrypt, other_message)
+
+    assert_equal(ciphers.choose_suite([ciphers.FERNET], ciphers.SUITES), ciphers.FERNET)
+    assert_equal(ciphers.choose_suite([], ciphers.SUITES), ciphers.FERNET)
+    assert_equal(ciphers.choose_suite([1, 2], ciphers.SUITES), ciphers.CHACHA20_POLY1305)
+
+
+def test_grid_incremental_rendering():
+    conf = {'numgridx': 15, 'numgridy': 15, 'n_to_win': 5, 'gridcolor': (42, 42, 42), 'bgcolor': (211, 211, 211),
+            'bold_grid': False, 'player_colors': [(255, 0, 0), (0, 0, 0)]}
+    grid = Grid(screen=pygame.Surface((640, 640)), clock=None, conf=conf)
+    assert_equal(len(grid.draw_board()), 1)
+    assert_equal(grid.draw_board(), [])
+
+    play(grid.board, [(7, 7), (8, 8)])
+    rects = grid.draw_board()
+    assert_equal(len(rects), 2)
+    assert_true(all(rect.w < 640 / 15 for rect in rects))
+    incremental = pygame.image.tostring(grid.screen, 'RGB')
+    grid.render()
+    assert_equal(pygame.image.tostring(grid.screen, 'RGB'), incremental)
+
+    grid.board.undo()
+    grid.board.place((9, 9), 1)
+    assert_equal(len(grid.draw_board()), 1)  # changed history, drawn again
+    grid.board.clear()
+    grid.draw_board()
+    assert_equal(grid.drawn_moves, [])
+
+
+def test_grid_win_line():
+    conf = {'numgridx': 9, 'numgridy': 9, 'n_to_win': 4, 'gridcolor': (42, 42, 42), 'bgcolor': (211, 211, 211),
+            'bold_grid': False, 'player_colors': [(255, 0, 0), (0, 0, 0)], 'textcolor': (0, 0, 255)}
+    grid = Grid(screen=pygame.Surface((640, 640)), clock=None, conf=conf)
+    status = play(grid.board, [(5, 5), (0, 0), (3, 3), (0, 1), (2, 2), (0, 2), (4, 4)])
+    grid.draw_board()
+    assert_equal(grid.draw_win_line(), [])
+
+    grid.start_win_line(status)
+    start, end, start_time = grid.win_line
+    assert_less(start, end)
+    grid.win_line = (start, end, start_time - Grid.WIN_LINE_TIME)
+    rect = grid.draw_win_line()[0]
+    assert_true(rect.collidepoint(start) and rect.collidepoint(end[0] - 1, end[1] - 1))
+    assert_equal(grid.screen.get_at(end)[:3], (0, 0, 255))
+    assert_is_none(grid.win_line)
+
+
+def test_text_cache():
+    cache = LRUCache(2)
+    assert_equal([cache.get(key, lambda: key * 2) for key in [1, 2, 1, 3]], [2, 4, 2, 6])
+    assert_equal(list(cache.items), [1, 3])  # 2 was the least recently used
+    assert_equal((cache.hits, cache.misses), (1, 3))
+
+    pygame.font.init()
+    texts = TextCache()
+    surface = texts.render("Your turn", 16, [42, 42, 42])
+    assert_true(texts.render("Your turn", 16, (42, 42, 42)) is surface)
+    assert_false(texts.render("Your turn", 20, (42, 42, 42)) is surface)
+    stats = texts.stats()
+    assert_equal((stats['surfaces'], stats['fonts']), (2, 2))
+    assert_equal(stats['surface_hit_rate'], 1 / 3)
+
+
+def test_frame_scheduler_wakes_on_network():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((10, 10))
+    context = zmq.Context()
+    sender, receiver = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    receiver.bind('inproc://scheduler_test')
+    sender.connect('inproc://scheduler_test')
+
+    scheduler = FrameScheduler(pygame.time.Clock(), max_fps=1000)
+    scheduler.watch(receiver)
+    try:
+        for _ in range(5):  # window events and the socket's initial wakeup
+            if scheduler.wait(timeout_ms=20) == []:
+                break
+        assert_equal(scheduler.idle_frames, 1)
+
+        sender.send(b'move')
+        start = time.time()
+        events = scheduler.wait(timeout_ms=5000)
+        assert_true(time.time() - start < 2)
+        assert_true(scheduler.network_ready())
+        assert_equal(receiver.recv(), b'move')
+        assert_false(scheduler.network_ready())
+        assert_true(NETWORK_EVENT in [event.type for event in events] or len(events) == 0)
+    finally:
+        scheduler.close()
+        sender.close()
+        receiver.close()
+
+
+def test_frame_profiler():
+    profiler = FrameProfiler(window=10, trace=True)
+    for i in range(20):
+        profiler.begin_frame()
+        with profiler.phase(FrameProfiler.WAIT):
+            time.sleep(0.002)
+        with profiler.phase('board'):
+            pass
+        if i % 2 == 0:
+            with profiler.phase('text'):
+                pass
+        profiler.end_frame()
+
+    stats = profiler.stats()
+    assert_equal(len(profiler.frames), 10)
+    assert_less(stats['frame'][1], 0.002)  # the wait is not part of the frame time
+    assert_equal(len(profiler.phases['text']), 10)
+    assert_equal(profiler.overlay_text()[1].split()[0], 'frame')
+
+    trace_path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+    profiler.write_trace(trace_path)
+    with open(trace_path) as trace_file:
+        events = json.load(trace_file)['traceEvents']
+    assert_equal(len([event for event in events if event['name'] == 'frame']), 20)
+    assert_true(all(event['ph'] == 'X' and event['dur'] >= 0 for event in events))
+
+
+def test_headless_sessions_play_games():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        sessions = []
+        for mode, name in [(GameSession.SERVER, 'server'), (GameSession.CLIENT, 'client')]:
+            session = GameSession(mode, bot=True, config_file_name=os.path.join(cache_dir, 'config.txt'))
+            session.conf.update({'numgridx': 7, 'numgridy': 7, 'n_to_win': 4, 'port': 14599, 'rsakeybits': 1024,
+                                 'engine_time_ms': 20})
+            session.set_player(name, first_move=(mode == GameSession.SERVER))
+            sessions.append(session)
+        server, client = sessions
+
+        server_thread = threading.Thread(target=server.run, kwargs={'max_games': 2, 'poll_timeout': 0.01})
+        server_thread.start()
+        try:
+            client.run('localhost', max_games=2, poll_timeout=0.01)
+        finally:
+            server.done = True
+            server_thread.join()
+            server.close()
+            client.close()
+
+        assert_false(client.game_is_on)
+        assert_equal(client.board.moves, server.board.moves)
+        assert_true(1 <= server.player.points + client.player.points <= 2 or client.is_tie())
+
+
+def test_session_resumption():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        port = free_port()
+
+        def new_session(mode, resume=None):
+            session = GameSession(mode, bot=True, resume=resume, config_file_name=os.path.join(cache_dir, 'config.txt'))
+            session.conf.update({'numgridx': 7, 'numgridy': 7, 'n_to_win': 4, 'port': port, 'rsakeybits': 1024,
+                                 'engine_time_ms': 20})
+            session.set_player(mode, first_move=(mode == GameSession.SERVER))
+            return session
+
+        def reconnect(resume):
+            client = new_session(GameSession.CLIENT, resume=resume)
+            client.open_client('localhost')
+            deadline = time.time() + 30
+            while not client.connect_step() and time.time() < deadline:
+                client.wait(0.01)
+            client.init_game()
+            return client
+
+        def close_client(client):
+            # a PAIR socket drops the messages of a new client until it let the previous one go,
+            # which the server thread does in its next poll after the disconnect
+            client.close()
+            deadline = time.time() + 5
+            while not server.awaiting_resume and time.time() < deadline:
+                time.sleep(0.01)
+            assert_true(server.awaiting_resume)
+            time.sleep(0.1)
+
+        server = new_session(GameSession.SERVER)
+        server.open_server()
+        server_thread = threading.Thread(target=server.run, kwargs={'poll_timeout': 0.01})
+        server_thread.start()
+        clients = [new_session(GameSession.CLIENT)]
+        try:
+            clients[0].run('localhost', max_games=1, poll_timeout=0.01)
+            # the server's end of game messages would block its PAIR socket once the client is gone
+            deadline = time.time() + 30
+            while not clients[0].req_new_game and time.time() < deadline:
+                clients[0].wait(0.01)
+                clients[0].receive_data()
+                clients[0].process_received_data()
+            close_client(clients[0])
+            moves = clients[0].board.moves
+            session = clients[0].comm.session
+            assert_is_not_none(session)
+
+            clients.append(reconnect(session))
+            assert_is_not_none(clients[1].resumed_state)
+            assert_true(clients[1].comm.encomm.symmetric_cipher is not None)
+            assert_equal(clients[1].board.moves, moves)
+            assert_equal(clients[1].player.id, clients[0].player.id)
+            close_client(clients[1])
+
+            METRICS.reset()
+            clients.append(reconnect((b'forged ticket', session[1])))
+            assert_true(clients[2].is_ready)
+            assert_true(clients[2].comm.encomm.symmetric_cipher is not None)
+            assert_equal(clients[2].board.moves, moves)
+            assert_equal(METRICS.counter('fiveinarow_messages_total', direction='sent', header='resume_failed'), 1)
+
+            # game messages are never taken without authentication
+            clients[2].comm.encomm.send(codec.encode((0, 0), 'move'), plaintext=True)
+            deadline = time.time() + 5
+            while METRICS.counter('fiveinarow_unauthenticated_messages_total') == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            assert_equal(METRICS.counter('fiveinarow_unauthenticated_messages_total'), 1)
+            assert_true(server.comm.encomm.symmetric_cipher is not None)
+
+            # an established session takes no resumption, which would lead to an unauthenticated key exchange
+            cipher = server.comm.encomm.symmetric_cipher
+            echoes = METRICS.counter('fiveinarow_messages_total', direction='sent', header='echo') + 2
+            clients[2].comm.encomm.send(codec.encode((b'forged ticket', b'r' * 32), 'resume'), plaintext=True)
+            clients[2].send((0, 0), 'echo_resume')  # the server's answer shows that it got to the 'resume'
+            deadline = time.time() + 5
+            while METRICS.counter('fiveinarow_messages_total', direction='sent', header='echo') < echoes and \
+                    time.time() < deadline:
+                time.sleep(0.01)
+            assert_equal(METRICS.counter('fiveinarow_messages_total', direction='sent', header='echo'), echoes)
+            assert_equal(METRICS.counter('fiveinarow_messages_total', direction='sent', header='resume_failed'), 1)
+            assert_true(server.comm.encomm.symmetric_cipher is cipher)
+        finally:
+            server.done = True
+            server_thread.join()
+            server.close()
+            for client in clients:
+                client.close()
+
+
+def test_match_server_drops_failed_key_exchanges():
+    port = free_port()
+    server = MatchServer(port, {'numgridx': 7, 'numgridy': 7, 'n_to_win': 4}, key_pool=KeyPool(1024, size=1))
+    context = zmq.Context()
+    peers = [context.socket(zmq.DEALER) for _ in range(2)]
+    try:
+        for peer in peers:
+            peer.connect("tcp://localhost:{}".format(port))
+
+        peers[0].send(codec.encode(b'no key was offered', 'encrypted_symm_key'))
+        deadline = time.time() + 10
+        while server.poll(0.1) == 0 and time.time() < deadline:
+            pass
+        assert_equal(server.sessions, dict())
+
+        peers[1].send(codec.encode(GameSession.HELLO_HEADER, 'hello'))
+        headers = []
+        deadline = time.time() + 60
+        while 'pubkey' not in headers and time.time() < deadline:
+            server.poll(0.05)
+            if peers[1].poll(0):
+                headers.append(codec.decode(peers[1].recv())[1])
+        assert_equal(headers, ['hello_answer', 'pubkey'])
+
+        peers[1].send(codec.encode(b'not encrypted with the offered key', 'encrypted_symm_key'))
+        deadline = time.time() + 10
+        while len(server.sessions) > 0 and time.time() < deadline:
+            server.poll(0.1)
+        assert_equal((server.sessions, list(server.lobby)), (dict(), []))
+    finally:
+        for peer in peers:
+            peer.close(linger=0)
+        context.term()
+        server.close()
+
+
+def test_match_server_plays_game():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        port = free_port()
+        server = MatchServer(port, {'numgridx': 7, 'numgridy': 7, 'n_to_win': 4},
+                             key_pool=KeyPool(1024, size=2))
+        clients = []
+        for name in ['first', 'second']:
+            client = GameSession(GameSession.CLIENT, bot=True, config_file_name=os.path.join(cache_dir, 'config.txt'))
+            client.conf.update({'port': port, 'match_server': True, 'engine_time_ms': 20, 'connection_timeout': 60})
+            client.set_player(name)
+            clients.append(client)
+
+        threads = [threading.Thread(target=client.run, args=('localhost',), kwargs={'max_games': 1, 'poll_timeout': 0.01})
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        try:
+            deadline = time.time() + 120
+            while any(thread.is_alive() for thread in threads) and time.time() < deadline:
+                server.poll(0.01)
+        finally:
+            for client in clients:
+                client.done = True
+            for thread in threads:
+                thread.join()
+            for client in clients:
+                client.close()
+
+        try:
+            assert_equal(len(server.matches), 1)
+            match = next(iter(server.matches))
+            assert_true(match.over)
+            assert_equal(clients[0].board.moves, match.board.moves)
+            assert_equal(clients[1].board.moves, match.board.moves)
+            assert_equal(sorted(client.player.id for client in clients), [0, 1])
+
+            server.drop_idle_sessions()
+            assert_equal(len(server.matches), 1)
+            server.handshake_timeout = 0
+            server.drop_idle_sessions()
+            assert_equal((server.matches, server.sessions, server.resumable), (set(), dict(), dict()))
+        finally:
+            server.close()
+
+
+def test_headless_modules_import_lazily():
+    code = "import sys, fiveinarow.game_session; print(sorted(m for m in ['pygame', 'zmq', 'rsa', 'cryptography', 'numpy'] if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root, universal_newlines=True)
+    assert_equal(output.strip(), '[]')
+
+
+def test_benchmark_runner():
+    from benchmarks import run
+
+    results = run.run(pattern=r'BoardCheck\.time_check_board\(\(15, 15\)', repeat=2, min_time=0.001)
+    assert_equal(len(results['results']), 2)
+    for result in results['results'].values():
+        assert_true(0 < result['min'] <= result['median'])
+    assert_equal(run.compare(results, results), 0)
@@ -13,7 +13,8 @@ import time
 import os
 import  random
 
-from fiveinarow.game_board import Grid, Board, Player
+from fiveinarow.game_board import Board, Player
+from fiveinarow.pg_grid import Grid
 
 with open('../config.txt', 'r') as c:
     conf = json.load(c)